@@ -0,0 +1,239 @@
+"""
+Kommandozeilenprogramm zur Sensorermittlung ohne Benutzeroberfläche.
+Verarbeitet einen oder mehrere Arbeitsordner (auch als Glob-Muster) parallel: Datenaufbereitung, Sensorerkennung
+und Export der _Sensors.dxf Datei.
+
+Beispiel:
+    python Batch.py ./sample --length 150 --height 20
+    python Batch.py "exports/*" --length 150 --height 20 --jobs 8
+    python Batch.py ./sample            (Abmessungen aus der Contour.dxf)
+
+Author: Philipp Haug
+Date: 24.05.2023
+Version: 1.0
+"""
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import Datenaufbereitung as DA
+import DXFExport
+import Elementindex as EI
+import Faserfeld as FF
+import Kontur as KT
+import Method as M9
+
+def OrdnerVerarbeiten(path : str, length : float = None, height : float = None, Anzahl : int = 0, blockweise : bool = None, fein : int = 1,
+                      elemente : bool = False, sortierung : str = 'laenge', randanschluss : bool = False, faser : bool = False,
+                      jobs : int = 1, art : str = None, minLaenge : float = None):
+    """Führt die komplette Sensorermittlung für einen Arbeitsordner durch
+
+    Args:
+        path (str) : Arbeitsordner mit Contour.dxf, Splines.dxf, MinPrincipal.csv und MaxPrincipal.csv
+        length (float) : Länge des Bauteils (X-Achse). Bei None werden Abmessungen und Skalierung aus der Contour.dxf bestimmt
+        height (float) : Höhe des Bauteils (Y-Achse). Bei None werden Abmessungen und Skalierung aus der Contour.dxf bestimmt
+        Anzahl (int) : Anzahl der zu exportierenden Sensoren, beginnend beim längsten bzw. am höchsten bewerteten. 0 für alle
+        blockweise (bool) : CSV Dateien blockweise mit begrenztem Speicherbedarf verarbeiten. Bei None abhängig von der Dateigröße
+        fein (int) : Faktor des feinen Rasters, in dem Endpunkte und Anschlüsse verfeinert werden. 1 ohne Verfeinerung
+        elemente (bool) : Endpunkte auf das nächste Element setzen und die Spannungen entlang der exportierten Sensoren
+                          in eine _Spannungsverlauf.csv schreiben
+        sortierung (str) : Reihenfolge der exportierten Sensoren, 'laenge' oder nach der Spannung entlang des Sensors
+                           'mittel', 'maximal' oder 'integral' (siehe Elementindex.Bewertung)
+        randanschluss (bool) : Anschlüsse auf den nächsten Punkt der Contour.dxf statt auf das nächste Pixel außerhalb
+                               des Modellbildes setzen
+        faser (bool) : Sensoren entlang der Faserrichtung aus der Splines.dxf statt entlang der Längsachse der
+                       Spannungsbereiche legen
+        jobs (int) : Anzahl Prozesse für die Auswertung der Spannungskonturen im Ordner, 0 für alle CPU-Kerne
+        art (str) : Nur Sensoren in Zug- ('zug') oder Druckbereichen ('druck') exportieren. Bei None alle
+        minLaenge (float) : Nur Sensoren mit mindestens dieser Länge in mm exportieren. Bei None alle
+
+    Raises:
+        FileNotFoundError wenn nicht alle Dateien im Arbeitsordner liegen
+        ValueError wenn der Elementindex oder das feine Raster mit blockweiser Verarbeitung angefordert wird
+
+    Returns:
+       str, int : Pfad der geschriebenen _Sensors.dxf Datei, Anzahl der exportierten Sensoren
+    """
+    nameContourdxf, nameSplinesdxf, MinPrincipal, MaxPrincipal = DA.DateienSuchen(path)
+    if any([nameContourdxf == '', nameSplinesdxf == '', MinPrincipal == '', MaxPrincipal == '']):
+        raise FileNotFoundError('Make sure all data is in the selected folder: ' + path)
+
+    if blockweise is None:
+        blockweise = os.path.getsize(MaxPrincipal) >= DA.GroesseBlockweise
+    # Der Elementindex hält alle Elemente im Speicher
+    mitIndex = elemente or sortierung != 'laenge'
+    if blockweise and mitIndex:
+        raise ValueError('--elemente und --sortierung sind mit blockweiser Verarbeitung nicht möglich: ' + path)
+    # Das feine Raster wird aus allen Elementen auf einmal erstellt
+    if blockweise and fein > 1:
+        raise ValueError('--fein ist mit blockweiser Verarbeitung nicht möglich: ' + path)
+
+    # Bilder bleiben im Speicher, PNGs werden nur für die Benutzeroberfläche benötigt
+    maskModell, maskZug, maskDruck = DA.Aufbereitung(MinPrincipal, MaxPrincipal, path, speichern=False, blockweise=blockweise)
+    ModellBild, image = DA.Bilder(maskModell, maskZug, maskDruck)
+    kontext = M9.ErkennungsKontext(ModellBild, image)
+
+    if mitIndex:
+        index = EI.ElementIndex.ausDateien(MinPrincipal, MaxPrincipal)
+
+    kontur = None
+    if length is None or height is None or randanschluss or faser:
+        kontur = KT.Kontur.ausDatei(nameContourdxf)
+
+    if length is None or height is None:
+        # Ohne Angabe der Abmessungen exakt aus der Kontur und dem Wertebereich der Elemente. Blockweise ist der
+        # Wertebereich nicht bekannt, dann wird die Bauteilbegrenzung im Modellbild auf die Kontur abgebildet
+        grenzen = None
+        if mitIndex:
+            grenzen = index.grenzen
+        elif not blockweise:
+            _, YCoord, ZCoord, _ = DA.ElementeLaden(MaxPrincipal)
+            grenzen = (YCoord.min(), YCoord.max(), ZCoord.min(), ZCoord.max())
+        transformation = KT.Transformation(kontur, ModellBild, grenzen)
+        _, _, scalex, scaley = transformation
+    else:
+        x, y, breite, hoehe, scalex, scaley = M9.Skalierung(ModellBild, length, height)
+        transformation = (x, y + hoehe, scalex, scaley)
+
+    if faser:
+        feld = FF.Faserfeld.ausDatei(nameSplinesdxf, kontur.grenzen)
+        kontext.faser = feld.bildfeld(ModellBild.shape[:2], transformation)
+
+    Sensoren = M9.SensorErkennung(path, scalex, scaley, kontext, jobs)
+
+    if fein > 1:
+        raster = DA.FeinRaster(MinPrincipal, MaxPrincipal, fein)
+        Sensoren = M9.SensorenVerfeinern(Sensoren, kontext, raster, scalex, scaley)
+        transformation = tuple(wert * fein for wert in transformation)
+
+    if randanschluss:
+        Sensoren = KT.AnschluesseSetzen(Sensoren, kontur, transformation)
+    if elemente:
+        Sensoren = EI.AufElementeSetzen(Sensoren, index, scalex, scaley, faktor=fein)
+    if art is not None or minLaenge is not None:
+        Sensoren = M9.SensorenFiltern(Sensoren, None if art is None else M9.SensorArt[art.capitalize()], minLaenge)
+    if sortierung != 'laenge':
+        Sensoren, _ = EI.NachBewertungSortieren(Sensoren, EI.Bewertung(Sensoren, index, faktor=fein), sortierung)
+
+    if Anzahl <= 0 or Anzahl > len(Sensoren):
+        Anzahl = len(Sensoren)
+
+    NewNamedxf = DXFExport.Export(nameContourdxf, nameSplinesdxf, Sensoren, Anzahl, transformation)
+
+    if elemente:
+        exportiert = M9.Laengste(Sensoren, Anzahl)
+        EI.VerlaufSpeichern(nameContourdxf[:-11] + '_Spannungsverlauf.csv', exportiert, EI.Spannungsverlauf(exportiert, index, faktor=fein))
+
+    return NewNamedxf, Anzahl
+
+
+def _OrdnerVerarbeitenSicher(path : str, length : float, height : float, Anzahl : int, blockweise : bool, fein : int, elemente : bool,
+                             sortierung : str, randanschluss : bool, faser : bool, jobs : int, art : str,
+                             minLaenge : float):
+    """Wrapper für den Prozesspool, damit ein fehlerhafter Ordner nicht den ganzen Lauf abbricht"""
+    try:
+        NewNamedxf, Anzahl = OrdnerVerarbeiten(path, length, height, Anzahl, blockweise, fein, elemente, sortierung, randanschluss, faser, jobs,
+                                                     art, minLaenge)
+    except Exception as e:
+        return path, None, '{}: {}'.format(type(e).__name__, e)
+    return path, NewNamedxf, Anzahl
+
+
+def OrdnerErmitteln(muster : list):
+    """Löst die übergebenen Ordner und Glob-Muster zu einer Liste von Arbeitsordnern auf
+
+    Args:
+        muster (list) : Ordnerpfade oder Glob-Muster
+
+    Returns:
+       list, list : Sortierte Liste der gefundenen Ordner ohne Duplikate, angegebene Pfade ohne Glob-Muster, die kein Ordner sind
+    """
+    ordner = []
+    fehlend = []
+    for m in muster:
+        if not glob.has_magic(m) and not os.path.isdir(m):
+            fehlend.append(m)
+            continue
+        treffer = glob.glob(m) if glob.has_magic(m) else [m]
+        for t in sorted(treffer):
+            if os.path.isdir(t) and t not in ordner:
+                ordner.append(t)
+    return ordner, fehlend
+
+
+def main(argv=None):
+    """Einstiegspunkt der Kommandozeile
+
+    Args:
+        argv (list) : Kommandozeilenargumente, bei None sys.argv
+
+    Returns:
+       int : Exitcode, 1 wenn mindestens ein Ordner fehlgeschlagen ist
+    """
+    parser = argparse.ArgumentParser(description='Automatische Sensorermittlung ohne Benutzeroberfläche.')
+    parser.add_argument('ordner', nargs='+', help='Arbeitsordner oder Glob-Muster, zB "exports/*"')
+    parser.add_argument('--length', type=float, help='Länge des Bauteils (X-Achse), ohne Angabe aus der Contour.dxf')
+    parser.add_argument('--height', type=float, help='Höhe des Bauteils (Y-Achse), ohne Angabe aus der Contour.dxf')
+    parser.add_argument('--anzahl', type=int, default=0, help='Anzahl der zu exportierenden Sensoren, 0 für alle (Standard)')
+    parser.add_argument('--blockweise', action='store_true', default=None,
+                        help='CSV Dateien blockweise mit begrenztem Speicherbedarf verarbeiten (Standard: ab 1 GB automatisch)')
+    parser.add_argument('--fein', type=int, default=1,
+                        help='Endpunkte und Anschlüsse in einem um diesen Faktor feineren Raster bestimmen (Standard: 1, aus)')
+    parser.add_argument('--elemente', action='store_true',
+                        help='Endpunkte auf das nächste Element setzen und die Spannungen entlang der Sensoren als _Spannungsverlauf.csv ausgeben')
+    parser.add_argument('--sortierung', choices=('laenge',) + EI.BewertungDtype.names, default='laenge',
+                        help='Auswahl der exportierten Sensoren nach Länge (Standard) oder nach mittlerer, maximaler oder '
+                             'integrierter Spannung entlang des Sensors')
+    parser.add_argument('--randanschluss', action='store_true',
+                        help='Anschlüsse auf den nächsten Punkt der Contour.dxf setzen statt auf das nächste Pixel außerhalb des Modells')
+    parser.add_argument('--faser', action='store_true',
+                        help='Sensoren entlang der Faserrichtung aus der Splines.dxf statt entlang der Längsachse der Spannungsbereiche legen')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Anzahl paralleler Prozesse (Standard: Anzahl CPU-Kerne)')
+    parser.add_argument('--jobs-erkennung', type=int, default=1,
+                        help='Anzahl Prozesse je Ordner für die Auswertung der Spannungskonturen, 0 für alle CPU-Kerne (Standard: 1). '
+                             'Lohnt sich bei wenigen Ordnern mit vielen großen Spannungsbereichen. Mit --faser werden nur '
+                             'die Bereiche parallel ausgewertet, die entlang der Längsachse statt der Faser ausgewertet werden')
+    parser.add_argument('--art', choices=('zug', 'druck'), help='Nur Sensoren in Zug- oder Druckbereichen exportieren (Standard: beide)')
+    parser.add_argument('--min-laenge', type=float, help='Nur Sensoren mit mindestens dieser Länge in mm exportieren')
+    args = parser.parse_args(argv)
+    if (args.length is None) != (args.height is None):
+        parser.error('--length und --height nur gemeinsam angeben')
+
+    ordner, fehlend = OrdnerErmitteln(args.ordner)
+    for path in fehlend:
+        print('FEHLER', path, 'Ordner nicht gefunden', file=sys.stderr)
+    if not ordner:
+        print('Keine Ordner gefunden.', file=sys.stderr)
+        return 1
+
+    fehler = len(fehlend)
+    jobs = max(1, min(args.jobs, len(ordner)))
+    argumente = (args.length, args.height, args.anzahl, args.blockweise, args.fein, args.elemente, args.sortierung, args.randanschluss, args.faser,
+                 args.jobs_erkennung, args.art, args.min_laenge)
+
+    # Mit einem Job im eigenen Prozess, damit zB die Instrumentierung alle Abschnitte erfasst
+    if jobs == 1:
+        ergebnisse = (_OrdnerVerarbeitenSicher(o, *argumente) for o in ordner)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        ergebnisse = (future.result() for future in [pool.submit(_OrdnerVerarbeitenSicher, o, *argumente) for o in ordner])
+
+    try:
+        for path, NewNamedxf, ergebnis in ergebnisse:
+            if NewNamedxf is None:
+                fehler += 1
+                print('FEHLER', path, ergebnis, file=sys.stderr)
+            else:
+                print('OK', path, NewNamedxf, ergebnis, 'Sensoren')
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return 1 if fehler else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
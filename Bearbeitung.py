@@ -0,0 +1,280 @@
+"""
+Bearbeitungsverlauf der Paint-Fenster für Modell.png und Werte.png.
+Das Bild wird in Kacheln eingeteilt. Vor jeder Änderung wird nur der Inhalt der berührten Kacheln gesichert, ein Eintrag
+des Verlaufs enthält je Strich die Kacheln vor und nach der Änderung. Rückgängig und Wiederherstellen setzen nur diese
+Kacheln ein. Zusätzlich wird festgehalten, welche Kacheln seit dem letzten Speichern geändert wurden.
+Der Pinsel verbindet die Mausereignisse eines Strichs zu einem Linienzug und zeichnet ihn abschnittsweise ins Bild.
+
+Author: Philipp Haug
+Date: 24.05.2023
+Version: 1.0
+"""
+import numpy as np
+from PIL import Image, ImageDraw
+
+import Instrumentierung as IM
+
+#Kantenlänge einer Kachel in Pixeln
+Kachelgroesse = 64
+#Maximale Anzahl an Schritten, die rückgängig gemacht werden können
+Verlaufstiefe = 100
+#Anzahl an Punkten, nach denen der Pinsel den Linienzug ins Bild überträgt
+PunkteJeAbschnitt = 256
+
+class Verlauf:
+    """
+    Mehrstufiger Bearbeitungsverlauf eines PIL Bildes auf Basis geänderter Kacheln.
+    """
+    def __init__(self, image : Image.Image, kachel : int = Kachelgroesse, tiefe : int = Verlaufstiefe):
+        """
+        Args:
+            image (PIL.Image) : Bearbeitetes Bild, wird direkt verändert
+            kachel (int) : Kantenlänge einer Kachel in Pixeln
+            tiefe (int) : Maximale Anzahl an Schritten im Verlauf
+
+        Returns:
+        """
+        self.image = image
+        self.kachel = kachel
+        self.tiefe = tiefe
+        self.rueck = []
+        self.vor = []
+        #Gesicherte Kacheln des laufenden Strichs vor der Änderung
+        self._strich = None
+        #Seit dem letzten Speichern geänderte Kacheln
+        self.ungespeichert = set()
+
+    def _Kacheln(self, box : tuple):
+        """Schlüssel (Spalte, Zeile) aller Kacheln, die den Bereich (x0, y0, x1, y1) berühren"""
+        breite, hoehe = self.image.size
+        x0, y0 = max(int(box[0]), 0) // self.kachel, max(int(box[1]), 0) // self.kachel
+        x1, y1 = min(int(np.ceil(box[2])), breite - 1) // self.kachel, min(int(np.ceil(box[3])), hoehe - 1) // self.kachel
+        return [(i, j) for j in range(y0, y1 + 1) for i in range(x0, x1 + 1)]
+
+    def _Box(self, schluessel : tuple):
+        """Pixelbereich (x0, y0, x1, y1) einer Kachel"""
+        breite, hoehe = self.image.size
+        i, j = schluessel
+        return i * self.kachel, j * self.kachel, min((i + 1) * self.kachel, breite), min((j + 1) * self.kachel, hoehe)
+
+    def _Bereiche(self, schluessel):
+        """Pixelbereiche (x0, y0, x1, y1) mehrerer Kacheln, je Kachelzeile zu zusammenhängenden Stücken vereinigt"""
+        bereiche = []
+        for j, i in sorted((j, i) for i, j in schluessel):
+            x0, y0, x1, y1 = self._Box((i, j))
+            if bereiche and bereiche[-1][1] == y0 and bereiche[-1][2] == x0:
+                bereiche[-1] = (bereiche[-1][0], y0, x1, y1)
+            else:
+                bereiche.append((x0, y0, x1, y1))
+        return bereiche
+
+    def vormerken(self, box : tuple):
+        """Sichert die noch nicht gesicherten Kacheln eines Bereichs, bevor dieser im laufenden Strich verändert wird
+
+        Args:
+            box (tuple) : Bereich (x0, y0, x1, y1) in Pixeln, der anschließend verändert wird
+
+        Returns:
+        """
+        if self._strich is None:
+            self._strich = {}
+        for schluessel in self._Kacheln(box):
+            if schluessel not in self._strich:
+                self._strich[schluessel] = self.image.crop(self._Box(schluessel))
+
+    @IM.Messen
+    def abschliessen(self):
+        """Schließt den laufenden Strich ab und legt ihn als einen Schritt im Verlauf ab
+
+        Returns:
+           list : Geänderte Bereiche (x0, y0, x1, y1) der Kacheln, None wenn nichts verändert wurde
+        """
+        strich, self._strich = self._strich, None
+        if not strich:
+            return None
+
+        eintrag = [(schluessel, vorher, self.image.crop(self._Box(schluessel))) for schluessel, vorher in strich.items()]
+        self.rueck.append(eintrag)
+        if len(self.rueck) > self.tiefe:
+            self.rueck.pop(0)
+        self.vor.clear()
+        self.ungespeichert.update(strich)
+        return self._Bereiche(strich)
+
+    def _Einsetzen(self, eintrag : list, index : int):
+        """Setzt die Kacheln eines Schrittes ein, index 1 für den Zustand vorher und 2 für nachher"""
+        for kachel in eintrag:
+            self.image.paste(kachel[index], self._Box(kachel[0]))
+        schluessel = [kachel[0] for kachel in eintrag]
+        self.ungespeichert.update(schluessel)
+        return self._Bereiche(schluessel)
+
+    @IM.Messen
+    def rueckgaengig(self):
+        """Macht den letzten Schritt rückgängig
+
+        Returns:
+           list : Geänderte Bereiche (x0, y0, x1, y1) der Kacheln, None wenn es keinen Schritt gibt
+        """
+        if self._strich:
+            self.abschliessen()
+        if not self.rueck:
+            return None
+        eintrag = self.rueck.pop()
+        self.vor.append(eintrag)
+        return self._Einsetzen(eintrag, 1)
+
+    @IM.Messen
+    def wiederholen(self):
+        """Stellt den zuletzt rückgängig gemachten Schritt wieder her
+
+        Returns:
+           list : Geänderte Bereiche (x0, y0, x1, y1) der Kacheln, None wenn es keinen Schritt gibt
+        """
+        if not self.vor:
+            return None
+        eintrag = self.vor.pop()
+        self.rueck.append(eintrag)
+        return self._Einsetzen(eintrag, 2)
+
+    @IM.Messen
+    def zuruecksetzen(self, original : Image.Image):
+        """Setzt das Bild als ein rückgängig machbarer Schritt auf das Original zurück. Nur abweichende Kacheln werden
+        gesichert und ersetzt
+
+        Args:
+            original (PIL.Image) : Unbearbeitetes Bild gleicher Größe
+
+        Returns:
+           list : Geänderte Bereiche (x0, y0, x1, y1) der Kacheln, None wenn das Bild bereits dem Original entspricht
+        """
+        if original.mode != self.image.mode:
+            original = original.convert(self.image.mode)
+        abweichung = np.asarray(self.image) != np.asarray(original)
+        if abweichung.ndim == 3:
+            abweichung = abweichung.any(axis=2)
+
+        # Abweichungen je Kachel zusammenfassen, dafür auf ganze Kacheln auffüllen
+        hoehe, breite = abweichung.shape
+        zeilen, spalten = -(-hoehe // self.kachel), -(-breite // self.kachel)
+        gefuellt = np.zeros((zeilen * self.kachel, spalten * self.kachel), dtype=bool)
+        gefuellt[:hoehe, :breite] = abweichung
+        kacheln = gefuellt.reshape(zeilen, self.kachel, spalten, self.kachel).any(axis=(1, 3))
+
+        for j, i in zip(*np.nonzero(kacheln)):
+            box = self._Box((int(i), int(j)))
+            self.vormerken(box)
+            self.image.paste(original.crop(box), box)
+        return self.abschliessen()
+
+    def speichern(self, pfad : str):
+        """Schreibt das Bild, wenn es seit dem letzten Speichern geändert wurde
+
+        Args:
+            pfad (str) : Pfad der Bilddatei
+
+        Returns:
+           bool : True wenn geschrieben wurde
+        """
+        if not self.ungespeichert:
+            return False
+        self.image.save(pfad)
+        self.ungespeichert.clear()
+        return True
+
+
+class Pinsel:
+    """
+    Quadratischer Pinsel, der zwischen den Mausereignissen eines Strichs interpoliert. Die Punkte werden gesammelt und
+    abschnittsweise als ein Linienzug ins Bild gezeichnet. Vorher werden im Verlauf nur die Kacheln gesichert, die die
+    einzelnen Liniensegmente berühren.
+    """
+    def __init__(self, verlauf : Verlauf, abschnitt : int = PunkteJeAbschnitt):
+        """
+        Args:
+            verlauf (Verlauf) : Verlauf des bearbeiteten Bildes
+            abschnitt (int) : Anzahl an Punkten, nach denen ins Bild übertragen wird
+
+        Returns:
+        """
+        self.verlauf = verlauf
+        self.abschnitt = abschnitt
+        self.draw = ImageDraw.Draw(verlauf.image)
+        self.punkte = []
+
+    def ansetzen(self, x : int, y : int, breite : int, farbe):
+        """Beginnt einen Strich
+
+        Args:
+            x (int) : X-Position in Pixeln
+            y (int) : Y-Position in Pixeln
+            breite (int) : Kantenlänge des Pinsels in Pixeln
+            farbe : Farbe als PIL Farbangabe, zB '#a020f0'
+
+        Returns:
+        """
+        if self.punkte:
+            self.absetzen()
+        self.breite = breite
+        self.farbe = farbe
+        self.punkte = [(x, y)]
+
+    def ziehen(self, x : int, y : int):
+        """Verlängert den Strich bis zur neuen Mausposition
+
+        Args:
+            x (int) : X-Position in Pixeln
+            y (int) : Y-Position in Pixeln
+
+        Returns:
+           bool : True wenn der Abschnitt voll war und ins Bild übertragen wurde
+        """
+        if not self.punkte:
+            return False
+        if (x, y) != self.punkte[-1]:
+            self.punkte.append((x, y))
+        if len(self.punkte) > self.abschnitt:
+            self.uebertragen()
+            return True
+        return False
+
+    @IM.Messen
+    def uebertragen(self):
+        """Zeichnet die gesammelten Punkte als einen Linienzug ins Bild. Der letzte Punkt bleibt Anfang des nächsten Abschnitts
+
+        Returns:
+           tuple : Geänderter Bereich (x0, y0, x1, y1), None ohne Punkte
+        """
+        if not self.punkte:
+            return None
+        punkte = np.array(self.punkte)
+        halb = self.breite / 2
+        # Je Segment sichern, lange Segmente in Stücke von höchstens einer halben Kachel teilen. Der Rahmen des ganzen
+        # Abschnitts würde bei schrägen Strichen fast alle Kacheln des Rechtecks umfassen
+        self.verlauf.vormerken((punkte[0, 0] - halb - 1, punkte[0, 1] - halb - 1, punkte[0, 0] + halb + 1, punkte[0, 1] + halb + 1))
+        for a, b in zip(punkte[:-1], punkte[1:]):
+            teile = max(int(np.ceil(np.abs(b - a).max() / (self.verlauf.kachel / 2))), 1)
+            stuecke = a + np.outer(np.arange(teile + 1) / teile, b - a)
+            for p, q in zip(stuecke[:-1], stuecke[1:]):
+                self.verlauf.vormerken((min(p[0], q[0]) - halb - 1, min(p[1], q[1]) - halb - 1,
+                                        max(p[0], q[0]) + halb + 1, max(p[1], q[1]) + halb + 1))
+
+        if len(self.punkte) > 1:
+            self.draw.line(self.punkte, fill=self.farbe, width=self.breite)
+        # Quadrate an den Stützpunkten schließen die Ecken zwischen den Liniensegmenten
+        for px, py in self.punkte:
+            self.draw.rectangle([px - halb, py - halb, px + halb - 1, py + halb - 1], fill=self.farbe)
+        box = (int(punkte[:, 0].min() - halb - 1), int(punkte[:, 1].min() - halb - 1),
+               int(punkte[:, 0].max() + halb + 1), int(punkte[:, 1].max() + halb + 1))
+        self.punkte = self.punkte[-1:]
+        return box
+
+    def absetzen(self):
+        """Beendet den Strich und legt ihn als einen Schritt im Verlauf ab
+
+        Returns:
+           list : Geänderte Bereiche (x0, y0, x1, y1) der Kacheln des Strichs, None wenn nichts gezeichnet wurde
+        """
+        self.uebertragen()
+        self.punkte = []
+        return self.verlauf.abschliessen()
@@ -0,0 +1,226 @@
+"""
+Laufzeitmessung der einzelnen Stufen der Sensorermittlung.
+Gemessen wird mit den Beispieldaten aus ./sample sowie mit synthetischen Biegebalken beliebiger Elementanzahl.
+Die Ergebnisse werden als JSON ausgegeben, damit sie zwischen Versionen verglichen werden können.
+
+Beispiel:
+    python Benchmark.py --ausgabe bench.json
+    python Benchmark.py --elemente 100000 1000000 5000000 --wiederholungen 5
+
+Author: Philipp Haug
+Date: 24.05.2023
+Version: 1.0
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import Datenaufbereitung as DA
+import DXFExport
+import Method as M9
+
+#Abmessungen des Beispielbauteils
+Laenge = 150
+Hoehe = 20
+#Anzahl zufälliger Abfragen für die Messung von nearestPoint
+AnzahlAbfragen = 1000
+
+def SynthetischerBalken(ordner : str, anzahl : int, seed : int = 0):
+    """Schreibt MaxPrincipal.csv und MinPrincipal.csv eines Biegebalkens im Format des NX Exports.
+    Der Balken ist links eingespannt, zusätzlich erzeugen Spannungsspitzen mehrere getrennte Bereiche.
+
+    Args:
+        ordner (str) : Zielordner
+        anzahl (int) : Ungefähre Anzahl an Elementen
+        seed (int) : Startwert des Zufallsgenerators
+
+    Returns:
+       int : Tatsächliche Anzahl an Elementen
+    """
+    rng = np.random.default_rng(seed)
+    nz = max(int(np.sqrt(anzahl * Hoehe / Laenge)), 2)
+    ny = max(anzahl // nz, 2)
+
+    y, z = np.meshgrid((np.arange(ny) + 0.5) * Laenge / ny, (np.arange(nz) + 0.5) * Hoehe / nz, indexing='ij')
+    y, z = y.ravel(), z.ravel()
+
+    # Biegespannung, oben Zug und unten Druck, größer zur Einspannung hin
+    spannung = 1000 * (1 - y / Laenge) * (z - Hoehe / 2) / (Hoehe / 2)
+    for mitteY, mitteZ, wert in [(60, 6, -900), (95, 14, 800), (120, 5, -700)]:
+        spannung += wert * np.exp(-((y - mitteY) ** 2 + (z - mitteZ) ** 2) / 20)
+    spannung += rng.normal(0, 5, spannung.shape)
+
+    maxPrincipal = np.maximum(spannung, 0) + 1
+    minPrincipal = np.minimum(spannung, 0) - 1
+
+    elemente = np.column_stack([np.arange(1, len(y) + 1), y, z, maxPrincipal])
+    np.savetxt(os.path.join(ordner, 'MaxPrincipal.csv'), elemente, fmt=['%12d', '%12.4e', '%12.4e', '%12.4e'], delimiter=' ',
+               header='     Elem ID      Y Coord      Z Coord Max Principal', comments='')
+    np.savetxt(os.path.join(ordner, 'MinPrincipal.csv'), minPrincipal, fmt='%.2E', header='Min Principal', comments='')
+
+    return len(y)
+
+
+def _Messen(funktion, wiederholungen : int, vorbereitung=None):
+    """Misst die Laufzeit einer Funktion
+
+    Args:
+        funktion : Zu messende Funktion ohne Argumente
+        wiederholungen (int) : Anzahl der Messungen
+        vorbereitung : Funktion, die vor jeder Messung ungemessen aufgerufen wird
+
+    Returns:
+       dict, Ergebnis : Minimum, Mittelwert und alle Zeiten in Sekunden, Rückgabewert des letzten Aufrufs
+    """
+    zeiten = []
+    for _ in range(wiederholungen):
+        if vorbereitung is not None:
+            vorbereitung()
+        start = time.perf_counter()
+        ergebnis = funktion()
+        zeiten.append(time.perf_counter() - start)
+
+    return {'min': min(zeiten), 'mittel': sum(zeiten) / len(zeiten), 'zeiten': zeiten}, ergebnis
+
+
+def DatensatzMessen(ordner : str, name : str, wiederholungen : int):
+    """Misst alle Stufen für einen Arbeitsordner
+
+    Args:
+        ordner (str) : Arbeitsordner mit Contour.dxf, Splines.dxf, MinPrincipal.csv und MaxPrincipal.csv
+        name (str) : Name des Datensatzes in der Ausgabe
+        wiederholungen (int) : Anzahl der Messungen je Stufe
+
+    Returns:
+       dict : Messergebnisse des Datensatzes
+    """
+    nameContourdxf, nameSplinesdxf, MinPrincipal, MaxPrincipal = DA.DateienSuchen(ordner)
+
+    def BegleitdateienLoeschen():
+        for pfad in (MaxPrincipal + '.npz', MinPrincipal + '.npz'):
+            if os.path.exists(pfad):
+                os.remove(pfad)
+
+    def Laden():
+        return DA.ElementeLaden(MaxPrincipal), DA.DruckLaden(MinPrincipal)
+
+    stufen = {}
+    stufen['csv_laden_kalt'], (elemente, _) = _Messen(Laden, wiederholungen, BegleitdateienLoeschen)
+    stufen['csv_laden_warm'], _ = _Messen(Laden, wiederholungen)
+
+    stufen['aufbereitung'], masken = _Messen(lambda: DA.Aufbereitung(MinPrincipal, MaxPrincipal, ordner, speichern=False), wiederholungen)
+    ModellBild, image = DA.Bilder(*masken)
+
+    x, y, breite, hoehe, scalex, scaley = M9.Skalierung(ModellBild, Laenge, Hoehe)
+
+    stufen['kontext'], kontext = _Messen(lambda: M9.ErkennungsKontext(ModellBild, image), wiederholungen)
+
+    def Konturen():
+        contoursOrange, _ = cv2.findContours(kontext.maskOrange, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        contoursPurple, _ = cv2.findContours(kontext.maskPurple, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        contoursGrey, _ = cv2.findContours(kontext.maskGrey, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        return contoursOrange, contoursPurple, contoursGrey
+
+    stufen['konturen'], (contoursOrange, contoursPurple, contoursGrey) = _Messen(Konturen, wiederholungen)
+
+    # Jeder SensorErkennung2 Aufruf einzeln, mit derselben Vorauswahl der Konturen wie in SensorErkennung
+    aufrufe = []
+    for cnt in list(contoursOrange) + list(contoursPurple):
+        if len(cnt) > len(contoursGrey) * 0.2:
+            messung, _ = _Messen(lambda: M9.SensorErkennung2(kontext, cnt, scalex, scaley), wiederholungen)
+            aufrufe.append({'konturpunkte': len(cnt), 'min': messung['min'], 'mittel': messung['mittel']})
+    stufen['sensorerkennung2'] = {'aufrufe': aufrufe, 'summe_min': sum(a['min'] for a in aufrufe)}
+
+    stufen['sensorerkennung'], Sensoren = _Messen(lambda: M9.SensorErkennung(ordner, scalex, scaley, kontext), wiederholungen)
+    stufen['sensorerkennung_parallel'], _ = _Messen(lambda: M9.SensorErkennung(ordner, scalex, scaley, kontext, jobs=0), wiederholungen)
+
+    rng = np.random.default_rng(0)
+    abfragen = np.column_stack([rng.integers(0, ModellBild.shape[1], AnzahlAbfragen), rng.integers(0, ModellBild.shape[0], AnzahlAbfragen)])
+
+    stufen['nearestpoint_feld'], feld = _Messen(lambda: M9.FarbFeld(ModellBild, (255, 255, 255)), wiederholungen)
+    messung, _ = _Messen(lambda: [feld.nearestPoint(px, py) for px, py in abfragen], wiederholungen)
+    stufen['nearestpoint_abfrage'] = {'min': messung['min'] / AnzahlAbfragen, 'mittel': messung['mittel'] / AnzahlAbfragen}
+    stufen['nearestpoint_einzeln'], _ = _Messen(lambda: M9.nearestPoint(ModellBild, int(abfragen[0, 0]), int(abfragen[0, 1]), (255, 255, 255)), wiederholungen)
+
+    if len(Sensoren):
+        stufen['export'], _ = _Messen(lambda: DXFExport.Export(nameContourdxf, nameSplinesdxf, Sensoren, len(Sensoren), (x, y + hoehe, scalex, scaley)), wiederholungen)
+
+    return {'name': name, 'elemente': int(len(elemente[0])), 'bildform': list(ModellBild.shape[:2]),
+            'konturen': {'zug': len(contoursOrange), 'druck': len(contoursPurple), 'modell': len(contoursGrey)},
+            'sensoren': int(len(Sensoren)), 'stufen': stufen}
+
+
+def _Version():
+    """Aktueller git Stand des Programms, falls verfügbar"""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    """Einstiegspunkt der Kommandozeile
+
+    Args:
+        argv (list) : Kommandozeilenargumente, bei None sys.argv
+
+    Returns:
+       int : Exitcode
+    """
+    programmOrdner = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Laufzeitmessung der Sensorermittlung.')
+    parser.add_argument('--elemente', type=int, nargs='*', default=[100000, 1000000, 5000000],
+                        help='Elementanzahlen der synthetischen Balken (Standard: 100000 1000000 5000000)')
+    parser.add_argument('--wiederholungen', type=int, default=3, help='Messungen je Stufe (Standard: 3)')
+    parser.add_argument('--ohne-beispiel', action='store_true', help='Beispieldaten aus ./sample nicht messen')
+    parser.add_argument('--ausgabe', help='JSON Datei für die Ergebnisse, ohne Angabe auf die Konsole')
+    args = parser.parse_args(argv)
+
+    ergebnisse = {'version': _Version(), 'python': platform.python_version(), 'numpy': np.__version__,
+                  'opencv': cv2.__version__, 'plattform': platform.platform(), 'cpu': os.cpu_count(),
+                  'wiederholungen': args.wiederholungen, 'datensaetze': []}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datensaetze = []
+        if not args.ohne_beispiel:
+            ordner = os.path.join(tmp, 'sample')
+            shutil.copytree(os.path.join(programmOrdner, 'sample'), ordner)
+            datensaetze.append((ordner, 'sample'))
+
+        for anzahl in args.elemente:
+            ordner = os.path.join(tmp, 'balken_{}'.format(anzahl))
+            os.makedirs(ordner)
+            # Kontur und Fasern werden nur für den Export benötigt und aus dem Beispiel übernommen
+            for name in os.listdir(os.path.join(programmOrdner, 'sample')):
+                if name.endswith('.dxf'):
+                    shutil.copy(os.path.join(programmOrdner, 'sample', name), ordner)
+            SynthetischerBalken(ordner, anzahl)
+            datensaetze.append((ordner, 'balken_{}'.format(anzahl)))
+
+        for ordner, name in datensaetze:
+            print('Messe', name, file=sys.stderr)
+            ergebnisse['datensaetze'].append(DatensatzMessen(ordner, name, args.wiederholungen))
+
+    text = json.dumps(ergebnisse, indent=2)
+    if args.ausgabe:
+        with open(args.ausgabe, 'w') as datei:
+            datei.write(text)
+    else:
+        print(text)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Enthält die Funktionen zum Export der Modellkontur, der Faserverläufe und der Sensoren in eine .dxf Datei.
+
+Author: Philipp Haug
+Date: 24.05.2023
+Version: 1.0
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import ezdxf
+import numpy as np
+
+import Instrumentierung as IM
+
+import Method as M9
+
+#Name des Blocks mit der Bauteilkontur in der _Sensors.dxf
+KonturBlock = 'Contour'
+
+#Hintergrundthread für ExportImHintergrund
+_Exporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix='DXFExport')
+
+def DrawingKoordinaten(punkte : np.ndarray, transformation : tuple):
+    """Rechnet Bildkoordinaten in Drawing Koordinaten um
+
+    Args:
+        punkte (np.ndarray) : Pixelkoordinaten (x, y) in der letzten Achse, beliebige Form
+        transformation (tuple) : Bild zu Drawing Transformation (x, yC, scalex, scaley)
+
+    Returns:
+       np.ndarray : Drawing Koordinaten in derselben Form
+    """
+    x, yC, scalex, scaley = transformation
+    punkte = np.asarray(punkte, dtype=np.float64)
+    return np.stack([(punkte[..., 0] - x) / scalex, (yC - punkte[..., 1]) / scaley], axis=-1)
+
+
+def Bildkoordinaten(punkte : np.ndarray, transformation : tuple):
+    """Rechnet Drawing Koordinaten in Bildkoordinaten um, Umkehrung von DrawingKoordinaten
+
+    Args:
+        punkte (np.ndarray) : Drawing Koordinaten (x, y) in der letzten Achse, beliebige Form
+        transformation (tuple) : Bild zu Drawing Transformation (x, yC, scalex, scaley)
+
+    Returns:
+       np.ndarray : Pixelkoordinaten in derselben Form, nicht gerundet
+    """
+    x, yC, scalex, scaley = transformation
+    punkte = np.asarray(punkte, dtype=np.float64)
+    return np.stack([x + punkte[..., 0] * scalex, yC - punkte[..., 1] * scaley], axis=-1)
+
+
+def SensorenMalenDXF(msp, transformation : tuple, Sensoren : np.ndarray):
+    """Zeichnet die Sensoren in die auszugebende .dxf. Jeder Sensor wird als eine LWPOLYLINE
+    Anschluss 1 - Sensorpunkt 1 - Sensorpunkt 2 - Anschluss 2 ausgegeben
+
+    Args:
+        msp : DXF-Modelspace in dem die Sensoren platziert werden sollen
+        transformation (tuple) : Bild zu Drawing Transformation (x, yC, scalex, scaley)
+        Sensoren (np.ndarray) : Zu zeichnende Sensoren
+
+    Returns:
+    """
+    linienzuege = DrawingKoordinaten(Sensoren['punkte'], transformation).tolist()
+
+    for linienzug in linienzuege:
+        msp.add_lwpolyline(linienzug, format='xy', dxfattribs={'layer': 'Sensor', "color": 1})
+
+
+def DateiPruefen(pfad : str):
+    """Prüft, ob eine DXF-Datei vollständig geschrieben wurde. Die Datei muss Daten enthalten und mit dem EOF Marker enden
+
+    Args:
+        pfad (str) : Pfad der DXF-Datei
+
+    Raises:
+        OSError wenn die Datei fehlt, leer oder unvollständig ist
+
+    Returns:
+       int : Dateigröße in Bytes
+    """
+    groesse = os.path.getsize(pfad)
+    if groesse == 0:
+        raise OSError('DXF-Datei ist leer: ' + pfad)
+
+    with open(pfad, 'rb') as datei:
+        datei.seek(max(groesse - 64, 0))
+        ende = datei.read()
+    if ende.split()[-1:] != [b'EOF']:
+        raise OSError('DXF-Datei ist unvollständig: ' + pfad)
+
+    return groesse
+
+
+@IM.Messen
+def Export(nameContourdxf : str, nameSplinesdxf : str, Sensoren, Anzahl : int, transformation : tuple, fortschritt=None):
+    """Erstellt mehrere Schichten (Modellschicht, Modellschicht mit Faser, Sensorschicht) und speichert diese als DXF-File.
+    Die Datei wird zunächst unter einem temporären Namen geschrieben, geprüft und erst dann umbenannt, sodass unter
+    dem Zielnamen nie eine unvollständige Datei liegt
+
+    Args:
+        nameContourdxf (str) : Pfad der Contour.dxf Datei
+        nameSplinesdxf (str) : Pfad der Splines.dxf Datei
+        Sensoren (np.ndarray) : Sensoren aufsteigend nach Länge sortiert, wie von Method.SensorErkennung geliefert
+        Anzahl (int) : Anzahl der zu exportierenden Sensoren, beginnend beim längsten
+        transformation (tuple) : Bild zu Drawing Transformation (x, yC, scalex, scaley)
+        fortschritt : Funktion fortschritt(anteil, text), die nach jedem Schritt mit dem Anteil zwischen 0 und 1 aufgerufen wird
+
+    Raises:
+        OSError wenn die geschriebene Datei die Prüfung nicht besteht
+
+    Returns:
+       str : Pfad der geschriebenen _Sensors.dxf Datei
+    """
+    def Melden(anteil, text):
+        if fortschritt is not None:
+            fortschritt(anteil, text)
+
+    NewNamedxf = nameContourdxf[:-11] + '_Sensors.dxf'
+    tmpNamedxf = NewNamedxf + '.tmp'
+
+    Melden(0.0, 'Lese Kontur und Fasern')
+    doc = ezdxf.new('R2010')
+    Contourdxf = ezdxf.readfile(nameContourdxf)
+    Splinesdxf = ezdxf.readfile(nameSplinesdxf)
+
+    Melden(0.4, 'Erstelle Schichten')
+    # Die Kontur wird einmal als Block definiert und auf jeder Schicht nur referenziert. Die Elemente liegen auf
+    # Layer 0 mit Farbe BYBLOCK und übernehmen dadurch Schicht und Farbe der jeweiligen Einfügung
+    konturBlock = doc.blocks.new(name=KonturBlock)
+    for entity in Contourdxf.modelspace():
+        entity_copy = entity.copy()
+        entity_copy.dxf.layer = '0'
+        entity_copy.dxf.color = 0
+        konturBlock.add_entity(entity_copy)
+
+    # Create Start and finish Layer
+    doc.modelspace().add_blockref(KonturBlock, (0, 0), dxfattribs={'layer': 'OnlyContour', 'color': 7})
+
+    # Contour + Fiber
+    for entity in Splinesdxf.modelspace():
+        entity_copy = entity.copy()
+        entity_copy.dxf.layer = 'ContourAndFiber'
+        entity_copy.dxf.color = 3
+        doc.modelspace().add_entity(entity_copy)
+    doc.modelspace().add_blockref(KonturBlock, (0, 0), dxfattribs={'layer': 'ContourAndFiber', 'color': 7})
+
+    #Sensor Schicht
+    doc.modelspace().add_blockref(KonturBlock, (0, 0), dxfattribs={'layer': 'Sensor', 'color': 7})
+    SensorenMalenDXF(doc.modelspace(), transformation, M9.Laengste(Sensoren, Anzahl))
+
+    Melden(0.6, 'Speichere ' + os.path.basename(NewNamedxf))
+    try:
+        doc.saveas(tmpNamedxf)
+        groesse = DateiPruefen(tmpNamedxf)
+        os.replace(tmpNamedxf, NewNamedxf)
+    except BaseException:
+        if os.path.exists(tmpNamedxf):
+            os.remove(tmpNamedxf)
+        raise
+
+    if os.path.getsize(NewNamedxf) != groesse:
+        raise OSError('DXF-Datei wurde beim Umbenennen verändert: ' + NewNamedxf)
+
+    Melden(1.0, 'Export abgeschlossen')
+    return NewNamedxf
+
+
+def ExportImHintergrund(nameContourdxf : str, nameSplinesdxf : str, Sensoren, Anzahl : int, transformation : tuple, fertig=None, fortschritt=None):
+    """Startet den Export in einem Hintergrundthread. Exporte laufen nacheinander ab
+
+    Args:
+        nameContourdxf (str) : Pfad der Contour.dxf Datei
+        nameSplinesdxf (str) : Pfad der Splines.dxf Datei
+        Sensoren (np.ndarray) : Sensoren aufsteigend nach Länge sortiert, wie von Method.SensorErkennung geliefert
+        Anzahl (int) : Anzahl der zu exportierenden Sensoren, beginnend beim längsten
+        transformation (tuple) : Bild zu Drawing Transformation (x, yC, scalex, scaley)
+        fertig : Funktion fertig(future), die nach Abschluss im Hintergrundthread aufgerufen wird
+        fortschritt : Funktion fortschritt(anteil, text), wird im Hintergrundthread aufgerufen
+
+    Returns:
+       concurrent.futures.Future : Ergebnis mit dem Pfad der geschriebenen Datei oder der aufgetretenen Ausnahme
+    """
+    # Die Sensoren werden kopiert, damit spätere Änderungen im Aufrufer den laufenden Export nicht beeinflussen
+    future = _Exporter.submit(Export, nameContourdxf, nameSplinesdxf, np.array(Sensoren), Anzahl, transformation, fortschritt)
+    if fertig is not None:
+        future.add_done_callback(fertig)
+    return future
@@ -1,16 +1,710 @@
 """
 Enthält die Funktion 'Aufbereitung', welche die aus NX generierten Dateien mit Druck und Zugspannungen einliest, 
 verarbeitet diese und ein Modellbild und ein Bild mit den Werten in den aktuellen Arbeitsordner abspeichert.
+Die Elemente werden dazu direkt mit NumPy auf ein Pixelraster abgebildet, ohne Umweg über matplotlib.
 
 Author: Philipp Haug
 Date: 24.05.2023
 Version: 3.1
 """
 
-import matplotlib.pyplot as plt
+import cv2
+import hashlib
+import numpy as np
 import pandas as pd
+import os
+import Instrumentierung as IM
+import Method as M9
 
-def Aufbereitung(MinPrincipal, MaxPrincipal, path):
+#Bildformat wie bisher plt.figure(figsize=(15,3)) mit dpi=120
+BildGroesse = (15, 3)
+#Lage der Achsen im Bild (links, unten, breite, höhe) als Anteil der Bildgröße, wie bei matplotlib
+Achsen = (0.125, 0.11, 0.775, 0.77)
+#Rand um die Datenpunkte als Anteil des Wertebereichs, wie bei matplotlib
+Rand = 0.05
+#Radius eines Elements in Punkt. Der matplotlib Marker (6pt mit 1.5pt Rand) bedeckt Pixel bis ca. 3pt vom Mittelpunkt
+#vollständig, nur diese hatten die exakte Farbe. Verbreitert wird mit einem Quadrat dieser halben Kantenlänge (siehe Verbreitern)
+ElementRadius = 3.0
+
+#Anzahl größter/kleinster Werte, deren Mittelwert als Maximalspannung gilt, um Singularitäten auszuschließen
+AnzahlExtremwerte = 5
+#Anteil der maximalen Druck- bzw. Zugspannung, ab dem ein Element markiert wird
+AnteilDruck = 1 / 3
+AnteilZug = 1 / 4
+
+#Zeilen pro Block beim blockweisen Einlesen
+BlockZeilen = 1 << 20
+#Ab dieser Größe der MaxPrincipal.csv in Bytes werden die Dateien blockweise mit begrenztem Speicherbedarf verarbeitet
+GroesseBlockweise = 1 << 30
+
+#Version des Bildzwischenspeichers, bei Änderungen an der Bilderstellung erhöhen
+CacheVersion = 2
+#Anzahl der Einträge, die im Bildzwischenspeicher eines Arbeitsordners behalten werden
+CacheEintraege = 8
+
+#Farben in BGR not RGB
+Grau = (160, 160, 160)
+Orange = (0, 165, 255)
+Lila = (240, 32, 160)
+
+def DateienSuchen(path):
+    """Sucht die aus NX und CAD exportierten Dateien im Arbeitsordner
+
+    Args:
+        path (str) : Aktueller Arbeitsordner
+
+    Returns:
+       str, str, str, str : Pfade von Contour.dxf, Splines.dxf, MinPrincipal.csv und MaxPrincipal.csv. Leer wenn nicht gefunden
+    """
+    nameContourdxf = ''
+    nameSplinesdxf = ''
+    MinPrincipal = ''
+    MaxPrincipal = ''
+
+    for file_name in os.listdir(path):
+        if file_name.endswith('Splines.dxf'):
+            nameSplinesdxf = os.path.join(path, file_name)
+        if file_name.endswith('Contour.dxf'):
+            nameContourdxf = os.path.join(path, file_name)
+        if file_name.endswith('MinPrincipal.csv'):
+            MinPrincipal = os.path.join(path, file_name)
+        if file_name.endswith('MaxPrincipal.csv'):
+            MaxPrincipal = os.path.join(path, file_name)
+
+    return nameContourdxf, nameSplinesdxf, MinPrincipal, MaxPrincipal
+
+def _Zwischenspeicher(csvPfad : str, einlesen):
+    """Liest die Spalten einer CSV Datei aus der binären Begleitdatei (csvPfad + '.npz') oder liest die CSV ein
+    und schreibt die Begleitdatei. Diese gilt nur, solange Größe und Änderungszeit der CSV gleich bleiben.
+
+    Args:
+        csvPfad (str) : Pfad der CSV Datei
+        einlesen : Funktion, die aus dem CSV Pfad ein dict mit den Spalten als np.ndarray erstellt
+
+    Returns:
+       dict : Spaltenname zu np.ndarray
+    """
+    cachePfad = csvPfad + '.npz'
+    stat = os.stat(csvPfad)
+    kennung = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    try:
+        with np.load(cachePfad) as daten:
+            if np.array_equal(daten['_kennung'], kennung):
+                return {name: daten[name] for name in daten.files if name != '_kennung'}
+    except (OSError, KeyError, ValueError):
+        pass
+
+    spalten = einlesen(csvPfad)
+
+    # Erst temporär schreiben und dann umbenennen, damit nie eine halbe Begleitdatei gelesen wird
+    tmpPfad = cachePfad + '.tmp'
+    try:
+        with open(tmpPfad, 'wb') as datei:
+            np.savez(datei, _kennung=kennung, **spalten)
+        os.replace(tmpPfad, cachePfad)
+    except OSError:
+        if os.path.exists(tmpPfad):
+            os.remove(tmpPfad)
+
+    return spalten
+
+
+#Zeilen pro Block beim Einlesen von Dateien fester Breite
+_BlockZeilen = 1 << 15
+
+def _FeldParsen(feld : np.ndarray):
+    """Wandelt eine Spalte fester Breite in Zahlen um.
+    Unterstützt rechtsbündige Ganzzahlen und Kommazahlen mit oder ohne Exponent, wie sie NX schreibt.
+
+    Args:
+        feld (np.ndarray) : uint8 Zeichencodes der Spalte, Form (Spaltenbreite, Zeilen), je Zeichenposition zusammenhängend
+
+    Returns:
+       np.ndarray : Werte als float64, None wenn das Format nicht in allen Zeilen gleich ist
+    """
+    breite, anzahl = feld.shape
+
+    # Exponent und Dezimalpunkt müssen in allen Zeilen an derselben Stelle stehen
+    e, p = breite, None
+    for j in range(breite):
+        zeichen = feld[j]
+        istE = (zeichen == 101) | (zeichen == 69)
+        if istE.any():
+            if not istE.all() or e != breite:
+                return None
+            e = j
+        elif (zeichen == 46).any():
+            if not (zeichen == 46).all() or p is not None:
+                return None
+            p = j
+    if p is None:
+        p = e
+    elif p > e:
+        return None
+
+    mantisse = np.zeros(anzahl, dtype=np.int64)
+    exponent = np.zeros(anzahl, dtype=np.int64)
+    negativ = np.zeros(anzahl, dtype=bool)
+    negativExp = np.zeros(anzahl, dtype=bool)
+    begonnen = np.zeros(anzahl, dtype=bool)
+
+    for j in range(breite):
+        if j == e or j == p:
+            continue
+        zeichen = feld[j]
+        ziffer = zeichen - np.uint8(48)
+        istZiffer = ziffer < 10
+        istLeer = zeichen == 32
+        istVorzeichen = (zeichen == 45) | (zeichen == 43)
+        wert = np.where(istZiffer, ziffer, 0)
+
+        if j < e:
+            # Mantisse: Vorzeichen und Leerzeichen nur vor der ersten Ziffer
+            if not (istZiffer | istLeer | istVorzeichen).all() or (begonnen & ~istZiffer).any():
+                return None
+            begonnen |= istZiffer
+            mantisse = mantisse * 10 + wert
+            negativ |= zeichen == 45
+        else:
+            # Exponent: Vorzeichen nur direkt nach dem 'e'
+            if not (istZiffer | (istVorzeichen & (j == e + 1))).all():
+                return None
+            exponent = exponent * 10 + wert
+            negativExp |= zeichen == 45
+
+    nachkomma = e - p - 1 if p < e else 0
+    exponent = np.where(negativExp, -exponent, exponent) - nachkomma
+    werte = mantisse * 10.0 ** exponent
+
+    return np.where(negativ, -werte, werte)
+
+
+def _FesteBreiteEinlesen(pfad : str, anzahlSpalten : int):
+    """Schneller Pfad für durch Leerzeichen ausgerichtete Dateien, in denen alle Zeilen gleich lang sind.
+    Die Datei wird als Zeichenmatrix betrachtet und jede Spalte vektorisiert umgewandelt.
+
+    Args:
+        pfad (str) : Pfad der Datei, die erste Zeile ist die Kopfzeile
+        anzahlSpalten (int) : Erwartete Anzahl an Spalten
+
+    Returns:
+       list : Eine float64 np.ndarray pro Spalte, None wenn die Datei nicht dieses Format hat
+    """
+    with open(pfad, 'rb') as datei:
+        datei.readline()
+        daten = datei.read()
+    # Fehlender Zeilenumbruch nach der letzten Zeile
+    if not daten.endswith(b'\n'):
+        daten += b'\r\n' if b'\r\n' in daten[:4096] else b'\n'
+
+    zeilenLaenge = daten.find(b'\n') + 1
+    if zeilenLaenge <= 1 or len(daten) % zeilenLaenge:
+        return None
+
+    zeichen = np.frombuffer(daten, dtype=np.uint8).reshape(-1, zeilenLaenge)
+    if not (zeichen[:, -1] == 10).all():
+        return None
+    zeichen = zeichen[:, :-2] if (zeichen[:, -2] == 13).all() else zeichen[:, :-1]
+
+    # Spaltengrenzen liegen dort, wo in allen Zeilen ein Leerzeichen steht
+    trenner = (zeichen == 32).all(axis=0).astype(np.int8)
+    kanten = np.flatnonzero(np.diff(np.concatenate(([1], trenner, [1]))))
+    if len(kanten) != 2 * anzahlSpalten:
+        return None
+
+    anzahl = zeichen.shape[0]
+    spalten = [np.empty(anzahl, dtype=np.float64) for _ in range(anzahlSpalten)]
+
+    # Blockweise, damit die transponierten Zeichen im Cache bleiben
+    for start in range(0, anzahl, _BlockZeilen):
+        # Eine Zeile pro Zeichenposition, damit jede Position zusammenhängend im Speicher liegt
+        block = np.ascontiguousarray(zeichen[start:start + _BlockZeilen].T)
+        for spalte, anfang, ende in zip(spalten, kanten[::2], kanten[1::2]):
+            werte = _FeldParsen(block[anfang:ende])
+            if werte is None:
+                return None
+            spalte[start:start + len(werte)] = werte
+
+    return spalten
+
+
+def _ElementeEinlesen(MaxPrincipal : str):
+    """Liest die durch Leerzeichen getrennte MaxPrincipal.csv mit festen Datentypen ein"""
+    namen = ['Elem ID', 'Y Coord', 'Z Coord', 'Max Principal']
+    typen = [np.int32, np.float32, np.float32, np.float32]
+
+    spalten = _FesteBreiteEinlesen(MaxPrincipal, len(namen))
+    if spalten is not None:
+        return {name: werte.astype(typ) for name, werte, typ in zip(namen, spalten, typen)}
+
+    # Die Kopfzeile 'Elem ID  Y Coord  Z Coord  Max Principal' enthält selbst Leerzeichen und wird übersprungen
+    df = pd.read_csv(MaxPrincipal, sep=r'\s+', header=None, skiprows=1, engine='c',
+                     names=['Elem ID', 'Y Coord', 'Z Coord', 'Max Principal'],
+                     dtype={'Elem ID': np.int32, 'Y Coord': np.float32, 'Z Coord': np.float32, 'Max Principal': np.float32})
+    return {name: df[name].to_numpy() for name in df.columns}
+
+
+def _DruckEinlesen(MinPrincipal : str):
+    """Liest die MinPrincipal.csv mit festem Datentyp ein"""
+    df = pd.read_csv(MinPrincipal, usecols=['Min Principal'], dtype={'Min Principal': np.float32}, engine='c')
+    return {'Min Principal': df['Min Principal'].to_numpy()}
+
+
+@IM.Messen
+def ElementeLaden(MaxPrincipal : str):
+    """Lädt Elementnummern, Koordinaten und Zugspannungen aus der MaxPrincipal.csv.
+    Beim ersten Laden wird eine binäre Begleitdatei geschrieben, die bei unveränderter CSV wiederverwendet wird.
+
+    Args:
+        MaxPrincipal (str) : Name der MaxPrincipal.csv Datei mit den Zugspannungen und Elementcoordinaten
+
+    Returns:
+       np.ndarray, np.ndarray, np.ndarray, np.ndarray : Elem ID (int32), Y Coord, Z Coord und Max Principal (float32)
+    """
+    spalten = _Zwischenspeicher(MaxPrincipal, _ElementeEinlesen)
+    return spalten['Elem ID'], spalten['Y Coord'], spalten['Z Coord'], spalten['Max Principal']
+
+
+@IM.Messen
+def DruckLaden(MinPrincipal : str):
+    """Lädt die Druckspannungen aus der MinPrincipal.csv. Die Zeilen entsprechen denen der MaxPrincipal.csv.
+    Beim ersten Laden wird eine binäre Begleitdatei geschrieben, die bei unveränderter CSV wiederverwendet wird.
+
+    Args:
+        MinPrincipal (str) : Name der MinPrincipal.csv Datei mit den Druckspannungen
+
+    Returns:
+       np.ndarray : Min Principal (float32)
+    """
+    return _Zwischenspeicher(MinPrincipal, _DruckEinlesen)['Min Principal']
+
+
+def _Achsenbereich(grenzen : tuple):
+    """Wertebereich der Achsen mit Rand, wie bei matplotlib
+
+    Args:
+        grenzen (tuple) : Wertebereich aller Elemente (yMin, yMax, zMin, zMax)
+
+    Returns:
+       float, float, float, float : yMin, yMax, zMin, zMax der Achsen
+    """
+    yMin, yMax, zMin, zMax = (float(g) for g in grenzen)
+    yRand = (yMax - yMin) * Rand or 1.0
+    zRand = (zMax - zMin) * Rand or 1.0
+    return yMin - yRand, yMax + yRand, zMin - zRand, zMax + zRand
+
+
+def Pixelkoordinaten(YCoord : np.ndarray, ZCoord : np.ndarray, dpi : int = 120, grenzen : tuple = None):
+    """Bildet die Elementkoordinaten auf das Pixelraster ab
+
+    Args:
+        YCoord (np.ndarray) : Y-Koordinaten der Elemente (Bild X-Achse)
+        ZCoord (np.ndarray) : Z-Koordinaten der Elemente (Bild Y-Achse)
+        dpi (int) : Auflösung in Pixel pro Zoll
+        grenzen (tuple) : Wertebereich aller Elemente (yMin, yMax, zMin, zMax). Bei None aus YCoord und ZCoord ermittelt
+
+    Returns:
+       np.ndarray, np.ndarray, tuple : Pixelspalte und Pixelzeile jedes Elements, Bildform (Höhe, Breite)
+    """
+    breite = int(BildGroesse[0] * dpi)
+    hoehe = int(BildGroesse[1] * dpi)
+    links, unten, achsBreite, achsHoehe = Achsen
+
+    if grenzen is None:
+        grenzen = (YCoord.min(), YCoord.max(), ZCoord.min(), ZCoord.max())
+    yMin, yMax, zMin, zMax = _Achsenbereich(grenzen)
+
+    px = (links + (YCoord - yMin) / (yMax - yMin) * achsBreite) * breite
+    # Bildzeilen zählen von oben
+    py = hoehe - (unten + (ZCoord - zMin) / (zMax - zMin) * achsHoehe) * hoehe
+
+    px = np.clip(np.floor(px + 0.5), 0, breite - 1).astype(np.int32)
+    py = np.clip(np.floor(py + 0.5), 0, hoehe - 1).astype(np.int32)
+
+    return px, py, (hoehe, breite)
+
+
+def Modellkoordinaten(px : np.ndarray, py : np.ndarray, grenzen : tuple, dpi : int = 120):
+    """Umkehrung von Pixelkoordinaten: bildet Pixel auf Elementkoordinaten ab
+
+    Args:
+        px (np.ndarray) : Pixelspalten, auch Kommazahlen
+        py (np.ndarray) : Pixelzeilen, auch Kommazahlen
+        grenzen (tuple) : Wertebereich aller Elemente (yMin, yMax, zMin, zMax)
+        dpi (int) : Auflösung in Pixel pro Zoll
+
+    Returns:
+       np.ndarray, np.ndarray : Y- und Z-Koordinaten
+    """
+    breite = int(BildGroesse[0] * dpi)
+    hoehe = int(BildGroesse[1] * dpi)
+    links, unten, achsBreite, achsHoehe = Achsen
+    yMin, yMax, zMin, zMax = _Achsenbereich(grenzen)
+
+    YCoord = yMin + (np.asarray(px, dtype=np.float64) / breite - links) / achsBreite * (yMax - yMin)
+    ZCoord = zMin + ((hoehe - np.asarray(py, dtype=np.float64)) / hoehe - unten) / achsHoehe * (zMax - zMin)
+
+    return YCoord, ZCoord
+
+
+def Bildtransformation(grenzen : tuple, dpi : int = 120):
+    """Bild zu Elementkoordinaten Transformation (x, yC, scalex, scaley) wie in DXFExport.DrawingKoordinaten.
+    Entspricht Modellkoordinaten, ohne Rundung auf ganze Pixel
+
+    Args:
+        grenzen (tuple) : Wertebereich aller Elemente (yMin, yMax, zMin, zMax)
+        dpi (int) : Auflösung in Pixel pro Zoll
+
+    Returns:
+       float, float, float, float : Pixelspalte von Y = 0, Pixelzeile von Z = 0, Pixel pro Einheit in Y und in Z
+    """
+    breite = int(BildGroesse[0] * dpi)
+    hoehe = int(BildGroesse[1] * dpi)
+    links, unten, achsBreite, achsHoehe = Achsen
+    yMin, yMax, zMin, zMax = _Achsenbereich(grenzen)
+
+    scalex = breite * achsBreite / (yMax - yMin)
+    scaley = hoehe * achsHoehe / (zMax - zMin)
+    return breite * links - yMin * scalex, hoehe * (1 - unten) + zMin * scaley, scalex, scaley
+
+
+def Maske(px : np.ndarray, py : np.ndarray, form : tuple, dpi : int = 120):
+    """Erstellt die Maske aller Pixel, die von den Elementen bedeckt werden
+
+    Args:
+        px (np.ndarray) : Pixelspalte der Elemente
+        py (np.ndarray) : Pixelzeile der Elemente
+        form (tuple) : Bildform (Höhe, Breite)
+        dpi (int) : Auflösung in Pixel pro Zoll
+
+    Returns:
+       np.ndarray : uint8 Maske, 255 wo ein Element liegt
+    """
+    maske = np.zeros(form, dtype=np.uint8)
+    maske[py, px] = 255
+
+    return Verbreitern(maske, dpi)
+
+
+def Verbreitern(maske : np.ndarray, dpi : int = 120):
+    """Erweitert jeden markierten Pixel auf die Fläche eines Elements
+
+    Args:
+        maske (np.ndarray) : uint8 Maske mit den Mittelpunkten der Elemente
+        dpi (int) : Auflösung in Pixel pro Zoll
+
+    Returns:
+       np.ndarray : uint8 Maske, 255 wo ein Element liegt
+    """
+    # Ein Kreis ließe bei dem ungleichmäßigen Elementabstand der NX Netze Lücken zwischen den Elementreihen und einen
+    # gewellten Rand, an dem whiteFeld die Anschlüsse in die Lücken statt nach außen setzt. Das Quadrat mit derselben
+    # Ausdehnung schließt die Lücken und ergibt gerade Ränder wie der geglättete Rand des matplotlib Bildes
+    r = int(round(ElementRadius * dpi / 72))
+    quadrat = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * r + 1, 2 * r + 1))
+
+    return cv2.dilate(maske, quadrat)
+
+
+def Bilder(maskModell : np.ndarray, maskZug : np.ndarray, maskDruck : np.ndarray):
+    """Setzt aus den Masken das Modellbild und das Bild mit den Werten zusammen
+
+    Args:
+        maskModell (np.ndarray) : Maske des Modells
+        maskZug (np.ndarray) : Maske der Zugspannungen
+        maskDruck (np.ndarray) : Maske der Druckspannungen
+
+    Returns:
+       np.ndarray, np.ndarray : Modellbild und Bild mit den Werten in BGR
+    """
+    ModellBild = np.full(maskModell.shape + (3,), 255, dtype=np.uint8)
+    ModellBild[maskModell > 0] = Grau
+
+    image = ModellBild.copy()
+    image[maskZug > 0] = Orange
+    image[maskDruck > 0] = Lila
+
+    return ModellBild, image
+
+
+def Maximalspannung(werte : np.ndarray, n : int = AnzahlExtremwerte, groesste : bool = True):
+    """Mittelwert der n größten bzw. kleinsten Werte. Wie bei pandas nlargest(n, keep='all') werden bei Gleichstand
+    mit dem n-ten Wert alle gleichen Werte einbezogen. Die Auswahl erfolgt mit np.partition ohne vollständige Sortierung.
+
+    Args:
+        werte (np.ndarray) : Spannungswerte
+        n (int) : Anzahl der Extremwerte
+        groesste (bool) : True für die größten Werte (Zug), False für die kleinsten (Druck)
+
+    Returns:
+       float : Mittelwert der Extremwerte
+    """
+    if np.isnan(werte).any():
+        werte = werte[~np.isnan(werte)]
+    n = min(n, len(werte))
+
+    if groesste:
+        grenze = np.partition(werte, len(werte) - n)[len(werte) - n]
+        auswahl = werte[werte >= grenze]
+    else:
+        grenze = np.partition(werte, n - 1)[n - 1]
+        auswahl = werte[werte <= grenze]
+
+    return float(auswahl.mean(dtype=np.float64))
+
+
+def Auswahl(Zug : np.ndarray, Druck : np.ndarray, anteileZug = (AnteilZug,), anteileDruck = (AnteilDruck,), n : int = AnzahlExtremwerte):
+    """Wählt die Elemente mit hohen Zug- bzw. Druckspannungen für mehrere Schwellwerte in einem Durchgang aus
+
+    Args:
+        Zug (np.ndarray) : Zugspannungen je Element
+        Druck (np.ndarray) : Druckspannungen je Element, zeilengleich mit Zug
+        anteileZug (list) : Anteile der maximalen Zugspannung, ab denen ein Element markiert wird
+        anteileDruck (list) : Anteile der maximalen Druckspannung, ab denen ein Element markiert wird
+        n (int) : Anzahl der Extremwerte, deren Mittelwert als Maximalspannung gilt
+
+    Returns:
+       np.ndarray, np.ndarray : Boolesche Auswahl Form (Anzahl Schwellwerte, Anzahl Elemente) für Zug und Druck
+    """
+    grenzenZug = Maximalspannung(Zug, n, True) * np.asarray(anteileZug, dtype=np.float64)
+    grenzenDruck = Maximalspannung(Druck, n, False) * np.asarray(anteileDruck, dtype=np.float64)
+
+    istZug = Zug[None, :] >= grenzenZug[:, None]
+    istDruck = Druck[None, :] <= grenzenDruck[:, None]
+
+    return istZug, istDruck
+
+
+@IM.Messen
+def AufbereitungStufen(MinPrincipal, MaxPrincipal, anteileZug = (AnteilZug,), anteileDruck = (AnteilDruck,), n : int = AnzahlExtremwerte, dpi : int = 120):
+    """Erstellt die Masken für mehrere Schwellwerte auf einmal, zB für den Vergleich verschiedener Sensorauslegungen.
+    Die Daten werden nur einmal eingelesen und auf das Pixelraster abgebildet.
+
+    Args:
+        MinPrincipal (str) : Name der MinPrincipal.csv Datei mit den Druckspannungen
+        MaxPrincipal (str) : Name der MaxPrincipal.csv Datei mit den Zugspannungen und Elementcoordinaten
+        anteileZug (list) : Anteile der maximalen Zugspannung, ab denen ein Element markiert wird
+        anteileDruck (list) : Anteile der maximalen Druckspannung, ab denen ein Element markiert wird
+        n (int) : Anzahl der Extremwerte, deren Mittelwert als Maximalspannung gilt
+        dpi (int) : Auflösung in Pixel pro Zoll
+
+    Returns:
+       np.ndarray, list, list : uint8 Maske des Modells, Masken der Zugspannungen und der Druckspannungen je Schwellwert
+    """
+    ElemID, YCoord, ZCoord, Zug = ElementeLaden(MaxPrincipal)
+    Druck = DruckLaden(MinPrincipal)
+
+    px, py, form = Pixelkoordinaten(YCoord, ZCoord, dpi)
+    maskModell = Maske(px, py, form, dpi)
+
+    istZug, istDruck = Auswahl(Zug, Druck, anteileZug, anteileDruck, n)
+
+    masksZug = [Maske(px[auswahl], py[auswahl], form, dpi) for auswahl in istZug]
+    masksDruck = [Maske(px[auswahl], py[auswahl], form, dpi) for auswahl in istDruck]
+
+    return maskModell, masksZug, masksDruck
+
+
+class _Extremwerte:
+    """Sammelt blockweise die n größten Werte, ohne alle Werte im Speicher zu halten. Der Mittelwert entspricht
+    Maximalspannung, einschließlich aller Werte, die mit dem n-ten Wert gleichauf liegen.
+    """
+    def __init__(self, n : int, groesste : bool = True):
+        """
+        Args:
+            n (int) : Anzahl der Extremwerte
+            groesste (bool) : True für die größten Werte (Zug), False für die kleinsten (Druck)
+        """
+        self.n = n
+        self.vorzeichen = 1.0 if groesste else -1.0
+        self.werte = np.empty(0, dtype=np.float64)
+        # Anzahl verworfener Werte, die gleich dem kleinsten behaltenen Wert sind
+        self.gleich = 0
+
+    def hinzufuegen(self, werte : np.ndarray):
+        """Nimmt die Werte eines Blocks auf"""
+        werte = self.vorzeichen * werte[~np.isnan(werte)].astype(np.float64)
+        alle = np.concatenate((self.werte, werte))
+        if len(alle) <= self.n:
+            self.werte = alle
+            return
+
+        grenzeAlt = self.werte.min() if len(self.werte) == self.n else None
+        behalten = np.partition(alle, len(alle) - self.n)[len(alle) - self.n:]
+        grenze = behalten.min()
+
+        gleich = int((alle == grenze).sum() - (behalten == grenze).sum())
+        if grenzeAlt == grenze:
+            gleich += self.gleich
+        self.werte, self.gleich = behalten, gleich
+
+    def mittelwert(self):
+        """Mittelwert der Extremwerte mit Vorzeichen der Eingangswerte"""
+        summe = self.werte.sum() + self.gleich * (self.werte.min() if len(self.werte) else 0.0)
+        return float(self.vorzeichen * summe / (len(self.werte) + self.gleich))
+
+
+def BloeckeLesen(MinPrincipal : str, MaxPrincipal : str, blockZeilen : int = BlockZeilen):
+    """Liest MaxPrincipal.csv und MinPrincipal.csv gleichzeitig blockweise. Die Zeilen beider Dateien gehören
+    über ihre Position zusammen, daher werden immer gleich viele Zeilen aus beiden Dateien gelesen.
+
+    Args:
+        MinPrincipal (str) : Name der MinPrincipal.csv Datei mit den Druckspannungen
+        MaxPrincipal (str) : Name der MaxPrincipal.csv Datei mit den Zugspannungen und Elementcoordinaten
+        blockZeilen (int) : Anzahl der Zeilen pro Block
+
+    Raises:
+        ValueError wenn die Dateien unterschiedlich viele Zeilen haben
+
+    Returns:
+       generator : Je Block Y Coord, Z Coord, Max Principal und Min Principal als float32 np.ndarray
+    """
+    elemente = pd.read_csv(MaxPrincipal, sep=r'\s+', header=None, skiprows=1, engine='c', chunksize=blockZeilen,
+                           usecols=[1, 2, 3], names=['Elem ID', 'Y Coord', 'Z Coord', 'Max Principal'],
+                           dtype={'Y Coord': np.float32, 'Z Coord': np.float32, 'Max Principal': np.float32})
+    druck = pd.read_csv(MinPrincipal, usecols=['Min Principal'], dtype={'Min Principal': np.float32}, engine='c', chunksize=blockZeilen)
+
+    with elemente, druck:
+        while True:
+            blockElemente = next(elemente, None)
+            blockDruck = next(druck, None)
+            if blockElemente is None and blockDruck is None:
+                return
+            if blockElemente is None or blockDruck is None or len(blockElemente) != len(blockDruck):
+                raise ValueError('MaxPrincipal.csv und MinPrincipal.csv haben unterschiedlich viele Zeilen')
+
+            yield (blockElemente['Y Coord'].to_numpy(), blockElemente['Z Coord'].to_numpy(),
+                   blockElemente['Max Principal'].to_numpy(), blockDruck['Min Principal'].to_numpy())
+
+
+@IM.Messen
+def AufbereitungStufenBlockweise(MinPrincipal, MaxPrincipal, anteileZug = (AnteilZug,), anteileDruck = (AnteilDruck,), n : int = AnzahlExtremwerte,
+                                 dpi : int = 120, blockZeilen : int = BlockZeilen):
+    """Wie AufbereitungStufen, aber ohne die Dateien vollständig in den Speicher zu laden. Der Speicherbedarf hängt nur
+    von blockZeilen und der Bildgröße ab, nicht von der Anzahl der Elemente.
+    Im ersten Durchgang werden Wertebereich und Extremwerte bestimmt, im zweiten die Elemente in die Masken eingetragen.
+
+    Args:
+        MinPrincipal (str) : Name der MinPrincipal.csv Datei mit den Druckspannungen
+        MaxPrincipal (str) : Name der MaxPrincipal.csv Datei mit den Zugspannungen und Elementcoordinaten
+        anteileZug (list) : Anteile der maximalen Zugspannung, ab denen ein Element markiert wird
+        anteileDruck (list) : Anteile der maximalen Druckspannung, ab denen ein Element markiert wird
+        n (int) : Anzahl der Extremwerte, deren Mittelwert als Maximalspannung gilt
+        dpi (int) : Auflösung in Pixel pro Zoll
+        blockZeilen (int) : Anzahl der Zeilen pro Block
+
+    Raises:
+        ValueError wenn die Dateien keine oder unterschiedlich viele Zeilen haben
+
+    Returns:
+       np.ndarray, list, list : uint8 Maske des Modells, Masken der Zugspannungen und der Druckspannungen je Schwellwert
+    """
+    # 1. Durchgang: Wertebereich der Koordinaten und Extremwerte der Spannungen
+    grenzen = [np.inf, -np.inf, np.inf, -np.inf]
+    extremZug = _Extremwerte(n, True)
+    extremDruck = _Extremwerte(n, False)
+    for YCoord, ZCoord, Zug, Druck in BloeckeLesen(MinPrincipal, MaxPrincipal, blockZeilen):
+        if len(YCoord) == 0:
+            continue
+        grenzen = [min(grenzen[0], YCoord.min()), max(grenzen[1], YCoord.max()), min(grenzen[2], ZCoord.min()), max(grenzen[3], ZCoord.max())]
+        extremZug.hinzufuegen(Zug)
+        extremDruck.hinzufuegen(Druck)
+
+    if not np.isfinite(grenzen).all():
+        raise ValueError('Keine Elemente in ' + MaxPrincipal)
+
+    grenzenZug = extremZug.mittelwert() * np.asarray(anteileZug, dtype=np.float64)
+    grenzenDruck = extremDruck.mittelwert() * np.asarray(anteileDruck, dtype=np.float64)
+
+    # 2. Durchgang: Elementmittelpunkte eintragen, verbreitert wird erst am Ende
+    hoehe, breite = int(BildGroesse[1] * dpi), int(BildGroesse[0] * dpi)
+    maskModell = np.zeros((hoehe, breite), dtype=np.uint8)
+    masksZug = [np.zeros_like(maskModell) for _ in grenzenZug]
+    masksDruck = [np.zeros_like(maskModell) for _ in grenzenDruck]
+
+    for YCoord, ZCoord, Zug, Druck in BloeckeLesen(MinPrincipal, MaxPrincipal, blockZeilen):
+        px, py, _ = Pixelkoordinaten(YCoord, ZCoord, dpi, grenzen)
+        maskModell[py, px] = 255
+        for maske, grenze in zip(masksZug, grenzenZug):
+            auswahl = Zug >= grenze
+            maske[py[auswahl], px[auswahl]] = 255
+        for maske, grenze in zip(masksDruck, grenzenDruck):
+            auswahl = Druck <= grenze
+            maske[py[auswahl], px[auswahl]] = 255
+
+    return Verbreitern(maskModell, dpi), [Verbreitern(m, dpi) for m in masksZug], [Verbreitern(m, dpi) for m in masksDruck]
+
+class FeinRaster:
+    """
+    Bildet die Elemente auf ein um einen ganzzahligen Faktor feineres Pixelraster ab, ohne das ganze Bild zu erstellen.
+    Es werden nur kleine Fenster gerendert, zB um die Endpunkte der Sensoren genauer zu bestimmen.
+    Pixel (x, y) im Grobbild entspricht Pixel (x * faktor, y * faktor) im feinen Raster.
+    """
+    def __init__(self, MinPrincipal : str, MaxPrincipal : str, faktor : int = 4, dpi : int = 120,
+                 anteilZug : float = AnteilZug, anteilDruck : float = AnteilDruck, n : int = AnzahlExtremwerte):
+        """
+        Lädt die Elemente und berechnet ihre Pixelkoordinaten im feinen Raster.
+
+        Args:
+            MinPrincipal (str) : Name der MinPrincipal.csv Datei mit den Druckspannungen
+            MaxPrincipal (str) : Name der MaxPrincipal.csv Datei mit den Zugspannungen und Elementcoordinaten
+            faktor (int) : Verfeinerung gegenüber dem Grobbild
+            dpi (int) : Auflösung des Grobbildes in Pixel pro Zoll
+            anteilZug (float) : Anteil der maximalen Zugspannung, ab dem ein Element markiert wird
+            anteilDruck (float) : Anteil der maximalen Druckspannung, ab dem ein Element markiert wird
+            n (int) : Anzahl der Extremwerte, deren Mittelwert als Maximalspannung gilt
+
+        Returns:
+        """
+        self.faktor = int(faktor)
+        self.dpi = dpi * self.faktor
+
+        ElemID, YCoord, ZCoord, Zug = ElementeLaden(MaxPrincipal)
+        Druck = DruckLaden(MinPrincipal)
+
+        px, py, self.form = Pixelkoordinaten(YCoord, ZCoord, self.dpi)
+        istZug, istDruck = Auswahl(Zug, Druck, (anteilZug,), (anteilDruck,), n)
+
+        # Nach Pixelspalte sortiert, damit ein Fenster mit searchsorted gefunden wird
+        reihenfolge = np.argsort(px, kind='stable')
+        self.px, self.py = px[reihenfolge], py[reihenfolge]
+        self.istZug, self.istDruck = istZug[0][reihenfolge], istDruck[0][reihenfolge]
+
+    @IM.Messen
+    def fenster(self, x0 : int, y0 : int, x1 : int, y1 : int):
+        """Rendert die Masken im Fenster [x0, x1) x [y0, y1) des feinen Rasters
+
+        Args:
+            x0 (int) : Erste Pixelspalte
+            y0 (int) : Erste Pixelzeile
+            x1 (int) : Pixelspalte nach dem Fenster
+            y1 (int) : Pixelzeile nach dem Fenster
+
+        Returns:
+           np.ndarray, np.ndarray, np.ndarray : uint8 Masken von Modell, Zugspannungen und Druckspannungen im Fenster
+        """
+        # Elemente bis zu einem Radius außerhalb des Fensters ragen noch hinein
+        r = int(round(ElementRadius * self.dpi / 72))
+        von, bis = np.searchsorted(self.px, [x0 - r, x1 + r])
+        px, py = self.px[von:bis], self.py[von:bis]
+        innen = (py >= y0 - r) & (py < y1 + r)
+        px, py = px[innen] - (x0 - r), py[innen] - (y0 - r)
+
+        form = (y1 - y0 + 2 * r, x1 - x0 + 2 * r)
+        masken = []
+        for auswahl in (None, self.istZug[von:bis][innen], self.istDruck[von:bis][innen]):
+            maske = np.zeros(form, dtype=np.uint8)
+            if auswahl is None:
+                maske[py, px] = 255
+            else:
+                maske[py[auswahl], px[auswahl]] = 255
+            masken.append(Verbreitern(maske, self.dpi)[r:r + y1 - y0, r:r + x1 - x0])
+
+        return tuple(masken)
+
+@IM.Messen
+def Aufbereitung(MinPrincipal, MaxPrincipal, path, speichern : bool = True, dpi : int = 120,
+                 anteilZug : float = AnteilZug, anteilDruck : float = AnteilDruck, n : int = AnzahlExtremwerte, blockweise : bool = None):
     """Liest die aus NX generierten Dateien mit Druck und Zugspannungen ein, verarbeitet diese und speichert ein Modellbild 
     und ein Bild mit den Werten in den aktuellen Arbeitsordner
 
@@ -18,49 +712,124 @@ def Aufbereitung(MinPrincipal, MaxPrincipal, path):
         MinPrincipal (str) : Name der MinPrincipal.csv Datei mit den Druckspannungen
         MaxPrincipal (str) : Name der MaxPrincipal.csv Datei mit den Zugspannungen und Elementcoordinaten
         path (str) : Aktueller Arbeitsordner
+        speichern (bool) : Modell.png und Werte.png in den Arbeitsordner schreiben (für die Benutzeroberfläche)
+        dpi (int) : Auflösung in Pixel pro Zoll
+        anteilZug (float) : Anteil der maximalen Zugspannung, ab dem ein Element markiert wird
+        anteilDruck (float) : Anteil der maximalen Druckspannung, ab dem ein Element markiert wird
+        n (int) : Anzahl der Extremwerte, deren Mittelwert als Maximalspannung gilt
+        blockweise (bool) : Dateien blockweise mit begrenztem Speicherbedarf verarbeiten. Bei None ab GroesseBlockweise
 
     Returns:
-
+       np.ndarray, np.ndarray, np.ndarray : uint8 Masken von Modell, Zugspannungen und Druckspannungen
     """
-    #5 Größte/Kleinste Werte um Singularitäten auszuschließen
-    n = 5
+    if blockweise is None:
+        blockweise = os.path.getsize(MaxPrincipal) >= GroesseBlockweise
+
+    if blockweise:
+        maskModell, masksZug, masksDruck = AufbereitungStufenBlockweise(MinPrincipal, MaxPrincipal, (anteilZug,), (anteilDruck,), n, dpi)
+    else:
+        maskModell, masksZug, masksDruck = AufbereitungStufen(MinPrincipal, MaxPrincipal, (anteilZug,), (anteilDruck,), n, dpi)
+    maskZug, maskDruck = masksZug[0], masksDruck[0]
 
-    #Figure
-    plt.figure(figsize=(15,3))
-    plt.axis('off')
+    if speichern:
+        ModellBild, image = Bilder(maskModell, maskZug, maskDruck)
+        cv2.imwrite(path + '/Modell.png', ModellBild)
+        cv2.imwrite(path + '/Werte.png', image)
 
-    dfDruck = pd.read_csv(MinPrincipal)
-    dfZug = pd.read_csv(MaxPrincipal, delim_whitespace=True)
-    dfZug = dfZug.rename(columns={'Elem': 'Elem ID', 'ID': 'Y Coord', 'Y': 'Z Coord', 'Coord': 'Max Principal'})
-    dfModell = dfZug[['Elem ID', 'Y Coord', 'Z Coord']]
-    dfZug = dfZug.drop('Elem ID', axis=1)    
-    dfZug = dfZug.drop('Y Coord', axis=1)
-    dfZug = dfZug.drop('Z Coord', axis=1)
+    return maskModell, maskZug, maskDruck
 
-    plt.scatter(x= 'Y Coord', y= 'Z Coord',data=dfModell, color="#a0a0a0") #RGB (160,160,160)
-    figurename = path + '/Modell.png'
-    plt.savefig(figurename, dpi=120)
 
-    MaxDruck = dfDruck['Min Principal'].nsmallest(n, keep= "all").mean()
-    MaxZug = dfZug['Max Principal'].nlargest(n, keep= "all").mean()
+def _DateiHash(pfad : str):
+    """Berechnet den SHA-256 Hash des Dateiinhalts"""
+    h = hashlib.sha256()
+    with open(pfad, 'rb') as datei:
+        for block in iter(lambda: datei.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _DateiKennung(pfad : str):
+    """Größe und Änderungszeit einer Datei, None wenn sie nicht existiert"""
+    try:
+        stat = os.stat(pfad)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+@IM.Messen
+def AufbereitungZwischengespeichert(MinPrincipal, MaxPrincipal, path, dpi : int = 120,
+                                   anteilZug : float = AnteilZug, anteilDruck : float = AnteilDruck, n : int = AnzahlExtremwerte):
+    """Wie Aufbereitung, aber mit Zwischenspeicher im Arbeitsordner (path/.cache).
+    Der Schlüssel setzt sich aus den Hashes der beiden CSV Dateien, den Schwellwerten und der Auflösung zusammen,
+    geänderte Daten erzeugen daher automatisch neue Bilder. Gespeichert werden die Masken und die Bauteilbegrenzung.
+
+    Wurden Modell.png oder Werte.png seit der Erstellung bearbeitet, werden die bearbeiteten Bilder verwendet.
+    Modell.png, Werte.png und die '_unedited' Kopien werden nur geschrieben, wenn sie neu erstellt wurden oder fehlen.
+
+    Args:
+        MinPrincipal (str) : Name der MinPrincipal.csv Datei mit den Druckspannungen
+        MaxPrincipal (str) : Name der MaxPrincipal.csv Datei mit den Zugspannungen und Elementcoordinaten
+        path (str) : Aktueller Arbeitsordner
+        dpi (int) : Auflösung in Pixel pro Zoll
+        anteilZug (float) : Anteil der maximalen Zugspannung, ab dem ein Element markiert wird
+        anteilDruck (float) : Anteil der maximalen Druckspannung, ab dem ein Element markiert wird
+        n (int) : Anzahl der Extremwerte, deren Mittelwert als Maximalspannung gilt
+
+    Returns:
+       np.ndarray, np.ndarray, tuple : Modellbild, Bild mit den Werten (BGR) und Bauteilbegrenzung (x, y, breite, hoehe).
+                                       Die Begrenzung ist None, wenn bearbeitete Bilder verwendet werden
+    """
+    schluessel = hashlib.sha256(repr((CacheVersion, _DateiHash(MinPrincipal), _DateiHash(MaxPrincipal),
+                                      n, anteilDruck, anteilZug, dpi)).encode()).hexdigest()[:32]
+    cacheOrdner = os.path.join(path, '.cache')
+    cachePfad = os.path.join(cacheOrdner, schluessel + '.npz')
+
+    namen = ['/Modell.png', '/Werte.png', '/Modell_unedited.png', '/Werte_unedited.png']
 
-    ThirdDruck = MaxDruck / 3
-    QuarterZug = MaxZug / 4
+    try:
+        with np.load(cachePfad) as daten:
+            maskModell, maskZug, maskDruck = daten['maskModell'], daten['maskZug'], daten['maskDruck']
+            begrenzung = tuple(int(v) for v in daten['begrenzung'])
+            kennungen = daten['kennungen']
+        os.utime(cachePfad)
+        treffer = True
+    except (OSError, KeyError, ValueError):
+        maskModell, maskZug, maskDruck = Aufbereitung(MinPrincipal, MaxPrincipal, path, False, dpi, anteilZug, anteilDruck, n)
+        begrenzung = M9.Begrenzung(maskModell)
+        treffer = False
 
-    #Druck und Zug mit Element ID und Koordinaten versehen
-    dfDruck = dfDruck.join(dfModell)
-    dfZug = dfZug.join(dfModell)
+    ModellBild, image = Bilder(maskModell, maskZug, maskDruck)
 
-    dfZug.drop(dfZug[dfZug['Max Principal'] < QuarterZug].index, inplace=True)
-    dfDruck.drop(dfDruck[dfDruck['Min Principal'] > ThirdDruck].index, inplace=True)
+    vorhanden = [_DateiKennung(path + name) for name in namen]
+    for name, bild, kennung in zip(namen, [ModellBild, image, ModellBild, image], vorhanden):
+        if not treffer or kennung is None:
+            cv2.imwrite(path + name, bild)
 
-    dfZug = dfZug[['Elem ID', 'Y Coord', 'Z Coord', 'Max Principal']]
-    dfDruck = dfDruck[['Elem ID', 'Y Coord', 'Z Coord', 'Min Principal']]
+    if treffer:
+        # Vom Benutzer bearbeitete Bilder haben Vorrang
+        bearbeitet = [k is not None and k != tuple(kennung) for k, kennung in zip(vorhanden, kennungen)]
+        if any(bearbeitet):
+            return cv2.imread(path + '/Modell.png'), cv2.imread(path + '/Werte.png'), None
+        if all(k is not None for k in vorhanden[:2]):
+            return ModellBild, image, begrenzung
 
-    plt.scatter(x= 'Y Coord', y= 'Z Coord',data=dfZug, color="#ffa500") #RGB (255,165,0)
-    plt.scatter(x= 'Y Coord', y= 'Z Coord',data=dfDruck, color="#a020f0") #RGB (160,32,240)
+    # Eintrag mit den Kennungen der geschriebenen Bilder speichern, damit spätere Bearbeitungen erkannt werden
+    kennungen = np.array([_DateiKennung(path + name) for name in namen[:2]], dtype=np.int64)
+    try:
+        os.makedirs(cacheOrdner, exist_ok=True)
+        tmpPfad = cachePfad + '.tmp'
+        with open(tmpPfad, 'wb') as datei:
+            np.savez_compressed(datei, maskModell=maskModell, maskZug=maskZug, maskDruck=maskDruck,
+                                begrenzung=np.array(begrenzung, dtype=np.int32), kennungen=kennungen)
+        os.replace(tmpPfad, cachePfad)
 
-    figurename = path + '/Werte.png'
-    plt.savefig(figurename, dpi=120)
+        # Nur die zuletzt verwendeten Einträge behalten
+        eintraege = sorted((os.path.join(cacheOrdner, name) for name in os.listdir(cacheOrdner) if name.endswith('.npz')),
+                           key=os.path.getmtime, reverse=True)
+        for alt in eintraege[CacheEintraege:]:
+            os.remove(alt)
+    except OSError:
+        pass
 
-    return
\ No newline at end of file
+    return ModellBild, image, begrenzung
@@ -0,0 +1,414 @@
+"""
+Räumlicher Index über die Elemente aus der MaxPrincipal.csv.
+Die Elemente werden in ein regelmäßiges Gitter einsortiert (Grid-Hash), sodass nächstes Element, alle Elemente in
+einem Radius und die Elemente entlang eines Linienzugs ohne Durchsuchen aller Elemente oder Pixel gefunden werden.
+Damit lassen sich Sensorpunkte auf echte Elementpositionen setzen und die Spannungen entlang eines Sensors auslesen.
+
+Author: Philipp Haug
+Date: 24.05.2023
+Version: 1.0
+"""
+import numpy as np
+
+import Datenaufbereitung as DA
+import Instrumentierung as IM
+import Method as M9
+
+#Mittlere Anzahl an Elementen pro Gitterzelle
+ElementeProZelle = 4
+#Abstand der Abtastpunkte entlang eines Sensors in Elementkoordinaten (mm)
+Abtastabstand = 1.0
+
+# Bewertung je Sensor: mittlere, maximale und über die Länge integrierte Spannung entlang der Mittellinie, jeweils
+# bezogen auf die Maximalspannung der Spannungsart, damit Zug- und Drucksensoren vergleichbar sind
+BewertungDtype = np.dtype([('mittel', np.float32), ('maximal', np.float32), ('integral', np.float32)])
+
+class ElementIndex:
+    """
+    Grid-Hash über die Elementmittelpunkte. Die Elemente sind nach Gitterzelle sortiert gespeichert,
+    anfang[zelle]:anfang[zelle + 1] sind die Elemente einer Zelle.
+    """
+    @IM.Messen
+    def __init__(self, ElemID : np.ndarray, YCoord : np.ndarray, ZCoord : np.ndarray, werte : dict = None):
+        """
+        Sortiert die Elemente in das Gitter ein.
+
+        Args:
+            ElemID (np.ndarray) : Elementnummern
+            YCoord (np.ndarray) : Y-Koordinaten der Elemente
+            ZCoord (np.ndarray) : Z-Koordinaten der Elemente
+            werte (dict) : Weitere Werte je Element, zB {'Zug': ..., 'Druck': ...}, zeilengleich mit ElemID
+
+        Returns:
+        """
+        YCoord = np.asarray(YCoord, dtype=np.float64)
+        ZCoord = np.asarray(ZCoord, dtype=np.float64)
+        if len(YCoord) == 0:
+            raise ValueError('Keine Elemente für den Index')
+
+        self.grenzen = (YCoord.min(), YCoord.max(), ZCoord.min(), ZCoord.max())
+        yMin, yMax, zMin, zMax = self.grenzen
+
+        # Zellgröße so, dass im Mittel ElementeProZelle Elemente in einer Zelle liegen
+        # Bei sehr schmalen Modellen bestimmt die längere Seite die Zellgröße, sonst entstehen zu viele leere Zellen
+        ausdehnung = max(yMax - yMin, zMax - zMin)
+        if ausdehnung == 0:
+            self.zelle = 1.0
+        else:
+            self.zelle = max(np.sqrt((yMax - yMin) * (zMax - zMin) * ElementeProZelle / len(YCoord)), ausdehnung * ElementeProZelle / len(YCoord))
+        self.spalten = int((yMax - yMin) / self.zelle) + 1
+        self.zeilen = int((zMax - zMin) / self.zelle) + 1
+
+        zellen = self._Zelle(YCoord, ZCoord)
+        reihenfolge = np.argsort(zellen, kind='stable')
+
+        self.ElemID = np.asarray(ElemID)[reihenfolge]
+        self.YCoord = YCoord[reihenfolge]
+        self.ZCoord = ZCoord[reihenfolge]
+        self.werte = {name: np.asarray(w)[reihenfolge] for name, w in (werte or {}).items()}
+        self.anfang = np.concatenate(([0], np.cumsum(np.bincount(zellen, minlength=self.spalten * self.zeilen)))).astype(np.int64)
+
+    @classmethod
+    def ausDateien(cls, MinPrincipal : str, MaxPrincipal : str):
+        """Erstellt den Index aus MaxPrincipal.csv und MinPrincipal.csv, mit den Werten 'Zug' und 'Druck'
+
+        Args:
+            MinPrincipal (str) : Name der MinPrincipal.csv Datei mit den Druckspannungen
+            MaxPrincipal (str) : Name der MaxPrincipal.csv Datei mit den Zugspannungen und Elementcoordinaten
+
+        Returns:
+           ElementIndex : Index über alle Elemente
+        """
+        ElemID, YCoord, ZCoord, Zug = DA.ElementeLaden(MaxPrincipal)
+        Druck = DA.DruckLaden(MinPrincipal)
+        return cls(ElemID, YCoord, ZCoord, {'Zug': Zug, 'Druck': Druck})
+
+    def _ZellKoordinaten(self, YCoord, ZCoord):
+        """Spalte und Zeile der Gitterzelle, begrenzt auf das Gitter"""
+        yMin, _, zMin, _ = self.grenzen
+        spalte = np.clip(np.floor((np.asarray(YCoord, dtype=np.float64) - yMin) / self.zelle), 0, self.spalten - 1).astype(np.int64)
+        zeile = np.clip(np.floor((np.asarray(ZCoord, dtype=np.float64) - zMin) / self.zelle), 0, self.zeilen - 1).astype(np.int64)
+        return spalte, zeile
+
+    def _Zelle(self, YCoord, ZCoord):
+        """Nummer der Gitterzelle"""
+        spalte, zeile = self._ZellKoordinaten(YCoord, ZCoord)
+        return zeile * self.spalten + spalte
+
+    def _Kandidaten(self, abfragen : np.ndarray, spalte : np.ndarray, zeile : np.ndarray):
+        """Alle Elemente der angegebenen Zellen
+
+        Args:
+            abfragen (np.ndarray) : Nummer der Abfrage je Zelle
+            spalte (np.ndarray) : Spalte je Zelle, außerhalb des Gitters wird ignoriert
+            zeile (np.ndarray) : Zeile je Zelle, außerhalb des Gitters wird ignoriert
+
+        Returns:
+           np.ndarray, np.ndarray : Nummer der Abfrage und Elementposition je Kandidat
+        """
+        innen = (spalte >= 0) & (spalte < self.spalten) & (zeile >= 0) & (zeile < self.zeilen)
+        abfragen, zellen = abfragen[innen], zeile[innen] * self.spalten + spalte[innen]
+
+        start = self.anfang[zellen]
+        anzahl = self.anfang[zellen + 1] - start
+        gesamt = int(anzahl.sum())
+
+        # Für jede Zelle die Positionen start ... start + anzahl - 1
+        versatz = np.arange(gesamt) - np.repeat(np.cumsum(anzahl) - anzahl, anzahl)
+        return np.repeat(abfragen, anzahl), np.repeat(start, anzahl) + versatz
+
+    @IM.Messen
+    def naechstes(self, YCoord, ZCoord):
+        """Nächstes Element zu jedem Abfragepunkt. Die Zellen werden ringweise um den Abfragepunkt durchsucht,
+        bis kein näheres Element mehr möglich ist.
+
+        Args:
+            YCoord (array_like) : Y-Koordinaten der Abfragepunkte
+            ZCoord (array_like) : Z-Koordinaten der Abfragepunkte
+
+        Returns:
+           np.ndarray, np.ndarray : Position des nächsten Elements im Index (für ElemID, werte, ...) und Abstand
+        """
+        YCoord = np.atleast_1d(np.asarray(YCoord, dtype=np.float64))
+        ZCoord = np.atleast_1d(np.asarray(ZCoord, dtype=np.float64))
+        anzahl = len(YCoord)
+
+        bester = np.full(anzahl, -1, dtype=np.int64)
+        abstand = np.full(anzahl, np.inf)
+
+        # Punkte außerhalb des Gitters beginnen in der nächsten Randzelle
+        spalte, zeile = self._ZellKoordinaten(YCoord, ZCoord)
+
+        offen = np.arange(anzahl)
+        ring = 0
+        while len(offen):
+            ry, rz = _Ring(ring)
+            abfrage, element = self._Kandidaten(np.repeat(offen, len(ry)), np.repeat(spalte[offen], len(ry)) + np.tile(ry, len(offen)),
+                                                np.repeat(zeile[offen], len(rz)) + np.tile(rz, len(offen)))
+            if len(element):
+                d = np.hypot(self.YCoord[element] - YCoord[abfrage], self.ZCoord[element] - ZCoord[abfrage])
+                # Die Kandidaten einer Abfrage liegen zusammenhängend. Kleinster Abstand je Abfrage mit reduceat,
+                # davon der erste Kandidat mit diesem Abstand
+                start = np.flatnonzero(np.concatenate(([True], abfrage[1:] != abfrage[:-1])))
+                minimum = np.minimum.reduceat(d, start)
+                treffer = np.flatnonzero(d == np.repeat(minimum, np.diff(np.append(start, len(d)))))
+                _, erste = np.unique(abfrage[treffer], return_index=True)
+                abfrage, element, d = abfrage[treffer[erste]], element[treffer[erste]], d[treffer[erste]]
+                besser = d < abstand[abfrage]
+                bester[abfrage[besser]] = element[besser]
+                abstand[abfrage[besser]] = d[besser]
+
+            # Weitersuchen, solange ein Element außerhalb der durchsuchten Zellen näher liegen kann
+            offen = offen[abstand[offen] > self._Restabstand(YCoord[offen], ZCoord[offen], spalte[offen], zeile[offen], ring)]
+            ring += 1
+
+        return bester, abstand
+
+    def _Restabstand(self, YCoord, ZCoord, spalte, zeile, ring : int):
+        """Kleinster Abstand der Abfragepunkte zu den Zellen des Gitters, die weiter als ring Zellen von der
+        Zelle (spalte, zeile) entfernt sind. Diese liegen in bis zu vier Streifen links, rechts, unter und über
+        den durchsuchten Zellen
+
+        Returns:
+           np.ndarray : Abstand je Abfragepunkt, inf wenn alle Zellen durchsucht sind
+        """
+        yMin, _, zMin, _ = self.grenzen
+        yMax, zMax = yMin + self.spalten * self.zelle, zMin + self.zeilen * self.zelle
+        links, rechts = yMin + (spalte - ring) * self.zelle, yMin + (spalte + ring + 1) * self.zelle
+        unten, oben = zMin + (zeile - ring) * self.zelle, zMin + (zeile + ring + 1) * self.zelle
+
+        rest = np.full(len(YCoord), np.inf)
+        for y0, y1, z0, z1, vorhanden in ((yMin, links, zMin, zMax, spalte - ring > 0), (rechts, yMax, zMin, zMax, spalte + ring + 1 < self.spalten),
+                                          (yMin, yMax, zMin, unten, zeile - ring > 0), (yMin, yMax, oben, zMax, zeile + ring + 1 < self.zeilen)):
+            dy = np.maximum(np.maximum(y0 - YCoord, YCoord - y1), 0)
+            dz = np.maximum(np.maximum(z0 - ZCoord, ZCoord - z1), 0)
+            rest = np.where(vorhanden, np.minimum(rest, np.hypot(dy, dz)), rest)
+        return rest
+
+    @IM.Messen
+    def imRadius(self, YCoord : float, ZCoord : float, radius : float):
+        """Alle Elemente im Radius um einen Punkt
+
+        Args:
+            YCoord (float) : Y-Koordinate des Mittelpunkts
+            ZCoord (float) : Z-Koordinate des Mittelpunkts
+            radius (float) : Radius in Elementkoordinaten
+
+        Returns:
+           np.ndarray : Positionen der Elemente im Index, nach Abstand sortiert
+        """
+        spalte0, zeile0 = self._ZellKoordinaten(YCoord - radius, ZCoord - radius)
+        spalte1, zeile1 = self._ZellKoordinaten(YCoord + radius, ZCoord + radius)
+        spalte, zeile = np.meshgrid(np.arange(spalte0, spalte1 + 1), np.arange(zeile0, zeile1 + 1))
+
+        _, element = self._Kandidaten(np.zeros(spalte.size, dtype=np.int64), spalte.ravel(), zeile.ravel())
+        d = np.hypot(self.YCoord[element] - YCoord, self.ZCoord[element] - ZCoord)
+        innen = d <= radius
+
+        return element[innen][np.argsort(d[innen], kind='stable')]
+
+    @IM.Messen
+    def entlangLinienzug(self, punkte : np.ndarray, abstand : float = Abtastabstand):
+        """Tastet einen Linienzug in gleichen Abständen ab und sucht zu jedem Abtastpunkt das nächste Element
+
+        Args:
+            punkte (np.ndarray) : Eckpunkte des Linienzugs (Y, Z), Form (K, 2)
+            abstand (float) : Abstand der Abtastpunkte
+
+        Returns:
+           np.ndarray, np.ndarray, np.ndarray : Abtastpunkte (Form (M, 2)), Bogenlänge je Abtastpunkt, Position des nächsten Elements
+        """
+        abtastpunkte, bogen = Abtasten(punkte, abstand)
+        element, _ = self.naechstes(abtastpunkte[:, 0], abtastpunkte[:, 1])
+        return abtastpunkte, bogen, element
+
+
+def _Ring(ring : int):
+    """Versatz aller Zellen mit Chebyshev-Abstand ring
+
+    Returns:
+       np.ndarray, np.ndarray : Versatz in Spalten und Zeilen
+    """
+    if ring == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    seite = np.arange(-ring, ring + 1)
+    dy = np.concatenate((seite, seite, np.full(2 * ring - 1, -ring), np.full(2 * ring - 1, ring)))
+    dz = np.concatenate((np.full(2 * ring + 1, -ring), np.full(2 * ring + 1, ring), seite[1:-1], seite[1:-1]))
+    return dy, dz
+
+
+def Abtasten(punkte : np.ndarray, abstand : float = Abtastabstand):
+    """Verteilt Abtastpunkte gleichmäßig entlang eines Linienzugs, Anfang und Ende eingeschlossen
+
+    Args:
+        punkte (np.ndarray) : Eckpunkte des Linienzugs, Form (K, 2)
+        abstand (float) : Größter Abstand zwischen zwei Abtastpunkten
+
+    Returns:
+       np.ndarray, np.ndarray : Abtastpunkte Form (M, 2) und Bogenlänge je Abtastpunkt
+    """
+    punkte = np.asarray(punkte, dtype=np.float64).reshape(-1, 2)
+    laengen = np.hypot(*np.diff(punkte, axis=0).T)
+    kumuliert = np.concatenate(([0.0], np.cumsum(laengen)))
+
+    anzahl = max(int(np.ceil(kumuliert[-1] / abstand)), 1) + 1
+    bogen = np.linspace(0.0, kumuliert[-1], anzahl)
+
+    return np.column_stack((np.interp(bogen, kumuliert, punkte[:, 0]), np.interp(bogen, kumuliert, punkte[:, 1]))), bogen
+
+
+def SensorenInModell(Sensoren : np.ndarray, index : ElementIndex, dpi : int = 120, faktor : int = 1):
+    """Rechnet die Punkte der Sensoren in Elementkoordinaten um
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren aus Method.SensorErkennung
+        index (ElementIndex) : Index mit dem Wertebereich der Elemente, aus denen die Bilder erstellt wurden
+        dpi (int) : Auflösung des Grobbildes in Pixel pro Zoll
+        faktor (int) : Faktor des feinen Rasters, wenn die Sensoren mit Method.SensorenVerfeinern verfeinert wurden
+
+    Returns:
+       np.ndarray : Punkte (Y, Z) je Sensor, Form (N, 4, 2), in der Reihenfolge von Sensoren['punkte']
+    """
+    punkte = Sensoren['punkte'].astype(np.float64) / faktor
+    YCoord, ZCoord = DA.Modellkoordinaten(punkte[..., 0], punkte[..., 1], index.grenzen, dpi)
+    return np.stack((YCoord, ZCoord), axis=-1)
+
+
+def Spannungsverlauf(Sensoren : np.ndarray, index : ElementIndex, dpi : int = 120, faktor : int = 1, abstand : float = Abtastabstand):
+    """Spannungen entlang der Mittellinie jedes Sensors
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren aus Method.SensorErkennung
+        index (ElementIndex) : Index mit den Werten 'Zug' und 'Druck', zB aus ElementIndex.ausDateien
+        dpi (int) : Auflösung des Grobbildes in Pixel pro Zoll
+        faktor (int) : Faktor des feinen Rasters, wenn die Sensoren mit Method.SensorenVerfeinern verfeinert wurden
+        abstand (float) : Abstand der Abtastpunkte in Elementkoordinaten
+
+    Returns:
+       list : Je Sensor ein dict mit Bogenlänge, ElemID, Zug und Druck der Abtastpunkte
+    """
+    verlauf = []
+    for linie in SensorenInModell(Sensoren, index, dpi, faktor)[:, 1:3]:
+        _, bogen, element = index.entlangLinienzug(linie, abstand)
+        eintrag = {'bogen': bogen, 'ElemID': index.ElemID[element]}
+        eintrag.update({name: werte[element] for name, werte in index.werte.items()})
+        verlauf.append(eintrag)
+    return verlauf
+
+
+@IM.Messen
+def Bewertung(Sensoren : np.ndarray, index : ElementIndex, dpi : int = 120, faktor : int = 1, abstand : float = Abtastabstand):
+    """Bewertet alle Sensoren nach der Spannung entlang ihrer Mittellinie. Die Abtastpunkte aller Sensoren werden
+    gemeinsam erzeugt und mit einer Abfrage des Index ausgewertet, die Kennwerte je Sensor mit reduceat berechnet.
+    Zugsensoren werden nach der Zugspannung, Drucksensoren nach dem Betrag der Druckspannung bewertet.
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren aus Method.SensorErkennung
+        index (ElementIndex) : Index mit den Werten 'Zug' und 'Druck', zB aus ElementIndex.ausDateien
+        dpi (int) : Auflösung des Grobbildes in Pixel pro Zoll
+        faktor (int) : Faktor des feinen Rasters, wenn die Sensoren mit Method.SensorenVerfeinern verfeinert wurden
+        abstand (float) : Größter Abstand der Abtastpunkte in Elementkoordinaten
+
+    Returns:
+       np.ndarray : Strukturiertes Array mit BewertungDtype, zeilengleich mit Sensoren
+    """
+    bewertung = np.zeros(len(Sensoren), dtype=BewertungDtype)
+    if len(Sensoren) == 0:
+        return bewertung
+
+    linien = SensorenInModell(Sensoren, index, dpi, faktor)[:, 1:3]
+    anfang, richtung = linien[:, 0], linien[:, 1] - linien[:, 0]
+    laenge = np.hypot(richtung[:, 0], richtung[:, 1])
+
+    # Gleichmäßig verteilte Abtastpunkte je Sensor, Anfang und Ende eingeschlossen
+    anzahl = np.maximum(np.ceil(laenge / abstand).astype(np.int64), 1) + 1
+    erste = np.cumsum(anzahl) - anzahl
+    sensor = np.repeat(np.arange(len(Sensoren)), anzahl)
+    anteil = (np.arange(anzahl.sum()) - erste[sensor]) / (anzahl[sensor] - 1)
+    punkte = anfang[sensor] + anteil[:, None] * richtung[sensor]
+
+    element, _ = index.naechstes(punkte[:, 0], punkte[:, 1])
+    zug = index.werte['Zug'][element] / DA.Maximalspannung(index.werte['Zug'], groesste=True)
+    druck = index.werte['Druck'][element] / DA.Maximalspannung(index.werte['Druck'], groesste=False)
+    werte = np.where(Sensoren['art'][sensor] == M9.SensorArt.Zug, zug, druck).astype(np.float64)
+
+    summe = np.add.reduceat(werte, erste)
+    bewertung['mittel'] = summe / anzahl
+    bewertung['maximal'] = np.maximum.reduceat(werte, erste)
+    # Trapezregel, die Endpunkte zählen zur Hälfte
+    bewertung['integral'] = (summe - (werte[erste] + werte[erste + anzahl - 1]) / 2) * laenge / (anzahl - 1)
+    return bewertung
+
+
+def NachBewertungSortieren(Sensoren : np.ndarray, bewertung : np.ndarray, nach : str = 'integral'):
+    """Sortiert die Sensoren aufsteigend nach einem Kennwert, wie Method.SensorenErstellen nach der Länge.
+    Method.Laengste und der Export wählen damit die am höchsten bewerteten Sensoren aus
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren
+        bewertung (np.ndarray) : Bewertung aus Bewertung, zeilengleich mit Sensoren
+        nach (str) : 'laenge' oder ein Feld von BewertungDtype ('mittel', 'maximal', 'integral')
+
+    Raises:
+        ValueError wenn nach unbekannt ist
+
+    Returns:
+       np.ndarray, np.ndarray : Sortierte Sensoren und Bewertung
+    """
+    if nach == 'laenge':
+        schluessel = Sensoren['laenge']
+    elif nach in BewertungDtype.names:
+        schluessel = bewertung[nach]
+    else:
+        raise ValueError('Unbekannte Sortierung: ' + str(nach))
+
+    # Bei gleicher Bewertung entscheidet die Länge
+    reihenfolge = np.lexsort((Sensoren['laenge'], schluessel))
+    return Sensoren[reihenfolge], bewertung[reihenfolge]
+
+
+def AufElementeSetzen(Sensoren : np.ndarray, index : ElementIndex, scalex : float, scaley : float, dpi : int = 120, faktor : int = 1):
+    """Setzt die Endpunkte der Sensoren auf die Pixelposition des nächsten Elements und berechnet die Länge neu
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren aus Method.SensorErkennung
+        index (ElementIndex) : Index mit dem Wertebereich der Elemente, aus denen die Bilder erstellt wurden
+        scalex (float) : Bild zu Drawing Skalierung des Grobbildes in X-Richtung
+        scaley (float) : Bild zu Drawing Skalierung des Grobbildes in Y-Richtung
+        dpi (int) : Auflösung des Grobbildes in Pixel pro Zoll
+        faktor (int) : Faktor des feinen Rasters, wenn die Sensoren mit Method.SensorenVerfeinern verfeinert wurden
+
+    Returns:
+       np.ndarray : Sensoren mit verschobenen Endpunkten, aufsteigend nach der neuen Länge sortiert. Die Anschlüsse bleiben unverändert
+    """
+    endpunkte = SensorenInModell(Sensoren, index, dpi, faktor)[:, 1:3].reshape(-1, 2)
+    element, _ = index.naechstes(endpunkte[:, 0], endpunkte[:, 1])
+
+    px, py, _ = DA.Pixelkoordinaten(index.YCoord[element], index.ZCoord[element], dpi * faktor, index.grenzen)
+
+    punkte = Sensoren['punkte'].copy()
+    punkte[:, 1:3] = np.stack((px, py), axis=-1).reshape(-1, 2, 2)
+    differenz = (punkte[:, 2] - punkte[:, 1]).astype(np.float64)
+    laengen = np.hypot(differenz[:, 0] / (scalex * faktor), differenz[:, 1] / (scaley * faktor))
+
+    return M9.SensorenErstellen(Sensoren['art'], laengen, punkte)
+
+
+def VerlaufSpeichern(pfad : str, Sensoren : np.ndarray, verlauf : list):
+    """Schreibt die Spannungsverläufe aller Sensoren in eine CSV Datei, eine Zeile je Abtastpunkt
+
+    Args:
+        pfad (str) : Pfad der CSV Datei
+        Sensoren (np.ndarray) : Sensoren in derselben Reihenfolge wie verlauf
+        verlauf (list) : Spannungsverläufe aus Spannungsverlauf
+
+    Returns:
+    """
+    namen = sorted({name for eintrag in verlauf for name in eintrag if name not in ('bogen', 'ElemID')})
+    with open(pfad, 'w') as datei:
+        datei.write(','.join(['Sensor', 'Art', 'Bogen', 'Elem ID'] + namen) + '\n')
+        for nummer, (sensor, eintrag) in enumerate(zip(Sensoren, verlauf), start=1):
+            art = M9.SensorArt(sensor['art']).name
+            for i in range(len(eintrag['bogen'])):
+                werte = ['{:.6g}'.format(eintrag[name][i]) for name in namen]
+                datei.write(','.join([str(nummer), art, '{:.4f}'.format(eintrag['bogen'][i]), str(eintrag['ElemID'][i])] + werte) + '\n')
@@ -0,0 +1,145 @@
+"""
+Faserrichtungsfeld aus den Faserverläufen der Splines.dxf.
+Die Splines werden einmal abgetastet und die Richtung jedes Abschnitts in ein regelmäßiges Raster eingetragen.
+Lücken zwischen den Fasern werden geglättet bzw. mit der nächsten bekannten Richtung gefüllt, danach ist jede Abfrage
+eine bilineare Interpolation. Richtungen sind ohne Vorzeichen (eine Faser hat keine Laufrichtung) und werden daher
+als doppelter Winkel (cos 2a, sin 2a) gespeichert und gemittelt.
+
+Author: Philipp Haug
+Date: 24.05.2023
+Version: 1.0
+"""
+import cv2
+import numpy as np
+
+import DXFExport
+import Instrumentierung as IM
+import Kontur as KT
+
+#Kantenlänge einer Rasterzelle in Drawing Einheiten
+Rasterweite = 1.0
+#Glättung des Feldes (Standardabweichung) in Rasterzellen
+Glaettung = 2.0
+
+class Faserfeld:
+    """
+    Gerastertes Faserrichtungsfeld in Drawing Koordinaten. Knoten (i, j) liegt bei (xMin + i * weite, yMin + j * weite).
+    """
+    @IM.Messen
+    def __init__(self, linienzuege : list, grenzen : tuple = None, weite : float = Rasterweite, glaettung : float = Glaettung):
+        """
+        Trägt die Richtungen aller Abschnitte der Linienzüge in das Raster ein.
+
+        Args:
+            linienzuege (list) : Faserverläufe als np.ndarray mit Form (K, 2)
+            grenzen (tuple) : Bereich des Rasters (xMin, xMax, yMin, yMax), bei None der Bereich der Linienzüge
+            weite (float) : Kantenlänge einer Rasterzelle
+            glaettung (float) : Standardabweichung der Glättung in Rasterzellen, 0 ohne Glättung
+
+        Raises:
+            ValueError wenn keine Faserverläufe vorhanden sind
+
+        Returns:
+        """
+        abschnitte = [np.stack((l[:-1], l[1:]), axis=1) for l in linienzuege if len(l) >= 2]
+        if not abschnitte:
+            raise ValueError('Keine Faserverläufe für das Faserfeld')
+        abschnitte = np.concatenate(abschnitte)
+
+        if grenzen is None:
+            punkte = abschnitte.reshape(-1, 2)
+            grenzen = (punkte[:, 0].min(), punkte[:, 0].max(), punkte[:, 1].min(), punkte[:, 1].max())
+        self.grenzen = tuple(float(g) for g in grenzen)
+        self.weite = weite
+        self.spalten = int(np.ceil((self.grenzen[1] - self.grenzen[0]) / weite)) + 1
+        self.zeilen = int(np.ceil((self.grenzen[3] - self.grenzen[2]) / weite)) + 1
+
+        # Doppelter Winkel je Abschnitt, gewichtet mit der Abschnittslänge, am nächsten Knoten zur Abschnittsmitte
+        richtung = abschnitte[:, 1] - abschnitte[:, 0]
+        laenge = np.hypot(richtung[:, 0], richtung[:, 1])
+        winkel = 2 * np.arctan2(richtung[:, 1], richtung[:, 0])
+        mitte = abschnitte.mean(axis=1)
+        spalte = np.clip(np.rint((mitte[:, 0] - self.grenzen[0]) / weite), 0, self.spalten - 1).astype(np.int64)
+        zeile = np.clip(np.rint((mitte[:, 1] - self.grenzen[2]) / weite), 0, self.zeilen - 1).astype(np.int64)
+        knoten = zeile * self.spalten + spalte
+
+        anzahl = self.spalten * self.zeilen
+        felder = [np.bincount(knoten, gewicht, anzahl).reshape(self.zeilen, self.spalten).astype(np.float32)
+                  for gewicht in (laenge * np.cos(winkel), laenge * np.sin(winkel), laenge)]
+
+        # Normierte Faltung: Summen und Gewichte gleich glätten, dann teilen
+        if glaettung > 0:
+            felder = [cv2.GaussianBlur(f, (0, 0), glaettung, borderType=cv2.BORDER_REPLICATE) for f in felder]
+        cos2, sin2, gewicht = felder
+        bekannt = gewicht > 1e-6 * max(float(gewicht.max()), 1e-30)
+        cos2 = np.where(bekannt, cos2 / np.where(bekannt, gewicht, 1), 0)
+        sin2 = np.where(bekannt, sin2 / np.where(bekannt, gewicht, 1), 0)
+
+        # Knoten ohne Faser in der Nähe übernehmen die Richtung des nächsten bekannten Knotens
+        if not bekannt.all():
+            _, labels = cv2.distanceTransformWithLabels(np.where(bekannt, 0, 255).astype(np.uint8), cv2.DIST_L2,
+                                                        cv2.DIST_MASK_5, labelType=cv2.DIST_LABEL_PIXEL)
+            zielY, zielX = np.nonzero(bekannt)
+            cos2 = np.concatenate(([0], cos2[zielY, zielX]))[labels]
+            sin2 = np.concatenate(([0], sin2[zielY, zielX]))[labels]
+
+        betrag = np.maximum(np.hypot(cos2, sin2), 1e-12)
+        self.feld = np.stack((cos2 / betrag, sin2 / betrag), axis=-1).astype(np.float32)
+
+    @classmethod
+    def ausDatei(cls, nameSplinesdxf : str, grenzen : tuple = None, weite : float = Rasterweite):
+        """Erstellt das Faserfeld aus der Splines.dxf
+
+        Args:
+            nameSplinesdxf (str) : Pfad der Splines.dxf Datei
+            grenzen (tuple) : Bereich des Rasters (xMin, xMax, yMin, yMax), zB Kontur.grenzen. Bei None der Bereich der Splines
+            weite (float) : Kantenlänge einer Rasterzelle
+
+        Returns:
+           Faserfeld : Faserrichtungsfeld
+        """
+        return cls(KT.LinienzuegeLaden(nameSplinesdxf), grenzen, weite)
+
+    @IM.Messen
+    def richtung(self, X, Y):
+        """Faserrichtung an beliebigen Punkten, bilinear zwischen den Knoten interpoliert
+
+        Args:
+            X (array_like) : X-Koordinaten
+            Y (array_like) : Y-Koordinaten
+
+        Returns:
+           np.ndarray : Einheitsvektoren der Faserrichtung mit Form (..., 2), Vorzeichen beliebig
+        """
+        u = np.clip((np.asarray(X, dtype=np.float64) - self.grenzen[0]) / self.weite, 0, self.spalten - 1)
+        v = np.clip((np.asarray(Y, dtype=np.float64) - self.grenzen[2]) / self.weite, 0, self.zeilen - 1)
+        i0 = np.minimum(u.astype(np.int64), max(self.spalten - 2, 0))
+        j0 = np.minimum(v.astype(np.int64), max(self.zeilen - 2, 0))
+        i1, j1 = np.minimum(i0 + 1, self.spalten - 1), np.minimum(j0 + 1, self.zeilen - 1)
+        fu, fv = (u - i0)[..., None], (v - j0)[..., None]
+
+        doppelt = ((1 - fu) * (1 - fv) * self.feld[j0, i0] + fu * (1 - fv) * self.feld[j0, i1]
+                   + (1 - fu) * fv * self.feld[j1, i0] + fu * fv * self.feld[j1, i1])
+        winkel = np.arctan2(doppelt[..., 1], doppelt[..., 0]) / 2
+        return np.stack((np.cos(winkel), np.sin(winkel)), axis=-1)
+
+    @IM.Messen
+    def bildfeld(self, form : tuple, transformation : tuple):
+        """Faserrichtung für jeden Pixel eines Bildes, zB für Method.ErkennungsKontext.faser
+
+        Args:
+            form (tuple) : Bildform (Höhe, Breite)
+            transformation (tuple) : Bild zu Drawing Transformation (x, yC, scalex, scaley)
+
+        Returns:
+           np.ndarray : Einheitsvektoren (x, y) in Pixelrichtung mit Form (Höhe, Breite, 2), float32
+        """
+        _, _, scalex, scaley = transformation
+        hoehe, breite = form
+        py, px = np.mgrid[0:hoehe, 0:breite]
+        punkte = DXFExport.DrawingKoordinaten(np.stack((px, py), axis=-1), transformation)
+        richtung = self.richtung(punkte[..., 0], punkte[..., 1])
+
+        # Bildzeilen zählen von oben und die Achsen sind unterschiedlich skaliert
+        pixel = np.stack((richtung[..., 0] * scalex, -richtung[..., 1] * scaley), axis=-1)
+        return (pixel / np.maximum(np.linalg.norm(pixel, axis=-1, keepdims=True), 1e-12)).astype(np.float32)
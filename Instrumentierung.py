@@ -0,0 +1,171 @@
+"""
+Laufzeitmessung der einzelnen Arbeitsschritte. Wird über die Umgebungsvariable SENSORPRINT_PROFIL eingeschaltet,
+ohne diese werden die Funktionen unverändert zurückgegeben und es entsteht kein Mehraufwand.
+
+SENSORPRINT_PROFIL enthält eine durch Kommas getrennte Auswahl aus:
+    zeit      : Laufzeit und Anzahl der Aufrufe je Abschnitt, Zusammenfassung beim Beenden auf stderr
+    speicher  : zusätzlich Spitzenspeicher je Abschnitt über tracemalloc (verlangsamt das Programm deutlich)
+    cprofile  : Profil des gesamten Programms als pstats Datei sensorprint.prof
+    trace     : Chrome-Trace sensorprint_trace.json aller Abschnitte (chrome://tracing oder ui.perfetto.dev)
+Die Dateien werden in SENSORPRINT_PROFIL_ORDNER geschrieben, ohne Angabe in das aktuelle Verzeichnis.
+
+Beispiel:
+    SENSORPRINT_PROFIL=zeit,trace python main.py
+
+Author: Philipp Haug
+Date: 24.05.2023
+Version: 1.0
+"""
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+#Eingeschaltete Modi
+Modi = {m.strip().lower() for m in os.environ.get('SENSORPRINT_PROFIL', '').split(',') if m.strip()}
+Aktiv = bool(Modi)
+Ordner = os.environ.get('SENSORPRINT_PROFIL_ORDNER', '.')
+
+#Gesammelte Werte je Abschnitt: Aufrufe, Gesamtzeit, längster Aufruf, Spitzenspeicher
+_Statistik = {}
+#Abgeschlossene Abschnitte für den Chrome-Trace
+_Ereignisse = []
+_Sperre = threading.Lock()
+#Geöffnete Abschnitte je Thread, für den Spitzenspeicher verschachtelter Abschnitte
+_Lokal = threading.local()
+_Start = time.perf_counter()
+_Profil = None
+
+
+class Abschnitt:
+    """
+    Kontextmanager, der die Laufzeit eines Programmabschnitts misst.
+    Ist die Messung ausgeschaltet, macht er nichts.
+    """
+    def __init__(self, name : str):
+        """
+        Args:
+            name (str) : Name des Abschnitts in der Auswertung
+
+        Returns:
+        """
+        self.name = name
+
+    def __enter__(self):
+        if not Aktiv:
+            return self
+        if 'speicher' in Modi:
+            stapel = _Stapel()
+            # Bisherige Spitze an den übergeordneten Abschnitt weitergeben, bevor sie zurückgesetzt wird
+            if stapel:
+                stapel[-1] = max(stapel[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            stapel.append(0)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not Aktiv:
+            return False
+        ende = time.perf_counter()
+        dauer = ende - self.start
+
+        spitze = None
+        if 'speicher' in Modi:
+            stapel = _Stapel()
+            spitze = max(stapel.pop(), tracemalloc.get_traced_memory()[1])
+            if stapel:
+                stapel[-1] = max(stapel[-1], spitze)
+
+        with _Sperre:
+            eintrag = _Statistik.setdefault(self.name, {'aufrufe': 0, 'gesamt': 0.0, 'maximal': 0.0, 'spitzenspeicher': 0})
+            eintrag['aufrufe'] += 1
+            eintrag['gesamt'] += dauer
+            eintrag['maximal'] = max(eintrag['maximal'], dauer)
+            if spitze is not None:
+                eintrag['spitzenspeicher'] = max(eintrag['spitzenspeicher'], spitze)
+            if 'trace' in Modi:
+                _Ereignisse.append({'name': self.name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                                    'ts': (self.start - _Start) * 1e6, 'dur': dauer * 1e6})
+        return False
+
+
+def _Stapel():
+    """Stapel der Spitzenspeicher der geöffneten Abschnitte im aktuellen Thread"""
+    if not hasattr(_Lokal, 'stapel'):
+        _Lokal.stapel = []
+    return _Lokal.stapel
+
+
+def Messen(funktion=None, name : str = None):
+    """Dekorator, der jeden Aufruf der Funktion als Abschnitt misst. Ohne SENSORPRINT_PROFIL wird die Funktion
+    unverändert zurückgegeben. Verwendbar als @Messen oder @Messen(name='...')
+
+    Args:
+        funktion : Zu messende Funktion
+        name (str) : Name des Abschnitts, ohne Angabe Modul.Funktionsname
+
+    Returns:
+       Gemessene Funktion
+    """
+    def Dekorieren(f):
+        if not Aktiv:
+            return f
+        abschnitt = name or '{}.{}'.format(f.__module__, f.__qualname__)
+
+        @functools.wraps(f)
+        def Gemessen(*args, **kwargs):
+            with Abschnitt(abschnitt):
+                return f(*args, **kwargs)
+        return Gemessen
+
+    if funktion is not None:
+        return Dekorieren(funktion)
+    return Dekorieren
+
+
+def Bericht():
+    """Gesammelte Werte aller Abschnitte
+
+    Returns:
+       dict : Name des Abschnitts zu Aufrufen, Gesamtzeit, längstem Aufruf in Sekunden und Spitzenspeicher in Bytes
+    """
+    with _Sperre:
+        return {name: dict(eintrag) for name, eintrag in _Statistik.items()}
+
+
+def Schreiben():
+    """Gibt die Zusammenfassung auf stderr aus und schreibt die eingeschalteten Dateien. Wird beim Beenden aufgerufen"""
+    if not Aktiv:
+        return
+
+    if _Profil is not None:
+        _Profil.disable()
+        _Profil.dump_stats(os.path.join(Ordner, 'sensorprint.prof'))
+
+    if 'trace' in Modi:
+        with _Sperre:
+            ereignisse = list(_Ereignisse)
+        with open(os.path.join(Ordner, 'sensorprint_trace.json'), 'w') as datei:
+            json.dump({'traceEvents': ereignisse, 'displayTimeUnit': 'ms'}, datei)
+
+    bericht = sorted(Bericht().items(), key=lambda e: e[1]['gesamt'], reverse=True)
+    if bericht:
+        print('{:<48} {:>8} {:>11} {:>11} {:>10}'.format('Abschnitt', 'Aufrufe', 'Gesamt [s]', 'Max [s]', 'Spitze [MB]'), file=sys.stderr)
+        for name, e in bericht:
+            print('{:<48} {:>8} {:>11.4f} {:>11.4f} {:>10.1f}'.format(name[-48:], e['aufrufe'], e['gesamt'], e['maximal'], e['spitzenspeicher'] / 1e6),
+                  file=sys.stderr)
+
+
+if Aktiv:
+    if 'speicher' in Modi:
+        tracemalloc.start()
+    if 'cprofile' in Modi:
+        _Profil = cProfile.Profile()
+        _Profil.enable()
+    atexit.register(Schreiben)
@@ -0,0 +1,344 @@
+"""
+Vektorgeometrie der Bauteilkontur aus der Contour.dxf.
+Die Elemente der DXF-Datei (Linien, Bögen, Splines, Polylinien) werden einmal mit ezdxf eingelesen und zu Linienzügen
+abgeflacht. Daraus ergeben sich die exakten Abmessungen des Bauteils, ohne dass Länge und Höhe eingegeben werden müssen,
+sowie Abfragen, ob ein Punkt im Bauteil liegt und wie weit er vom Rand entfernt ist.
+Alle Koordinaten sind Drawing Koordinaten der DXF-Datei.
+
+Author: Philipp Haug
+Date: 24.05.2023
+Version: 1.0
+"""
+import os
+
+import ezdxf
+import ezdxf.path
+import numpy as np
+
+import Datenaufbereitung as DA
+import DXFExport
+import Instrumentierung as IM
+import Method as M9
+
+#Größter Abstand der abgeflachten Linienzüge von Bögen und Splines in Drawing Einheiten
+Toleranz = 0.01
+#Endpunkte mit höchstens diesem Abstand gelten beim Verbinden der Linienzüge als gleich
+Fangabstand = 1e-3
+#Größte Anzahl Punkt-Kante Paare, die in einem Block berechnet werden
+_BlockPaare = 1 << 22
+#Anzahl räumlich benachbarter Punkte, die bei der Randabstandsabfrage gemeinsam berechnet werden
+_BlockPunkte = 256
+
+#Abgeflachte Linienzüge je Datei, Toleranz, Größe und Änderungszeit
+_Linienzuege = {}
+
+def _Abflachen(entity, toleranz : float):
+    """Flacht ein DXF-Element zu Linienzügen ab. Blockreferenzen werden aufgelöst, Elemente ohne Geometrie
+    (zB Punkte und Texte) ignoriert"""
+    if entity.dxftype() == 'INSERT':
+        return [linienzug for teil in entity.virtual_entities() for linienzug in _Abflachen(teil, toleranz)]
+    try:
+        pfad = ezdxf.path.make_path(entity)
+    except TypeError:
+        return []
+    return [np.array([(v.x, v.y) for v in teil.flattening(toleranz)], dtype=np.float64) for teil in pfad.sub_paths()]
+
+
+@IM.Messen
+def LinienzuegeLaden(pfad : str, toleranz : float = Toleranz):
+    """Liest alle Elemente im Modelspace einer DXF-Datei als abgeflachte Linienzüge. Das Ergebnis wird zwischengespeichert,
+    solange sich die Datei nicht ändert
+
+    Args:
+        pfad (str) : Pfad der DXF-Datei
+        toleranz (float) : Größter Abstand der Linienzüge von Bögen und Splines
+
+    Returns:
+       list : Linienzüge als np.ndarray mit Form (K, 2), je Element in der Reihenfolge der Datei
+    """
+    stat = os.stat(pfad)
+    schluessel = (os.path.abspath(pfad), toleranz, stat.st_size, stat.st_mtime_ns)
+    if schluessel not in _Linienzuege:
+        linienzuege = [linienzug for entity in ezdxf.readfile(pfad).modelspace() for linienzug in _Abflachen(entity, toleranz)]
+        _Linienzuege[schluessel] = [linienzug for linienzug in linienzuege if len(linienzug) >= 2]
+    return _Linienzuege[schluessel]
+
+
+def _Verbinden(linienzuege : list, fangabstand : float = Fangabstand):
+    """Verbindet Linienzüge mit gemeinsamen Endpunkten, zB die einzelnen Linien eines Rechtecks
+
+    Returns:
+       list, list : Geschlossene Ringe und offen gebliebene Linienzüge
+    """
+    offen = [np.asarray(l, dtype=np.float64) for l in linienzuege]
+    ringe, rest = [], []
+    while offen:
+        kette = offen.pop(0)
+        while np.hypot(*(kette[-1] - kette[0])) > fangabstand:
+            for i, teil in enumerate(offen):
+                if np.hypot(*(teil[0] - kette[-1])) <= fangabstand:
+                    kette = np.concatenate((kette, teil[1:]))
+                    break
+                if np.hypot(*(teil[-1] - kette[-1])) <= fangabstand:
+                    kette = np.concatenate((kette, teil[-2::-1]))
+                    break
+            else:
+                break
+            offen.pop(i)
+
+        if len(kette) > 2 and np.hypot(*(kette[-1] - kette[0])) <= fangabstand:
+            kette[-1] = kette[0]
+            ringe.append(kette)
+        else:
+            rest.append(kette)
+    return ringe, rest
+
+
+class Kontur:
+    """
+    Bauteilkontur als Menge von Kanten. Geschlossene Ringe bilden die Fläche des Bauteils, innere Ringe sind
+    Aussparungen (gerade-ungerade Regel).
+    """
+    def __init__(self, linienzuege : list, fangabstand : float = Fangabstand):
+        """
+        Verbindet die Linienzüge zu Ringen und legt die Kanten an.
+
+        Args:
+            linienzuege (list) : Linienzüge als np.ndarray mit Form (K, 2)
+            fangabstand (float) : Endpunkte mit höchstens diesem Abstand werden verbunden
+
+        Raises:
+            ValueError wenn die Linienzüge keinen geschlossenen Ring ergeben
+
+        Returns:
+        """
+        self.ringe, self.offen = _Verbinden(linienzuege, fangabstand)
+        if not self.ringe:
+            raise ValueError('Die Kontur enthält keinen geschlossenen Linienzug')
+
+        # Kanten der Ringe für die Flächenabfrage, alle Kanten für den Randabstand
+        self.ringKanten = np.concatenate([np.stack((r[:-1], r[1:]), axis=1) for r in self.ringe])
+        self.kanten = np.concatenate([self.ringKanten] + [np.stack((l[:-1], l[1:]), axis=1) for l in self.offen])
+
+        punkte = np.concatenate(self.ringe)
+        self.grenzen = (punkte[:, 0].min(), punkte[:, 0].max(), punkte[:, 1].min(), punkte[:, 1].max())
+        self.laenge = self.grenzen[1] - self.grenzen[0]
+        self.hoehe = self.grenzen[3] - self.grenzen[2]
+
+    @classmethod
+    def ausDatei(cls, nameContourdxf : str, toleranz : float = Toleranz):
+        """Liest die Kontur aus der Contour.dxf
+
+        Args:
+            nameContourdxf (str) : Pfad der Contour.dxf Datei
+            toleranz (float) : Größter Abstand der Linienzüge von Bögen und Splines
+
+        Raises:
+            ValueError wenn die Kontur keinen geschlossenen Linienzug enthält
+
+        Returns:
+           Kontur : Bauteilkontur
+        """
+        return cls(LinienzuegeLaden(nameContourdxf, toleranz))
+
+    def _Baender(self):
+        """Teilt den Höhenbereich der Ringkanten in waagrechte Bänder und ordnet jedem Band die Kanten zu, deren
+        Höhenbereich es schneidet. Eine Flächenabfrage muss so nur die Kanten im Band des Punktes prüfen
+
+        Returns:
+           np.ndarray, np.ndarray : Kanten nach Band sortiert und Anfang je Band in diesem Array
+        """
+        if not hasattr(self, '_bandKanten'):
+            ay, by = self.ringKanten[:, 0, 1], self.ringKanten[:, 1, 1]
+            self._bandAnzahl = max(int(np.sqrt(len(ay))), 1)
+            self._bandHoehe = max((self.grenzen[3] - self.grenzen[2]) / self._bandAnzahl, 1e-12)
+            erstes, letztes = self._Band(np.minimum(ay, by)), self._Band(np.maximum(ay, by))
+            anzahl = letztes - erstes + 1
+            kante = np.repeat(np.arange(len(ay)), anzahl)
+            band = np.repeat(erstes, anzahl) + np.arange(anzahl.sum()) - np.repeat(np.cumsum(anzahl) - anzahl, anzahl)
+            reihenfolge = np.argsort(band, kind='stable')
+            self._bandKanten = kante[reihenfolge]
+            self._bandAnfang = np.searchsorted(band[reihenfolge], np.arange(self._bandAnzahl + 1))
+        return self._bandKanten, self._bandAnfang
+
+    def _Band(self, Y):
+        """Nummer des waagrechten Bandes, begrenzt auf die vorhandenen Bänder"""
+        return np.clip(((Y - self.grenzen[2]) / self._bandHoehe).astype(np.int64), 0, self._bandAnzahl - 1)
+
+    @IM.Messen
+    def enthaelt(self, X, Y):
+        """Prüft, ob die Punkte im Bauteil liegen
+
+        Args:
+            X (array_like) : X-Koordinaten
+            Y (array_like) : Y-Koordinaten
+
+        Returns:
+           np.ndarray : True je Punkt im Bauteil, in der Form von X
+        """
+        form = np.shape(X)
+        X = np.asarray(X, dtype=np.float64).ravel()
+        Y = np.asarray(Y, dtype=np.float64).ravel()
+        (ax, ay), (bx, by) = self.ringKanten[:, 0].T, self.ringKanten[:, 1].T
+        # Waagrechte Kanten werden nie geschnitten, der Nenner ist dort beliebig
+        steigung = (bx - ax) / np.where(by == ay, 1.0, by - ay)
+
+        bandKanten, bandAnfang = self._Baender()
+        innen = np.zeros(len(X), dtype=bool)
+        # Punkte über oder unter der Kontur liegen immer außerhalb
+        kandidaten = np.flatnonzero((Y >= self.grenzen[2]) & (Y <= self.grenzen[3]))
+        band = self._Band(Y[kandidaten])
+        for nummer in np.unique(band):
+            punkte = kandidaten[band == nummer]
+            k = bandKanten[bandAnfang[nummer]:bandAnfang[nummer + 1]]
+            groesse = max(_BlockPaare // max(len(k), 1), 1)
+            for von in range(0, len(punkte), groesse):
+                p = punkte[von:von + groesse]
+                x, y = X[p, None], Y[p, None]
+                # Strahl in positiver X-Richtung, ungerade Anzahl Schnitte bedeutet innen
+                schneidet = ((ay[k] > y) != (by[k] > y)) & (x < ax[k] + (y - ay[k]) * steigung[k])
+                innen[p] = np.count_nonzero(schneidet, axis=1) % 2 == 1
+        return innen.reshape(form)
+
+    def _Randabstand(self, X, Y, kanten):
+        """Nächster Punkt auf den angegebenen Kanten, für jeden Punkt gegen jede Kante
+
+        Returns:
+           np.ndarray, np.ndarray, np.ndarray : X- und Y-Koordinaten der Randpunkte und Abstand
+        """
+        a, richtung = self.kanten[kanten, 0], self.kanten[kanten, 1] - self.kanten[kanten, 0]
+        quadrat = np.maximum(np.einsum('ij,ij->i', richtung, richtung), 1e-300)
+        x, y = X[:, None], Y[:, None]
+        # Lotfußpunkt auf jeder Kante, begrenzt auf die Kante
+        t = np.clip(((x - a[:, 0]) * richtung[:, 0] + (y - a[:, 1]) * richtung[:, 1]) / quadrat, 0, 1)
+        px, py = a[:, 0] + t * richtung[:, 0], a[:, 1] + t * richtung[:, 1]
+        abstand = np.hypot(px - x, py - y)
+        kante = np.argmin(abstand, axis=1)
+        zeilen = np.arange(len(X))
+        return px[zeilen, kante], py[zeilen, kante], abstand[zeilen, kante]
+
+    @IM.Messen
+    def naechsterRandpunkt(self, X, Y):
+        """Nächster Punkt auf dem Rand der Kontur. Die Punkte werden räumlich sortiert in Blöcken abgefragt. Für jeden
+        Block werden nur die Kanten geprüft, die näher liegen können als der Rand zum Mittelpunkt des Blocks
+
+        Args:
+            X (array_like) : X-Koordinaten
+            Y (array_like) : Y-Koordinaten
+
+        Returns:
+           np.ndarray, np.ndarray, np.ndarray : X- und Y-Koordinaten der Randpunkte und Abstand, in der Form von X
+        """
+        form = np.shape(X)
+        X = np.asarray(X, dtype=np.float64).ravel()
+        Y = np.asarray(Y, dtype=np.float64).ravel()
+        alle = np.arange(len(self.kanten))
+        kMin, kMax = self.kanten.min(axis=1), self.kanten.max(axis=1)
+
+        # Räumlich sortieren: quadratische Zellen mit im Mittel _BlockPunkte Punkten, zeilenweise durchnummeriert
+        if len(X) == 0:
+            return tuple(np.zeros(form) for _ in range(3))
+        flaeche = max((X.max() - X.min()) * (Y.max() - Y.min()), 1e-24)
+        zelle = np.sqrt(flaeche * _BlockPunkte / len(X))
+        spalte, zeile = np.floor((X - X.min()) / zelle), np.floor((Y - Y.min()) / zelle)
+        reihenfolge = np.lexsort((spalte, zeile))
+
+        ergebnis = np.zeros((3, len(X)))
+        for von in range(0, len(X), _BlockPunkte):
+            p = reihenfolge[von:von + _BlockPunkte]
+            x0, x1, y0, y1 = X[p].min(), X[p].max(), Y[p].min(), Y[p].max()
+            # Kein Punkt des Blocks ist weiter vom Rand entfernt als der Mittelpunkt zuzüglich halber Diagonale
+            _, _, mitte = self._Randabstand(np.array([(x0 + x1) / 2]), np.array([(y0 + y1) / 2]), alle)
+            grenze = mitte[0] + np.hypot(x1 - x0, y1 - y0) / 2
+            dx = np.maximum(np.maximum(kMin[:, 0] - x1, x0 - kMax[:, 0]), 0)
+            dy = np.maximum(np.maximum(kMin[:, 1] - y1, y0 - kMax[:, 1]), 0)
+            kanten = np.flatnonzero(np.hypot(dx, dy) <= grenze)
+            ergebnis[:, p] = self._Randabstand(X[p], Y[p], kanten)
+        return tuple(e.reshape(form) for e in ergebnis)
+
+    def randabstand(self, X, Y):
+        """Abstand zum Rand der Kontur, positiv im Bauteil und negativ außerhalb
+
+        Args:
+            X (array_like) : X-Koordinaten
+            Y (array_like) : Y-Koordinaten
+
+        Returns:
+           np.ndarray : Vorzeichenbehafteter Abstand in der Form von X
+        """
+        _, _, abstand = self.naechsterRandpunkt(X, Y)
+        return np.where(self.enthaelt(X, Y), abstand, -abstand)
+
+    def umfasst(self, grenzen : tuple, toleranz : float = 0.05):
+        """Prüft, ob ein Wertebereich, zB der Elemente, innerhalb der Kontur liegt und sie zum größten Teil ausfüllt.
+        Dann liegen Elemente und Kontur im selben Koordinatensystem
+
+        Args:
+            grenzen (tuple) : Wertebereich (xMin, xMax, yMin, yMax)
+            toleranz (float) : Erlaubte Abweichung als Anteil von Länge und Höhe der Kontur
+
+        Returns:
+           bool : True wenn der Wertebereich zur Kontur passt
+        """
+        rx, ry = toleranz * self.laenge, toleranz * self.hoehe
+        xMin, xMax, yMin, yMax = self.grenzen
+        return bool(abs(grenzen[0] - xMin) <= rx and abs(grenzen[1] - xMax) <= rx and abs(grenzen[2] - yMin) <= ry and abs(grenzen[3] - yMax) <= ry)
+
+
+def Transformation(kontur : Kontur, ModellBild : np.ndarray, grenzen : tuple = None, begrenzung : tuple = None, dpi : int = 120):
+    """Bild zu Drawing Transformation aus der Kontur. Liegen die Elemente im Koordinatensystem der Kontur, folgt sie exakt aus
+    dem Wertebereich der Elemente. Sonst wird die Bauteilbegrenzung im Modellbild auf die Abmessungen der Kontur abgebildet
+
+    Args:
+        kontur (Kontur) : Bauteilkontur
+        ModellBild (np.ndarray) : Modellbild in BGR
+        grenzen (tuple) : Wertebereich aller Elemente (yMin, yMax, zMin, zMax), bei None unbekannt
+        begrenzung (tuple) : Bereits bekannte Bauteilbegrenzung im Modellbild (x, y, breite, hoehe)
+        dpi (int) : Auflösung des Modellbildes in Pixel pro Zoll
+
+    Raises:
+        ValueError wenn im Modellbild kein Modell gefunden wird
+
+    Returns:
+       float, float, float, float : Transformation (x, yC, scalex, scaley) für DXFExport
+    """
+    if grenzen is not None and kontur.umfasst(grenzen):
+        return DA.Bildtransformation(grenzen, dpi)
+
+    x, y, breite, hoehe, scalex, scaley = M9.Skalierung(ModellBild, kontur.laenge, kontur.hoehe, begrenzung)
+    return x - kontur.grenzen[0] * scalex, y + hoehe + kontur.grenzen[2] * scaley, scalex, scaley
+
+
+@IM.Messen
+def AnschluesseSetzen(Sensoren : np.ndarray, kontur : Kontur, transformation : tuple, verlaengerung : float = 15):
+    """Setzt die Anschlüsse der Sensoren auf den nächsten Punkt des Konturrandes, verlängert um verlaengerung nach außen.
+    Ersetzt die Suche nach dem nächsten Pixel außerhalb des Modells in Method.SensorErkennung2. Im Modellbild rot
+    markierte Sperrbereiche werden dabei nicht berücksichtigt
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren aus Method.SensorErkennung
+        kontur (Kontur) : Bauteilkontur
+        transformation (tuple) : Bild zu Drawing Transformation (x, yC, scalex, scaley) der Sensorpunkte
+        verlaengerung (float) : Länge des Anschlusses außerhalb des Bauteils in Drawing Einheiten
+
+    Returns:
+       np.ndarray : Sensoren mit neuen Anschlüssen in unveränderter Reihenfolge
+    """
+    Sensoren = Sensoren.copy()
+    if len(Sensoren) == 0:
+        return Sensoren
+
+    endpunkte = DXFExport.DrawingKoordinaten(Sensoren['punkte'][:, 1:3], transformation).reshape(-1, 2)
+    randX, randY, abstand = kontur.naechsterRandpunkt(endpunkte[:, 0], endpunkte[:, 1])
+    rand = np.stack((randX, randY), axis=-1)
+
+    # Von einem Punkt im Bauteil zeigt die Richtung zum Rand nach außen, von einem Punkt außerhalb nach innen
+    richtung = np.where(kontur.enthaelt(endpunkte[:, 0], endpunkte[:, 1])[:, None], rand - endpunkte, endpunkte - rand)
+    anschluss = rand + richtung / np.maximum(abstand, 1e-12)[:, None] * verlaengerung
+
+    # Liegt der Endpunkt genau auf dem Rand, ist die Richtung unbestimmt und der bisherige Anschluss bleibt
+    neu = np.rint(DXFExport.Bildkoordinaten(anschluss, transformation)).astype(np.int32).reshape(-1, 2, 2)
+    gueltig = (abstand > 1e-9).reshape(-1, 2)
+    Sensoren['punkte'][:, 0] = np.where(gueltig[:, :1], neu[:, 0], Sensoren['punkte'][:, 0])
+    Sensoren['punkte'][:, 3] = np.where(gueltig[:, 1:], neu[:, 1], Sensoren['punkte'][:, 3])
+    return Sensoren
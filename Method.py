@@ -8,67 +8,127 @@ Author: Philipp Haug
 Date: 24.05.2023
 Version: 10.0
 """
+import copy
+import os
+import types
+from concurrent.futures import ProcessPoolExecutor
+from enum import IntEnum
+from multiprocessing import shared_memory
+
 import numpy as np
 import cv2
 
-def SensorMalen(image : np.ndarray, x1 : int, y1 : int, x2 : int, y2 : int, Anschluss1x : int, Anschluss1y : int, Anschluss2x : int, Anschluss2y : int):
-    """Zeichnet den Sensor ins Zielbild
+import Instrumentierung as IM
+
+# Pixelversatz eines Konturpunktes bei cv2.drawContours mit Linienbreite 3
+Linienversatz = np.array([[-2,0],[2,0],[0,-2],[0,2],[-1,-1],[1,-1],[-1,1],[1,1]], dtype=np.int32)
+# Halbe Fenstergröße in Pixeln des Grobbildes, in der Endpunkte und Anschlüsse verfeinert werden
+Fensterradius = 8
+# Mindestlänge eines Sensors in mm
+MindestLaenge = 40
+# Schrittweite in Pixeln beim Verfolgen der Faserrichtung
+Faserschritt = 1.0
+# Maximale Richtungsänderung der Faser in Grad entlang eines Sensors. Stärker gekrümmte Fasern lassen sich mit der
+# geraden Verbindung der Endpunkte nicht abbilden, dort wird wie ohne Faserfeld die Längsachse verwendet
+Faserkruemmung = 15
+
+class SensorArt(IntEnum):
+    """Spannungsart, für die ein Sensor ermittelt wurde"""
+    Zug = 0
+    Druck = 1
+
+# Ein Sensor je Eintrag. punkte ist der Linienzug Anschluss 1, Sensorpunkt 1, Sensorpunkt 2, Anschluss 2 als (x, y) in Pixeln
+SensorDtype = np.dtype([('art', np.uint8), ('laenge', np.float32), ('punkte', np.int32, (4, 2))])
+
+def SensorenErstellen(arten, laengen, punkte):
+    """Erstellt das Sensorarray, aufsteigend nach Länge sortiert
 
     Args:
-        image (np.ndarray) : Zielbild
-        x1 (int) : X-Parameter von Sensorpunkt 1
-        y1 (int) : Y-Parameter von Sensorpunkt 1
-        x2 (int) : X-Parameter von Sensorpunkt 2
-        y2 (int) : Y-Parameter von Sensorpunkt 2
-        Anschluss1x (int) : X-Parameter von Anschluss 1
-        Anschluss1y (int) : Y-Parameter von Anschluss 1
-        Anschluss2x (int) : X-Parameter von Anschluss 2
-        Anschluss2y (int) : Y-Parameter von Anschluss 2
+        arten (array_like) : SensorArt je Sensor
+        laengen (array_like) : Länge je Sensor in mm
+        punkte (array_like) : Linienzug je Sensor mit Form (N, 4, 2)
+
+    Returns:
+       np.ndarray : Strukturiertes Array mit SensorDtype
+    """
+    laengen = np.asarray(laengen, dtype=np.float32)
+    Sensoren = np.empty(len(laengen), dtype=SensorDtype)
+    Sensoren['art'] = arten
+    Sensoren['laenge'] = laengen
+    Sensoren['punkte'] = np.asarray(punkte, dtype=np.int32).reshape(-1, 4, 2)
+    return Sensoren[np.argsort(laengen, kind='stable')]
+
+
+def Laengste(Sensoren : np.ndarray, Anzahl : int):
+    """Wählt die längsten Sensoren aus, bzw. die am höchsten bewerteten nach Elementindex.NachBewertungSortieren
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren aufsteigend nach Länge oder Bewertung sortiert
+        Anzahl (int) : Anzahl der Sensoren
+
+    Returns:
+       np.ndarray : Die letzten Anzahl Sensoren, beginnend beim letzten
+    """
+    if Anzahl <= 0:
+        return Sensoren[:0]
+    return Sensoren[::-1][:Anzahl]
+
+
+def SensorenFiltern(Sensoren : np.ndarray, art : SensorArt = None, minLaenge : float = None):
+    """Filtert die Sensoren nach Spannungsart und Mindestlänge
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren
+        art (SensorArt) : Nur Sensoren dieser Art. Bei None alle
+        minLaenge (float) : Nur Sensoren mit mindestens dieser Länge in mm. Bei None alle
 
     Returns:
-       np.ndarray : Zielbild mit Sensor
+       np.ndarray : Gefilterte Sensoren in unveränderter Reihenfolge
     """
+    auswahl = np.ones(len(Sensoren), dtype=bool)
+    if art is not None:
+        auswahl &= Sensoren['art'] == art
+    if minLaenge is not None:
+        auswahl &= Sensoren['laenge'] >= minLaenge
+    return Sensoren[auswahl]
+
+
+def SensorenMalen(image : np.ndarray, Sensoren : np.ndarray):
+    """Zeichnet alle übergebenen Sensoren mit einem Aufruf ins Zielbild
 
-    cv2.line(image, (x1,y1), (x2,y2), (0,0,0), 2)
-    cv2.line(image, (x1,y1), (Anschluss1x, Anschluss1y), (0,0,0), 2)
-    cv2.line(image, (x2,y2), (Anschluss2x, Anschluss2y), (0,0,0), 2)
+    Args:
+        image (np.ndarray) : Zielbild
+        Sensoren (np.ndarray) : Zu zeichnende Sensoren
 
+    Returns:
+       np.ndarray : Zielbild mit Sensoren
+    """
+    if len(Sensoren):
+        cv2.polylines(image, list(Sensoren['punkte']), False, (0,0,0), 2)
     return image
 
 
-def SensorErkennung2(path : str, area : np.ndarray, scalex : float, scaley : float):
+@IM.Messen
+def SensorErkennung2(kontext, area : np.ndarray, scalex : float, scaley : float):
     """Ermittelt den Sensor für die eingegebene Spannunskontur
 
     Args:
-        path (str) : Aktueller Arbeitsordner
+        kontext (ErkennungsKontext) : Eingelesene Bilder, Farbmasken und Suchfelder des aktuellen Durchlaufs
         area (np.ndarray) : Spannungskontur im Modellbild 
         scalex (float) : Bild zu Drawing Skalierung in X-Richtung
         scaley (float) : Bild zu Drawing Skalierung in Y-Richtung
 
-    Raises:
-        ValueError wenn der Sensor zu kurz ist   
-
     Returns:
-       list: Liste für den Sensor mit Länge, Punkten und Anschlusspunkten
+       float, np.ndarray : Länge des Sensors und Linienzug (Anschluss 1, Punkt 1, Punkt 2, Anschluss 2). None wenn der Sensor zu kurz ist
     """
-    
-    ModellBild = cv2.imread(path +'/Modell.png')
-    image = cv2.imread(path +'/Werte.png')
-    Leeres = np.zeros(image.shape)
+    greyFeld = kontext.greyFeld
 
-    cv2.drawContours(Leeres, area, -1, (255,255,255), 3)
-    cv2.fillPoly(Leeres, pts =[area], color=(255,255,255))
-
-    lowerWhite = np.array([254,254,254], dtype="uint8")
-    upperWhite = np.array([255,255,255], dtype="uint8")
-
-    maskWhite = cv2.inRange(Leeres, lowerWhite, upperWhite)
-    # threshold the grayscale image
-    thresh = cv2.threshold(maskWhite, 0, 255, cv2.THRESH_BINARY)[1]
-
-    # get coordinates of all non-zero pixels
-    # NOTE: must transpose since numpy coords are y,x and opencv uses x,y
-    coords = np.column_stack(np.where(thresh.transpose() > 0))
+    # Das gefüllte Polygon mit 3px Randlinie entspricht der Kontur, deren Punkte um die Linienbreite
+    # erweitert werden. Die konvexe Hülle davon liefert dasselbe Rechteck wie alle Pixel der Fläche
+    hoehe, breite = kontext.image.shape[:2]
+    punkte = area.reshape(-1, 2)[:, None, :] + Linienversatz
+    punkte = np.clip(punkte.reshape(-1, 2), 0, (breite - 1, hoehe - 1)).astype(np.int32)
+    coords = cv2.convexHull(punkte)
 
     # get rotated rectangle from 
     rotrect = cv2.minAreaRect(coords)
@@ -83,108 +143,605 @@ def SensorErkennung2(path : str, area : np.ndarray, scalex : float, scaley : flo
     dist03 = np.sqrt(np.square(distX1)+np.square(distY1))
     dist01 = np.sqrt(np.square(distX2)+np.square(distY2))
 
+    # get center line from box
+    # note points are clockwise from bottom right
     if dist01 >= dist03:
-
-        # get center line from box
-        # note points are clockwise from bottom right
         x1 = (box[0][0] + box[3][0]) // 2
         y1 = (box[0][1] + box[3][1]) // 2
         x2 = (box[1][0] + box[2][0]) // 2
         y2 = (box[1][1] + box[2][1]) // 2
+    else:
+        x1 = (box[0][0] + box[1][0]) // 2
+        y1 = (box[0][1] + box[1][1]) // 2
+        x2 = (box[3][0] + box[2][0]) // 2
+        y2 = (box[3][1] + box[2][1]) // 2
 
-        pixel_color = ModellBild[y1,x1]
-        if pixel_color[0] != [160] and pixel_color[1] != [160] and pixel_color[2] != [160]:
-            x1, y1 = nearestPoint(ModellBild, x1,y1, (160,160,160))
+    # Endpunkte auf das Modell (grau) setzen
+    x1, y1 = greyFeld.nearestPoint(x1, y1)
+    x2, y2 = greyFeld.nearestPoint(x2, y2)
 
+    return _Sensor(kontext, x1, y1, x2, y2, scalex, scaley)
 
-        pixel_color = ModellBild[y2,x2]
-        if pixel_color[0] != [160] and pixel_color[1] != [160] and pixel_color[2] != [160]:
-            x2, y2 = nearestPoint(ModellBild, x2,y2, (160,160,160))
 
-        laengeSensor = np.sqrt(np.square((x2-x1)/scalex)+np.square((y2-y1)/scaley))
+def _Sensor(kontext, x1 : int, y1 : int, x2 : int, y2 : int, scalex : float, scaley : float):
+    """Prüft die Länge des Sensors zwischen den Sensorpunkten auf dem Modell und setzt die Anschlüsse
 
-        if  laengeSensor > 40:
+    Returns:
+       float, np.ndarray : Länge des Sensors und Linienzug (Anschluss 1, Punkt 1, Punkt 2, Anschluss 2). None wenn der Sensor zu kurz ist
+    """
+    whiteFeld = kontext.whiteFeld
 
-            Anschluss1x, Anschluss1y = nearestPoint(ModellBild, x1,y1, (255,255,255))
-            c = np.sqrt(((Anschluss1x -x1)/scalex) ** 2 + ((Anschluss1y - y1)/scaley) ** 2)
-            x3 = (Anschluss1x - x1) / c
-            y3 = (Anschluss1y - y1) / c
+    laengeSensor = np.sqrt(np.square((x2-x1)/scalex)+np.square((y2-y1)/scaley))
+    #print('länge Sensor: ', laengeSensor)
 
-            Anschluss1x = int(Anschluss1x + x3 * 15)
-            Anschluss1y = int(Anschluss1y + y3 * 15)
+    if  laengeSensor > MindestLaenge:
 
-            Anschluss2x, Anschluss2y = nearestPoint(ModellBild, x2,y2, (255,255,255))
-            c = np.sqrt(((Anschluss2x -x2)/scalex) ** 2 + ((Anschluss2y - y2)/scaley) ** 2)
-            x3 = (Anschluss2x - x2) / c
-            y3 = (Anschluss2y - y2) / c
+        Anschluss1x, Anschluss1y = whiteFeld.nearestPoint(x1, y1)
+        c = np.sqrt(((Anschluss1x -x1)/scalex) ** 2 + ((Anschluss1y - y1)/scaley) ** 2)
+        x3 = (Anschluss1x - x1) / c
+        y3 = (Anschluss1y - y1) / c
 
-            Anschluss2x = int(Anschluss2x + x3 * 15)
-            Anschluss2y = int(Anschluss2y + y3 * 15)
+        Anschluss1x = int(Anschluss1x + x3 * 15)
+        Anschluss1y = int(Anschluss1y + y3 * 15)
 
-            return laengeSensor, x1, y1, x2, y2, Anschluss1x, Anschluss1y, Anschluss2x, Anschluss2y
-        
-        else:
-            return ValueError, 'Error', 'Error', 'Error', 'Error', 'Error', 'Error', 'Error', 'Error'
+        Anschluss2x, Anschluss2y = whiteFeld.nearestPoint(x2, y2)
+        c = np.sqrt(((Anschluss2x -x2)/scalex) ** 2 + ((Anschluss2y - y2)/scaley) ** 2)
+        x3 = (Anschluss2x - x2) / c
+        y3 = (Anschluss2y - y2) / c
 
+        Anschluss2x = int(Anschluss2x + x3 * 15)
+        Anschluss2y = int(Anschluss2y + y3 * 15)
 
-    elif dist03 > dist01:
-        # get center line from box
-        # note points are clockwise from bottom right
-        x1 = (box[0][0] + box[1][0]) // 2
-        y1 = (box[0][1] + box[1][1]) // 2
-        x2 = (box[3][0] + box[2][0]) // 2
-        y2 = (box[3][1] + box[2][1]) // 2
+        return laengeSensor, np.array([[Anschluss1x, Anschluss1y], [x1, y1], [x2, y2], [Anschluss2x, Anschluss2y]], dtype=np.int32)
+
+    else:
+        return None
+
+
+@IM.Messen
+def FaserSensoren(kontext, areas : list, scalex : float, scaley : float, schritt : float = Faserschritt,
+                  kruemmung : float = Faserkruemmung):
+    """Ermittelt die Sensoren entlang der Faserrichtung statt entlang der Längsachse des minAreaRect.
+    Von der Mitte jeder Spannungskontur wird die Faserrichtung aus kontext.faser in beide Richtungen verfolgt, bis die
+    Kontur verlassen wird. Alle Konturen werden dabei gemeinsam, Schritt für Schritt vektorisiert verfolgt.
+    Ein Sensor besteht wie in SensorDtype aus zwei Anschlüssen und zwei Endpunkten, exportiert wird daher die gerade
+    Verbindung der Enden des verfolgten Faserverlaufs und die Länge ist deren Abstand. Weicht die Faserrichtung entlang
+    des Verlaufs um mehr als kruemmung von der Richtung in der Mitte ab, wird kein Sensor ermittelt.
+
+    Args:
+        kontext (ErkennungsKontext) : Kontext mit dem Faserfeld kontext.faser
+        areas (list) : Spannungskonturen im Modellbild
+        scalex (float) : Bild zu Drawing Skalierung in X-Richtung
+        scaley (float) : Bild zu Drawing Skalierung in Y-Richtung
+        schritt (float) : Schrittweite in Pixeln
+        kruemmung (float) : Maximale Richtungsänderung der Faser in Grad
+
+    Returns:
+       list : Je Kontur wie SensorErkennung2 Länge und Linienzug, None wenn der Sensor zu kurz oder die Faser zu stark
+              gekrümmt ist
+    """
+    hoehe, breite = kontext.image.shape[:2]
+    if not areas:
+        return []
+
+    # Jede Kontur als eigene Nummer, wie in SensorErkennung2 mit der 3px Randlinie
+    regionen = np.zeros((hoehe, breite), dtype=np.int32)
+    for nummer, area in enumerate(areas, start=1):
+        cv2.drawContours(regionen, [area], -1, nummer, -1)
+        cv2.drawContours(regionen, [area], -1, nummer, 3)
+
+    # Startpunkt ist der Schwerpunkt der Kontur, liegt er außerhalb der nächste Pixel der Kontur
+    start = np.zeros((len(areas), 2))
+    for i, area in enumerate(areas):
+        punkte = area.reshape(-1, 2).astype(np.float64)
+        momente = cv2.moments(area)
+        mitte = (momente['m10'] / momente['m00'], momente['m01'] / momente['m00']) if momente['m00'] else punkte.mean(axis=0)
+        x, y = min(max(int(round(mitte[0])), 0), breite - 1), min(max(int(round(mitte[1])), 0), hoehe - 1)
+        if regionen[y, x] != i + 1:
+            ys, xs = np.nonzero(regionen == i + 1)
+            if len(xs):
+                j = np.argmin(np.square(xs - mitte[0]) + np.square(ys - mitte[1]))
+                x, y = xs[j], ys[j]
+        start[i] = x, y
+
+    nummern = np.arange(1, len(areas) + 1)
+    anfang = kontext.faser[start[:, 1].astype(np.int64), start[:, 0].astype(np.int64)].astype(np.float64)
+    # Kleinster Kosinus zwischen Schrittrichtung und Anfangsrichtung je Kontur
+    abweichung = np.ones(len(areas))
+    enden = []
+    for vorzeichen in (-1, 1):
+        position, richtung = start.copy(), anfang * vorzeichen
+        aktiv = np.arange(len(areas))
+        # Die Schrittzahl ist begrenzt, damit geschlossene Faserverläufe in einer Kontur nicht endlos verfolgt werden
+        for _ in range(hoehe + breite):
+            if len(aktiv) == 0:
+                break
+            px, py = position[aktiv, 0].astype(np.int64), position[aktiv, 1].astype(np.int64)
+            d = kontext.faser[py, px].astype(np.float64)
+            # Das Feld hat kein Vorzeichen, die Richtung des letzten Schrittes wird beibehalten
+            d[np.einsum('ij,ij->i', d, richtung[aktiv]) < 0] *= -1
+            neu = position[aktiv] + d * schritt
+
+            nx, ny = np.rint(neu[:, 0]).astype(np.int64), np.rint(neu[:, 1]).astype(np.int64)
+            innen = (nx >= 0) & (nx < breite) & (ny >= 0) & (ny < hoehe)
+            innen[innen] = regionen[ny[innen], nx[innen]] == nummern[aktiv[innen]]
+            position[aktiv[innen]] = neu[innen]
+            richtung[aktiv[innen]] = d[innen]
+            aktiv = aktiv[innen]
+            cosinus = np.einsum('ij,ij->i', d[innen], anfang[aktiv]) * vorzeichen
+            abweichung[aktiv] = np.minimum(abweichung[aktiv], cosinus)
+        enden.append(np.rint(position).astype(np.int64))
+
+    ergebnisse = []
+    for (x1, y1), (x2, y2), cosinus in zip(*enden, abweichung):
+        if cosinus < np.cos(np.radians(kruemmung)):
+            ergebnisse.append(None)
+            continue
+        # Endpunkte auf das Modell (grau) setzen
+        x1, y1 = kontext.greyFeld.nearestPoint(x1, y1)
+        x2, y2 = kontext.greyFeld.nearestPoint(x2, y2)
+        ergebnisse.append(_Sensor(kontext, x1, y1, x2, y2, scalex, scaley))
+    return ergebnisse
+
+
+@IM.Messen
+def SensorErkennung(path : str, scalex : float, scaley : float, kontext=None, jobs : int = 1):
+    """Ermittelt die Sensoren anhand des Bildes des Modells
 
-        pixel_color = ModellBild[y1,x1]
-        if pixel_color[0] != [160] and pixel_color[1] != [160] and pixel_color[2] != [160]:
-            x1, y1 = nearestPoint(ModellBild, x1,y1, (160,160,160))
+    Args:
+        path (str) : Aktueller Arbeitsordner
+        scalex (float) : Bild zu Drawing Skalierung in X-Richtung
+        scaley (float) : Bild zu Drawing Skalierung in Y-Richtung
+        kontext (ErkennungsKontext) : Bereits eingelesene Bilder. Bei None werden Modell.png und Werte.png aus dem Arbeitsordner gelesen
+        jobs (int) : Anzahl Prozesse für die Auswertung der Konturen. 1 wertet nacheinander aus, 0 verwendet alle CPU-Kerne.
+                     Lohnt sich erst bei vielen großen Konturen, da jeder Prozess gestartet werden muss. Mit Faserfeld
+                     werden alle Konturen gemeinsam in FaserSensoren verfolgt, nur die Konturen ohne Ergebnis werden
+                     in den Prozessen entlang der Längsachse ausgewertet
 
-        pixel_color = ModellBild[y2,x2]
-        if pixel_color[0] != [160] and pixel_color[1] != [160] and pixel_color[2] != [160]:
-            x2, y2 = nearestPoint(ModellBild, x2,y2, (160,160,160))
+    Returns:
+       np.ndarray : Alle Sensoren als strukturiertes Array mit SensorDtype, aufsteigend nach Länge sortiert
+    """
 
-        laengeSensor = np.sqrt(np.square((x2-x1)/scalex)+np.square((y2-y1)/scaley))
-        #print('länge Sensor: ', laengeSensor)
+    if kontext is None:
+        kontext = ErkennungsKontext.ausOrdner(path)
+    contoursOrange, _ = cv2.findContours(kontext.maskOrange, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    contoursPurple, _ = cv2.findContours(kontext.maskPurple, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    contoursGrey, _ = cv2.findContours(kontext.maskGrey, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
 
-        if  laengeSensor > 40:
-            Anschluss1x, Anschluss1y = nearestPoint(ModellBild, x1,y1, (255,255,255))
-            c = np.sqrt(((Anschluss1x -x1)/scalex) ** 2 + ((Anschluss1y - y1)/scaley) ** 2)
-            x3 = (Anschluss1x - x1) / c
-            y3 = (Anschluss1y - y1) / c
+    konturen = [(SensorArt.Zug, cnt) for cnt in contoursOrange if len(cnt) > len(contoursGrey)*0.2]
+    konturen += [(SensorArt.Druck, cnt) for cnt in contoursPurple if len(cnt) > len(contoursGrey)*0.2]
 
-            Anschluss1x = int(Anschluss1x + x3 * 15)
-            Anschluss1y = int(Anschluss1y + y3 * 15)
+    def Auswerten(eintrag):
+        return SensorErkennung2(kontext, eintrag[1], scalex, scaley)
 
-            Anschluss2x, Anschluss2y = nearestPoint(ModellBild, x2,y2, (255,255,255))
-            c = np.sqrt(((Anschluss2x -x2)/scalex) ** 2 + ((Anschluss2y - y2)/scaley) ** 2)
-            x3 = (Anschluss2x - x2) / c
-            y3 = (Anschluss2y - y2) / c
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
 
-            Anschluss2x = int(Anschluss2x + x3 * 15)
-            Anschluss2y = int(Anschluss2y + y3 * 15)
+    ergebnisse = [None] * len(konturen)
+    if kontext.faser is not None:
+        ergebnisse = FaserSensoren(kontext, [cnt for _, cnt in konturen], scalex, scaley)
+    # Ohne Faserfeld alle Konturen, sonst die quer zur Faser liegenden oder stark gekrümmten Bereiche, die keinen
+    # Sensor ergeben haben, wie bisher entlang der Längsachse
+    offen = [i for i, ergebnis in enumerate(ergebnisse) if ergebnis is None]
 
-            return laengeSensor, x1, y1, x2, y2, Anschluss1x, Anschluss1y, Anschluss2x, Anschluss2y
-        
-        else:
-            return ValueError, 'Error', 'Error', 'Error', 'Error', 'Error', 'Error', 'Error', 'Error'
+    if jobs > 1 and len(offen) > 1:
+        # Die Auswertung einer Kontur besteht überwiegend aus Python und kleinen numpy Aufrufen, die das GIL halten.
+        # Daher Prozesse statt Threads, die Suchfelder werden über Shared Memory geteilt statt kopiert
+        neu = _ParallelAuswerten([konturen[i][1] for i in offen], kontext, scalex, scaley, min(jobs, len(offen)))
+    else:
+        neu = [Auswerten(konturen[i]) for i in offen]
+    for i, ergebnis in zip(offen, neu):
+        ergebnisse[i] = ergebnis
 
+    gefunden = [(art, ergebnis) for (art, _), ergebnis in zip(konturen, ergebnisse) if ergebnis is not None]
 
-def SensorErkennung(path : str, scalex : float, scaley : float):
-    """Ermittelt die Sensoren anhand des Bildes des Modells
+    return SensorenErstellen([art for art, _ in gefunden], [laenge for _, (laenge, _) in gefunden], [punkte for _, (_, punkte) in gefunden])
+
+
+#Suchfelder im Shared Memory für die Prozesse von _ParallelAuswerten, je Prozess einmal in _ProzessStarten gesetzt
+_Prozesskontext = None
+
+def _FelderTeilen(kontext):
+    """Kopiert die Suchfelder des Kontexts in Shared Memory
 
     Args:
-        path (str) : Aktueller Arbeitsordner
+        kontext (ErkennungsKontext) : Kontext des Erkennungsdurchlaufs
+
+    Returns:
+       list, dict : Angelegte Speicherblöcke, die der Aufrufer freigeben muss, und Beschreibung für _ProzessStarten
+    """
+    speicher = []
+    beschreibung = {'form': kontext.image.shape[:2]}
+    for name in ('greyFeld', 'whiteFeld'):
+        feld = getattr(kontext, name)
+        if feld.leer:
+            beschreibung[name] = None
+            continue
+        shm = shared_memory.SharedMemory(create=True, size=feld.naechstesX.nbytes + feld.naechstesY.nbytes)
+        speicher.append(shm)
+        ziel = np.ndarray((2,) + feld.naechstesX.shape, dtype=np.int32, buffer=shm.buf)
+        ziel[0], ziel[1] = feld.naechstesX, feld.naechstesY
+        del ziel
+        beschreibung[name] = shm.name
+    return speicher, beschreibung
+
+
+def _ProzessStarten(beschreibung : dict):
+    """Verbindet einen Prozess von _ParallelAuswerten mit den Suchfeldern im Shared Memory"""
+    global _Prozesskontext
+    hoehe, breite = beschreibung['form']
+    # SensorErkennung2 benötigt vom Wertebild nur die Form
+    kontext = types.SimpleNamespace(image=np.broadcast_to(np.uint8(0), (hoehe, breite)), speicher=[])
+    for name in ('greyFeld', 'whiteFeld'):
+        feld = FarbFeld.__new__(FarbFeld)
+        feld.height, feld.width = hoehe, breite
+        feld.leer = beschreibung[name] is None
+        if not feld.leer:
+            shm = shared_memory.SharedMemory(name=beschreibung[name])
+            kontext.speicher.append(shm)
+            feld.naechstesX, feld.naechstesY = np.ndarray((2, hoehe, breite), dtype=np.int32, buffer=shm.buf)
+        setattr(kontext, name, feld)
+    _Prozesskontext = kontext
+
+
+def _PaketAuswerten(areas : list, scalex : float, scaley : float):
+    """Wertet ein Paket von Konturen in einem Prozess von _ParallelAuswerten aus"""
+    return [SensorErkennung2(_Prozesskontext, area, scalex, scaley) for area in areas]
+
+
+@IM.Messen
+def _ParallelAuswerten(areas : list, kontext, scalex : float, scaley : float, jobs : int):
+    """Wertet die Konturen mit SensorErkennung2 in mehreren Prozessen aus
+
+    Args:
+        areas (list) : Spannungskonturen im Modellbild
+        kontext (ErkennungsKontext) : Kontext des Erkennungsdurchlaufs
         scalex (float) : Bild zu Drawing Skalierung in X-Richtung
         scaley (float) : Bild zu Drawing Skalierung in Y-Richtung
+        jobs (int) : Anzahl Prozesse
 
     Returns:
-       list : Liste mit allen Sensoren mit Art, Länge, Punkten und Anschlusspunkten
+       list : Ergebnisse von SensorErkennung2 in der Reihenfolge der Konturen
     """
+    # Pakete mit etwa gleich vielen Konturpunkten, mehrere je Prozess zum Ausgleich unterschiedlicher Laufzeiten
+    summe = np.cumsum([len(area) for area in areas])
+    grenzen = np.searchsorted(summe, summe[-1] * np.arange(1, jobs * 4) / (jobs * 4))
+    pakete = [paket for paket in np.split(np.arange(len(areas)), np.unique(grenzen)) if len(paket)]
 
-    #Modell einlesen
-    ModellBild = cv2.imread(path + '/Modell.png')
-    image = cv2.imread(path + '/Werte.png')
+    speicher, beschreibung = _FelderTeilen(kontext)
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_ProzessStarten, initargs=(beschreibung,)) as pool:
+            teile = pool.map(_PaketAuswerten, [[areas[i] for i in paket] for paket in pakete],
+                             [scalex] * len(pakete), [scaley] * len(pakete))
+            return [ergebnis for teil in teile for ergebnis in teil]
+    finally:
+        for shm in speicher:
+            shm.close()
+            shm.unlink()
 
+
+def _Schneiden(a : tuple, b : tuple):
+    """Prüft, ob sich zwei Bereiche (x0, y0, x1, y1) mit exklusivem Ende überlappen"""
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class _Abfragen:
+    """
+    Zeichnet die Abfragen eines FarbFeldes auf. Ändert sich das Bild nur außerhalb aller aufgezeichneten Bereiche,
+    liefern die Abfragen dasselbe Ergebnis.
+    """
+    def __init__(self, feld):
+        self.feld = feld
+        self.bereiche = []
+
+    def nearestPoint(self, startX : int, startY : int):
+        zielX, zielY = self.feld.nearestPoint(startX, startY)
+        if self.feld.leer:
+            # Jeder neue Zielpixel ändert das Ergebnis
+            self.bereiche.append((-np.inf, -np.inf, np.inf, np.inf))
+        else:
+            x = min(max(int(startX), 0), self.feld.width - 1)
+            y = min(max(int(startY), 0), self.feld.height - 1)
+            # Ein näherer oder gleich weiter Zielpixel liegt im Kreis um den Startpunkt durch den gefundenen Punkt
+            r = int(np.ceil(np.hypot(zielX - x, zielY - y)))
+            self.bereiche.append((x - r, y - r, x + r + 1, y + r + 1))
+        return zielX, zielY
+
+
+class InkrementelleErkennung:
+    """
+    Sensorerkennung für die Bearbeitungsfenster. Hält die Spannungskonturen mit ihren Sensoren und wertet nach einer
+    Änderung nur die Konturen neu aus, die den geänderten Bereich berühren. Bei Änderungen des Modells werden zusätzlich
+    die Konturen neu ausgewertet, deren Suche nach dem nächsten grauen oder weißen Punkt den Bereich erreicht hat.
+    Das Ergebnis entspricht SensorErkennung mit den geänderten Bildern.
+    """
+    @IM.Messen
+    def __init__(self, kontext, scalex : float, scaley : float):
+        """
+        Sucht alle Spannungskonturen und wertet sie aus.
+
+        Args:
+            kontext (ErkennungsKontext) : Eingelesene Bilder, die Bilder und Masken werden bei Änderungen überschrieben
+            scalex (float) : Bild zu Drawing Skalierung in X-Richtung
+            scaley (float) : Bild zu Drawing Skalierung in Y-Richtung
+
+        Returns:
+        """
+        self.kontext = kontext
+        self.scalex = scalex
+        self.scaley = scaley
+
+        self.anzahlGrau = len(cv2.findContours(kontext.maskGrey, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[0])
+        #Suchfelder passen nach einer Änderung des Modells nicht mehr zum Modellbild und werden bei Bedarf neu berechnet
+        self.felderVeraltet = False
+        self.konturen = []
+        for art, maske in ((SensorArt.Zug, kontext.maskOrange), (SensorArt.Druck, kontext.maskPurple)):
+            konturen, _ = cv2.findContours(maske, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+            self.konturen += [self._Eintrag(art, cnt) for cnt in konturen]
+        self._Auswerten()
+
+    @staticmethod
+    def _Eintrag(art : SensorArt, cnt : np.ndarray):
+        """Neue, noch nicht ausgewertete Kontur"""
+        x, y, w, h = cv2.boundingRect(cnt)
+        return {'art': art, 'kontur': cnt, 'rahmen': (x, y, x + w, y + h), 'ausgewertet': False, 'ergebnis': None, 'einfluss': []}
+
+    def _Auswerten(self):
+        """Wertet alle Konturen aus, die die Auswahl wie in SensorErkennung bestehen und noch kein Ergebnis haben
+
+        Returns:
+           int : Anzahl ausgewerteter Konturen
+        """
+        anzahl = 0
+        for eintrag in self.konturen:
+            if eintrag['ausgewertet'] or len(eintrag['kontur']) <= self.anzahlGrau * 0.2:
+                continue
+            if self.felderVeraltet:
+                self.kontext.greyFeld = FarbFeld(self.kontext.ModellBild, (160,160,160))
+                self.kontext.whiteFeld = FarbFeld(self.kontext.ModellBild, (255,255,255))
+                self.felderVeraltet = False
+
+            # Kontext mit aufzeichnenden Suchfeldern, die Bilder und Masken werden nicht kopiert
+            ansicht = copy.copy(self.kontext)
+            ansicht.greyFeld = _Abfragen(self.kontext.greyFeld)
+            ansicht.whiteFeld = _Abfragen(self.kontext.whiteFeld)
+            ergebnis = None
+            if ansicht.faser is not None:
+                ergebnis = FaserSensoren(ansicht, [eintrag['kontur']], self.scalex, self.scaley)[0]
+            if ergebnis is None:
+                ergebnis = SensorErkennung2(ansicht, eintrag['kontur'], self.scalex, self.scaley)
+
+            eintrag['ergebnis'] = ergebnis
+            eintrag['einfluss'] = ansicht.greyFeld.bereiche + ansicht.whiteFeld.bereiche
+            eintrag['ausgewertet'] = True
+            anzahl += 1
+        return anzahl
+
+    def _KonturenErsetzen(self, bereiche : list):
+        """Sucht die Spannungskonturen, die einen der geänderten Bereiche berühren, neu
+
+        Args:
+            bereiche (list) : Geänderte Bereiche (x0, y0, x1, y1)
+
+        Returns:
+        """
+        hoehe, breite = self.kontext.image.shape[:2]
+        # Um einen Pixel erweitert, damit auch angrenzende Konturen erfasst werden, die durch die Änderung verbunden werden
+        raender = [(b[0] - 1, b[1] - 1, b[2] + 1, b[3] + 1) for b in bereiche]
+
+        for art, maske in ((SensorArt.Zug, self.kontext.maskOrange), (SensorArt.Druck, self.kontext.maskPurple)):
+            alt = [e for e in self.konturen if e['art'] == art and any(_Schneiden(e['rahmen'], r) for r in raender)]
+
+            # Neue Konturen liegen in den geänderten Bereichen und den alten Konturen. Der zusätzliche Pixel Rand stellt
+            # sicher, dass angeschnittene, unbeteiligte Konturen keinen Rand berühren und verworfen werden
+            rahmen = np.array(raender + [e['rahmen'] for e in alt])
+            x0, y0 = max(int(rahmen[:, 0].min()) - 1, 0), max(int(rahmen[:, 1].min()) - 1, 0)
+            x1, y1 = min(int(rahmen[:, 2].max()) + 1, breite), min(int(rahmen[:, 3].max()) + 1, hoehe)
+            konturen, _ = cv2.findContours(np.ascontiguousarray(maske[y0:y1, x0:x1]), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE,
+                                           offset=(x0, y0))
+
+            neu = [self._Eintrag(art, cnt) for cnt in konturen]
+            neu = [e for e in neu if any(_Schneiden(e['rahmen'], r) for r in raender)]
+            self.konturen = [e for e in self.konturen if not any(e is a for a in alt)] + neu
+
+    @IM.Messen
+    def aktualisieren(self, bereiche : list, ModellAusschnitte : list = None, WerteAusschnitte : list = None):
+        """Übernimmt geänderte Bildausschnitte und wertet die betroffenen Konturen neu aus
+
+        Args:
+            bereiche (list) : Geänderte Bereiche (x0, y0, x1, y1) in Pixeln, Ende exklusiv
+            ModellAusschnitte (list) : Neuer Inhalt des Modellbildes je Bereich in BGR
+            WerteAusschnitte (list) : Neuer Inhalt des Wertebildes je Bereich in BGR
+
+        Returns:
+           int : Anzahl neu ausgewerteter Konturen
+        """
+        kontext = self.kontext
+        bereiche = [tuple(int(wert) for wert in bereich) for bereich in bereiche]
+        ausschnitte = [np.s_[y0:y1, x0:x1] for x0, y0, x1, y1 in bereiche]
+
+        if WerteAusschnitte is not None:
+            for ausschnitt, inhalt in zip(ausschnitte, WerteAusschnitte):
+                kontext.image[ausschnitt] = inhalt
+                kontext.maskOrange[ausschnitt] = cv2.inRange(inhalt, kontext.lowerOrange, kontext.upperOrange)
+                kontext.maskPurple[ausschnitt] = cv2.inRange(inhalt, kontext.lowerPurple, kontext.upperPurple)
+            self._KonturenErsetzen(bereiche)
+
+        if ModellAusschnitte is not None:
+            for ausschnitt, inhalt in zip(ausschnitte, ModellAusschnitte):
+                kontext.ModellBild[ausschnitt] = inhalt
+                kontext.maskGrey[ausschnitt] = cv2.inRange(inhalt, kontext.lowerGrey, kontext.upperGrey)
+            self.felderVeraltet = True
+            self.anzahlGrau = len(cv2.findContours(kontext.maskGrey, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[0])
+            for eintrag in self.konturen:
+                if eintrag['ausgewertet'] and any(_Schneiden(e, b) for e in eintrag['einfluss'] for b in bereiche):
+                    eintrag['ausgewertet'] = False
+
+        return self._Auswerten()
+
+    def sensoren(self):
+        """Aktuelle Sensoren aller ausgewählten Konturen
+
+        Returns:
+           np.ndarray : Alle Sensoren als strukturiertes Array mit SensorDtype, aufsteigend nach Länge sortiert
+        """
+        gefunden = [e for e in self.konturen if len(e['kontur']) > self.anzahlGrau * 0.2 and e['ergebnis'] is not None]
+        return SensorenErstellen([e['art'] for e in gefunden], [e['ergebnis'][0] for e in gefunden], [e['ergebnis'][1] for e in gefunden])
+
+
+def _Naechster(maske : np.ndarray, x0 : int, y0 : int, startX : float, startY : float):
+    """Nächster markierter Pixel einer Fenstermaske zum Startpunkt
+
+    Args:
+        maske (np.ndarray) : Maske des Fensters
+        x0 (int) : Erste Pixelspalte des Fensters
+        y0 (int) : Erste Pixelzeile des Fensters
+        startX (float) : X-Parameter von Startpunkt
+        startY (float) : Y-Parameter von Startpunkt
+
+    Returns:
+       int , int : X-Parameter und Y-Parameter von Zielpunkt, None wenn die Maske leer ist
+    """
+    ys, xs = np.nonzero(maske)
+    if len(xs) == 0:
+        return None
+    i = np.argmin(np.square(xs + x0 - startX) + np.square(ys + y0 - startY))
+    return int(xs[i] + x0), int(ys[i] + y0)
+
+
+def _Fenster(raster, mitteX : int, mitteY : int, radius : int):
+    """Rendert das Fenster mit dem Radius um den Mittelpunkt, begrenzt auf das Raster
+
+    Returns:
+       tuple, tuple : (x0, y0) des Fensters, Masken von Modell, Zugspannungen und Druckspannungen
+    """
+    hoehe, breite = raster.form
+    x0, y0 = min(max(int(mitteX) - radius, 0), breite - 1), min(max(int(mitteY) - radius, 0), hoehe - 1)
+    x1, y1 = max(min(int(mitteX) + radius + 1, breite), x0 + 1), max(min(int(mitteY) + radius + 1, hoehe), y0 + 1)
+    return (x0, y0), raster.fenster(x0, y0, x1, y1)
+
+
+@IM.Messen
+def SensorenVerfeinern(Sensoren : np.ndarray, kontext, raster, scalex : float, scaley : float):
+    """Verfeinert die im Grobbild gefundenen Sensoren (coarse-to-fine). Mittellinie und Bereiche stammen aus dem Grobbild,
+    Endpunkte und Anschlüsse werden in kleinen Fenstern des feinen Rasters neu bestimmt:
+    Das Ende des Spannungsbereichs entlang der Mittellinie, der nächste Modellpunkt dazu und der nächste Punkt außerhalb
+    des Modells, um den der Anschluss wie in SensorErkennung2 um 15 mm verlängert wird.
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren aus SensorErkennung
+        kontext (ErkennungsKontext) : Kontext des Grobbildes
+        raster (Datenaufbereitung.FeinRaster) : Feines Raster der Elemente
+        scalex (float) : Bild zu Drawing Skalierung des Grobbildes in X-Richtung
+        scaley (float) : Bild zu Drawing Skalierung des Grobbildes in Y-Richtung
+
+    Returns:
+       np.ndarray : Sensoren mit Punkten im feinen Raster, aufsteigend nach Länge sortiert. Für den Export gilt die mit
+                    raster.faktor multiplizierte Transformation. Ist ein verfeinerter Sensor nicht länger als
+                    MindestLaenge, bleibt der Sensor aus dem Grobbild erhalten
+    """
+    f = raster.faktor
+    radius = Fensterradius * f
+    scalexFein, scaleyFein = scalex * f, scaley * f
+
+    laengen = []
+    punkte = []
+    for sensor in Sensoren:
+        Anschluss1, punkt1, punkt2, Anschluss2 = sensor['punkte'].astype(np.float64)
+        richtung = punkt2 - punkt1
+        richtung /= max(np.hypot(*richtung), 1e-9)
+
+        linienzug = []
+        for punkt, aussen in ((punkt1, -richtung), (punkt2, richtung)):
+            mitte = punkt * f
+            (x0, y0), (modell, zug, druck) = _Fenster(raster, mitte[0], mitte[1], radius)
+
+            # Ende des Spannungsbereichs entlang der Mittellinie
+            bereich = zug if sensor['art'] == SensorArt.Zug else druck
+            ys, xs = np.nonzero(bereich)
+            ende = mitte
+            if len(xs):
+                ende = mitte + ((xs + x0 - mitte[0]) * aussen[0] + (ys + y0 - mitte[1]) * aussen[1]).max() * aussen
+
+            # Endpunkt auf das Modell setzen
+            endpunkt = _Naechster(modell, x0, y0, *ende) or (int(round(ende[0])), int(round(ende[1])))
+
+            # Anschluss: nächster Punkt außerhalb des Modells, gesucht um den Anschlusspunkt des Grobbildes
+            weissX, weissY = kontext.whiteFeld.nearestPoint(*punkt)
+            (x0, y0), (modell, _, _) = _Fenster(raster, weissX * f, weissY * f, radius)
+            Anschlussx, Anschlussy = _Naechster(modell == 0, x0, y0, *endpunkt) or (weissX * f, weissY * f)
+
+            c = np.sqrt(((Anschlussx - endpunkt[0]) / scalexFein) ** 2 + ((Anschlussy - endpunkt[1]) / scaleyFein) ** 2)
+            if c > 0:
+                Anschlussx = int(Anschlussx + (Anschlussx - endpunkt[0]) / c * 15)
+                Anschlussy = int(Anschlussy + (Anschlussy - endpunkt[1]) / c * 15)
+
+            linienzug.append((endpunkt, (Anschlussx, Anschlussy)))
+
+        (endpunkt1, Anschluss1), (endpunkt2, Anschluss2) = linienzug
+        laenge = np.sqrt(np.square((endpunkt2[0] - endpunkt1[0]) / scalexFein) + np.square((endpunkt2[1] - endpunkt1[1]) / scaleyFein))
+        if laenge > MindestLaenge:
+            laengen.append(laenge)
+            punkte.append([Anschluss1, endpunkt1, endpunkt2, Anschluss2])
+        else:
+            # Wie in SensorErkennung2 gilt die Mindestlänge, dann bleibt der Sensor aus dem Grobbild im feinen Raster
+            laengen.append(sensor['laenge'])
+            punkte.append(sensor['punkte'] * f)
+
+    return SensorenErstellen(Sensoren['art'], laengen, np.asarray(punkte, dtype=np.int32).reshape(-1, 4, 2))
+
+def Begrenzung(maskGrey : np.ndarray):
+    """Ermittelt die Begrenzung der größten zusammenhängenden Modellfläche
+
+    Args:
+        maskGrey (np.ndarray) : Maske des Modells
+
+    Raises:
+        ValueError wenn in der Maske kein Modell gefunden wird
+
+    Returns:
+       int, int, int, int : x, y, Breite und Höhe der Bauteilbegrenzung in Pixeln
+    """
+    contoursGrey, _ = cv2.findContours(maskGrey, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+
+    if len(contoursGrey) == 0:
+        raise ValueError('Kein Modell im Modellbild gefunden')
+
+    grey_area = max(contoursGrey, key=cv2.contourArea)
+    return cv2.boundingRect(grey_area)
+
+
+def Skalierung(ModellBild : np.ndarray, length : float, height : float, begrenzung : tuple = None):
+    """Ermittelt die Bauteilbegrenzung im Modellbild und die Bild zu Drawing Skalierung
+
+    Args:
+        ModellBild (np.ndarray) : Modellbild in BGR
+        length (float) : Länge des Bauteils (X-Achse)
+        height (float) : Höhe des Bauteils (Y-Achse)
+        begrenzung (tuple) : Bereits bekannte Bauteilbegrenzung (x, y, breite, hoehe). Bei None aus dem Modellbild ermittelt
+
+    Raises:
+        ValueError wenn im Modellbild kein Modell gefunden wird
+
+    Returns:
+       int, int, int, int, float, float : x, y, Breite und Höhe der Bauteilbegrenzung in Pixeln, scalex, scaley
+    """
+    if begrenzung is None:
+        begrenzung = Begrenzung(cv2.inRange(ModellBild, ErkennungsKontext.lowerGrey, ErkennungsKontext.upperGrey))
+    x, y, breite, hoehe = begrenzung
+
+    scaley = hoehe / height
+    scalex = breite / length
+
+    return x, y, breite, hoehe, scalex, scaley
+
+
+class ErkennungsKontext:
+    """
+    Hält die für einen Erkennungsdurchlauf benötigten Daten: Modell- und Wertebild, Farbmasken
+    und Suchfelder für die Endpunkte und Anschlüsse.
+    Die Bilder werden so nur einmal pro Durchlauf eingelesen.
+    """
     #Farben in BGR not RGB
     #Zugspannungen Orange RGB (255,165,0)
     lowerOrange = np.array([0,164,254], dtype="uint8")
@@ -196,42 +753,100 @@ def SensorErkennung(path : str, scalex : float, scaley : float):
     lowerGrey = np.array([159,159,159], dtype="uint8")
     upperGrey = np.array([161,161,161], dtype="uint8")
 
-    maskOrange = cv2.inRange(image, lowerOrange, upperOrange)
-    maskPurple = cv2.inRange(image, lowerPurple, upperPurple)
-    maskGrey = cv2.inRange(ModellBild, lowerGrey, upperGrey)
+    @IM.Messen
+    def __init__(self, ModellBild : np.ndarray, image : np.ndarray):
+        """
+        Erstellt die Farbmasken und Suchfelder aus den eingelesenen Bildern.
 
-    contoursOrange, _ = cv2.findContours(maskOrange, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    contoursPurple, _ = cv2.findContours(maskPurple, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    contoursGrey, _ = cv2.findContours(maskGrey, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        Args:
+            ModellBild (np.ndarray) : Modellbild in BGR
+            image (np.ndarray) : Bild mit den Werten in BGR
+
+        Returns:
+        """
+        self.ModellBild = ModellBild
+        self.image = image
 
-    if len(contoursGrey) > 0:
-        grey_area = max(contoursGrey, key=cv2.contourArea)
-        x, y, breite, hoehe = cv2.boundingRect(grey_area)
-        cv2.rectangle(image,(x, y),(x+breite, y+hoehe),(255, 0, 0), 2)
+        self.maskOrange = cv2.inRange(image, self.lowerOrange, self.upperOrange)
+        self.maskPurple = cv2.inRange(image, self.lowerPurple, self.upperPurple)
+        self.maskGrey = cv2.inRange(ModellBild, self.lowerGrey, self.upperGrey)
 
-    Sensoren = []
+        #Suchfelder für die Endpunkte (grau) und Anschlüsse (weiß) einmalig berechnen
+        self.greyFeld = FarbFeld(ModellBild, (160,160,160))
+        self.whiteFeld = FarbFeld(ModellBild, (255,255,255))
 
-    for cnt in contoursOrange:
-        if len(cnt) > len(contoursGrey)*0.2:
+        #Faserrichtung je Pixel (Faserfeld.bildfeld). Ist sie gesetzt, folgen die Sensoren der Faserrichtung
+        self.faser = None
 
-            laenge, x1, y1, x2, y2, Anschluss1x, Anschluss1y, Anschluss2x, Anschluss2y = SensorErkennung2(path, cnt, scalex, scaley)
-            if laenge != ValueError:
-                Sensoren.append(('Zug', int(laenge), x1, y1, x2, y2, Anschluss1x, Anschluss1y, Anschluss2x, Anschluss2y))
+    @classmethod
+    def ausOrdner(cls, path : str):
+        """Liest Modell.png und Werte.png aus dem Arbeitsordner ein
 
-    for cnt in contoursPurple:
-        if len(cnt) > len(contoursGrey)*0.2:
-            
-            laenge, x1, y1, x2, y2, Anschluss1x, Anschluss1y, Anschluss2x, Anschluss2y = SensorErkennung2(path, cnt, scalex, scaley)
-            if laenge != ValueError:
-                Sensoren.append(('Druck', int(laenge), x1, y1, x2, y2, Anschluss1x, Anschluss1y, Anschluss2x, Anschluss2y))
+        Args:
+            path (str) : Aktueller Arbeitsordner
 
-    Sensoren = np.array(Sensoren, dtype=object)
-    Sensoren = Sensoren[Sensoren[:, 1].argsort()]
-    return Sensoren
+        Returns:
+           ErkennungsKontext : Kontext für den Erkennungsdurchlauf
+        """
+        return cls(cv2.imread(path + '/Modell.png'), cv2.imread(path + '/Werte.png'))
 
 
+class FarbFeld:
+    """
+    Vorberechnetes Suchfeld für den nächsten Punkt einer Zielfarbe im Bild.
+    Die Distanztransformation wird einmalig pro Bild und Zielfarbe berechnet, jede Abfrage ist danach ein Arrayzugriff.
+    """
+    @IM.Messen
+    def __init__(self, image : np.ndarray, target_color : list):
+        """
+        Berechnet das Suchfeld.
+
+        Args:
+            image (np.ndarray) : Bild
+            target_color (list) : Zielfarbe in BGR. zB [255, 255, 255]
+
+        Returns:
+        """
+        self.height, self.width = image.shape[:2]
+
+        maskTarget = np.all(image[:, :, :3] == np.asarray(target_color, dtype=image.dtype), axis=2)
+        self.leer = not maskTarget.any()
+        if self.leer:
+            return
+
+        # Zielpixel = 0, alle anderen 255. Jedes Zielpixel erhält ein eigenes Label (zeilenweise ab 1)
+        src = np.where(maskTarget, 0, 255).astype(np.uint8)
+        _, labels = cv2.distanceTransformWithLabels(src, cv2.DIST_L2, cv2.DIST_MASK_5, labelType=cv2.DIST_LABEL_PIXEL)
+
+        zielY, zielX = np.nonzero(maskTarget)
+        # Label 0 existiert nicht, daher um eins versetzt
+        self.naechstesX = np.concatenate(([0], zielX)).astype(np.int32)[labels]
+        self.naechstesY = np.concatenate(([0], zielY)).astype(np.int32)[labels]
+
+    @IM.Messen
+    def nearestPoint(self, startX : int, startY : int):
+        """Liefert den nächsten Punkt mit der Zielfarbe zum Startpunkt
+
+        Args:
+            startX (int) : X-Parameter von Startpunkt
+            startY (int) : Y-Parameter von Startpunkt
+
+        Returns:
+           int , int : X-Parameter von Zielpunkt, Y-Parameter von Zielpunkt
+        """
+        if self.leer:
+            return int(startX), int(startY)
+
+        x = min(max(int(startX), 0), self.width - 1)
+        y = min(max(int(startY), 0), self.height - 1)
+
+        return int(self.naechstesX[y, x]), int(self.naechstesY[y, x])
+
+
+@IM.Messen
 def nearestPoint(image : np.ndarray, startX : int, startY : int, target_color : list):
-    """Sucht im Bild vom Startpunkt den nächsten Punkt mit der Zielfarbe
+    """Sucht im Bild vom Startpunkt den nächsten Punkt mit der Zielfarbe.
+    Für mehrere Abfragen im selben Bild sollte ein FarbFeld wiederverwendet werden.
 
     Args:
         image (np.ndarray) : Bild
@@ -242,32 +857,4 @@ def nearestPoint(image : np.ndarray, startX : int, startY : int, target_color :
     Returns:
        int , int : X-Parameter von Zielpunkt, Y-Parameter von Zielpunkt
     """
-    start_color = image[startY,startX]
-    height, width = image.shape[:2]
-    
-    if start_color[0] != target_color[0] and start_color[1] != target_color[1] and start_color[2] != target_color[2]:
-        r = 1
-        winkelGes = list(range(1,361))
-        found = False
-        while r < height/2 or width/2:
-            for winkel in winkelGes:
-                searchX = int(r * np.cos(winkel)+startX)
-                searchY = int(r * np.sin(winkel)+startY)
-
-                test_color = image[searchY,searchX]
-                if test_color[0] == target_color[0] and test_color[1] == target_color[1] and test_color[2] == target_color[2]:
-                    resultX = searchX
-                    resultY = searchY
-                    found = True
-                    break
-
-            if found == True:
-                break
-            else:
-                r += 1
-
-    else:
-        resultX = startX
-        resultY = startY   
-
-    return resultX, resultY
+    return FarbFeld(image, target_color).nearestPoint(startX, startY)
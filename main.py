@@ -7,16 +7,53 @@ Date: 24.05.2023
 Version: 4.1
 """
 import tkinter as tk
-from PIL import Image, ImageDraw, ImageTk
-from tkinter import Tk, Button, Label, Entry, filedialog, Frame, Canvas, Toplevel, colorchooser
+from PIL import Image, ImageTk
+from tkinter import Tk, Button, Label, Entry, filedialog, Frame, Canvas, Toplevel, colorchooser, ttk
 import cv2
 import numpy as np
-import ezdxf
-import time
-import win32com.client
+import queue
+import Bearbeitung as BA
 import Datenaufbereitung as DA
+import DXFExport
+import Elementindex as EI
+import Kontur as KT
 import os
 import Method as M9
+import Instrumentierung as IM
+
+#Reihenfolge, in der die Sensoren im Sensorfenster hinzugefügt werden. Anzeigename zu Schlüssel für Elementindex.NachBewertungSortieren
+Reihenfolgen = {'Integrierte Spannung': 'integral', 'Maximale Spannung': 'maximal', 'Mittlere Spannung': 'mittel', 'Länge': 'laenge'}
+Reihenfolge = 'Integrierte Spannung'
+#Bearbeitungsverläufe von Modell.png und Werte.png, bleiben beim Wechsel zwischen den Bearbeitungsfenstern erhalten
+Verlaeufe = {}
+
+@IM.Messen
+def SensorenSortieren(Sensoren : np.ndarray):
+    """
+    Bewertet die Sensoren anhand der Spannungen entlang ihrer Mittellinie und sortiert sie nach der gewählten Reihenfolge.
+
+    Args:
+        Sensoren (np.ndarray) : Sensoren aus Method.SensorErkennung
+
+    Returns:
+       np.ndarray : Sensoren aufsteigend sortiert, der wichtigste Sensor zuletzt
+    """
+    bewertung = EI.Bewertung(Sensoren, index)
+    return EI.NachBewertungSortieren(Sensoren, bewertung, Reihenfolgen[Reihenfolge])[0]
+
+def VerlaufLaden(name : str):
+    """
+    Bearbeitungsverlauf eines Bildes im Arbeitsordner. Das Bild wird nur beim ersten Aufruf gelesen.
+
+    Args:
+        name (str) : Dateiname des Bildes, zB 'Modell.png'
+
+    Returns:
+       Bearbeitung.Verlauf : Verlauf mit dem bearbeiteten Bild
+    """
+    if name not in Verlaeufe:
+        Verlaeufe[name] = BA.Verlauf(Image.open(path + '/' + name).copy())
+    return Verlaeufe[name]
 
 class LoadingScreen:
     """
@@ -34,7 +71,7 @@ class LoadingScreen:
         self.master = master
         self.master.title("Loading Screen")
 
-        self.lbl_anleitung = Label(self.master, text='Willkommen zur Automatischen Sensorermittlung. \n \n Bitte stellen sie sicher, dass die folgenden Dateien in dem ausgewählten Ordner abliegen: \n \n - …Contour.dxf   (Drawing-exchange der Bauteilkontur) \n - …Splines.dxf   (Drawing-exchange der gewünschten Faserverläufe) \n - …MaxPrincipal.csv   (Export der Zugspannung aus Siemens NX mit Element Koordinaten) \n - …MinPrincipal.csv   (Export der Druckspannungen aus Siemens NX) \n \n Tragen Sie nun die Länge, Höhe und Breite des Bauteils ein. Länge entspricht dabei der X-Achse und Höhe der Y-Achse der Bauteilgrundfläche. Breite ist die zu Extrudierende Höhe. \n \n Drücken sie anschließend auf „Load“.',
+        self.lbl_anleitung = Label(self.master, text='Willkommen zur Automatischen Sensorermittlung. \n \n Bitte stellen sie sicher, dass die folgenden Dateien in dem ausgewählten Ordner abliegen: \n \n - …Contour.dxf   (Drawing-exchange der Bauteilkontur) \n - …Splines.dxf   (Drawing-exchange der gewünschten Faserverläufe) \n - …MaxPrincipal.csv   (Export der Zugspannung aus Siemens NX mit Element Koordinaten) \n - …MinPrincipal.csv   (Export der Druckspannungen aus Siemens NX) \n \n Tragen Sie nun die Länge, Höhe und Breite des Bauteils ein. Länge entspricht dabei der X-Achse und Höhe der Y-Achse der Bauteilgrundfläche. Breite ist die zu Extrudierende Höhe. Bleiben Länge und Höhe leer, werden sie aus der Contour.dxf übernommen. \n \n Drücken sie anschließend auf „Load“.',
                                    wraplength=700,justify= tk.LEFT)
         self.lbl_anleitung.grid(row=0, column=0, columnspan=6, padx=10, pady=10)
 
@@ -76,6 +113,7 @@ class LoadingScreen:
         path = filedialog.askdirectory()
         self.selected_folder.set(path)
 
+    @IM.Messen
     def load_data(self):
         """
         Funktionen des 'Load' Button.
@@ -86,18 +124,19 @@ class LoadingScreen:
 
         global path
         path = self.selected_folder.get()
-        length = int(self.entry_length.get())
-        height = int(self.entry_height.get())
+        # Länge und Höhe sind optional, ohne Angabe werden sie aus der Contour.dxf bestimmt
+        length = float(self.entry_length.get()) if self.entry_length.get().strip() else None
+        height = float(self.entry_height.get()) if self.entry_height.get().strip() else None
         global width
         width = int(self.entry_width.get())
 
-        if not path or not length or not height or not width:
+        if not path or (length is None) != (height is None) or not width:
             # Highlight empty fields in red
             if not path:
                 self.entry_folder.config(bg="red")
-            if not length:
+            if length is None and height is not None:
                 self.entry_length.config(bg="red")
-            if not height:
+            if height is None and length is not None:
                 self.entry_height.config(bg="red")
             if not width:
                 self.entry_width.config(bg="red")
@@ -113,22 +152,9 @@ class LoadingScreen:
             print("Width:", width)
             
             global nameContourdxf
-            nameContourdxf = ''
             global nameSplinesdxf
-            nameSplinesdxf = ''
-            MinPrincipal = ''
-            MaxPrincipal = ''
-
-            for file_name in os.listdir(path):
-                if file_name.endswith('Splines.dxf'):
-                    nameSplinesdxf = os.path.join(path, file_name)
-                if file_name.endswith('Contour.dxf'):
-                    nameContourdxf = os.path.join(path, file_name)
-                if file_name.endswith('MinPrincipal.csv'):
-                    MinPrincipal = os.path.join(path, file_name)
-                if file_name.endswith('MaxPrincipal.csv'):
-                    MaxPrincipal = os.path.join(path, file_name)
-        
+            nameContourdxf, nameSplinesdxf, MinPrincipal, MaxPrincipal = DA.DateienSuchen(path)
+
             dateicheck = any([nameContourdxf == '', nameSplinesdxf == '',
                         MinPrincipal == '', MaxPrincipal == ''])
             
@@ -136,64 +162,51 @@ class LoadingScreen:
                 tk.messagebox.showerror('Error', 'Make sure all data is in the selected folder') 
             else:    
      
-                WerteBildvorhanden, ModellBildvorhanden = False, False
-                for file_name in os.listdir(path):
-                    if file_name.endswith('Werte.png'):
-                        WerteBildvorhanden = True
-                    if file_name.endswith('Modell.png'):
-                        ModellBildvorhanden = True
-                
-                if WerteBildvorhanden == False or ModellBildvorhanden == False:
-
-                    DA.Aufbereitung(MinPrincipal, MaxPrincipal, path)
-
-
-                ModellBild = cv2.imread(path +'/Modell.png')
-                image = cv2.imread(path +'/Werte.png')
-                cv2.imwrite(path + '/Werte_unedited.png', image)
-                cv2.imwrite(path + '/Modell_unedited.png', ModellBild)
-
-                lowerGrey = np.array([159,159,159], dtype="uint8") #Grey RGB (160,160,160)
-                upperGrey = np.array([161,161,161], dtype="uint8")
-                maskGrey = cv2.inRange(ModellBild, lowerGrey, upperGrey)
-                contoursGrey, hierarchy = cv2.findContours(maskGrey, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-
-                if len(contoursGrey) > 0:
-                    grey_area = max(contoursGrey, key=cv2.contourArea)
-                    global x 
-                    global y
-                    x, y, breite, hoehe = cv2.boundingRect(grey_area)
-                    cv2.rectangle(image,(x, y),(x+breite, y+hoehe),(255, 0, 0), 2)
-
+                ModellBild, image, begrenzung = DA.AufbereitungZwischengespeichert(MinPrincipal, MaxPrincipal, path)
+                Verlaeufe.clear()
+                kontext = M9.ErkennungsKontext(ModellBild, image.copy())
+                global index
+                index = EI.ElementIndex.ausDateien(MinPrincipal, MaxPrincipal)
+
+                global x 
+                global y
                 global scaley
-                scaley = hoehe / height
                 global scalex
-                scalex = breite / length
                 global xC
-                xC = x
                 global yC
-                yC = y + hoehe
+                if length is None:
+                    # Abmessungen und Skalierung aus der Vektorkontur
+                    kontur = KT.Kontur.ausDatei(nameContourdxf)
+                    print('Length:', kontur.laenge, 'Height:', kontur.hoehe, '(Contour.dxf)')
+                    x, yC, scalex, scaley = KT.Transformation(kontur, ModellBild, index.grenzen, begrenzung)
+                    xMin, xMax, yMin, yMax = kontur.grenzen
+                    (x0, y0), (x1, y1) = np.rint(DXFExport.Bildkoordinaten([(xMin, yMax), (xMax, yMin)], (x, yC, scalex, scaley))).astype(int)
+                    y = y0
+                    cv2.rectangle(image,(x0, y0),(x1, y1),(255, 0, 0), 2)
+                else:
+                    x, y, breite, hoehe, scalex, scaley = M9.Skalierung(ModellBild, length, height, begrenzung)
+                    cv2.rectangle(image,(x, y),(x+breite, y+hoehe),(255, 0, 0), 2)
+                    yC = y + hoehe
+                xC = x
 
                 print('ScaleX', scalex)
                 print('ScaleY', scaley)
 
                 self.master.withdraw()
                 global Sensoren
-                Sensoren = M9.SensorErkennung(path, scalex, scaley)
+                # Die Erkennung bleibt für die Bearbeitungsfenster erhalten und wird dort nach jeder Änderung nachgeführt
+                global Erkennung
+                Erkennung = M9.InkrementelleErkennung(kontext, scalex, scaley)
+                Sensoren = SensorenSortieren(Erkennung.sensoren())
                 print(Sensoren)
                 
                 global Anzahl
                 Anzahl = 1
                 MaxAnzahl = len(Sensoren)
 
-                image = M9.SensorMalen(image, Sensoren[-Anzahl,2], Sensoren[-Anzahl,3], Sensoren[-Anzahl,4], Sensoren[-Anzahl,5], Sensoren[-Anzahl,6], \
-                                        Sensoren[-Anzahl,7], Sensoren[-Anzahl,8], Sensoren[-Anzahl,9])
-
-                cv2.imwrite(path + '/Sensor1.png', image)
-
                 global ToplevelMaster
                 ToplevelMaster = Toplevel(self.master)
-                SensorenAuswählen(ToplevelMaster, MaxAnzahl)
+                SensorenAuswählen(ToplevelMaster, MaxAnzahl, image)
 
     def close_window(self):
         """
@@ -202,58 +215,18 @@ class LoadingScreen:
         self.master.destroy()
 
     
-def SensorMalenDXF(msp, x1 : int, y1 : int, x2 : int, y2 : int, Anschluss1x : int, Anschluss1y : int, Anschluss2x : int, Anschluss2y : int):
-    """Zeichnet den Sensor in die auszugebende .dxf
-
-    Args:
-        msp : DXF-Modelspace in dem der Sensor platziert werden soll
-        x1 (int) : X-Parameter von Sensorpunkt 1
-        y1 (int) : Y-Parameter von Sensorpunkt 1
-        x2 (int) : X-Parameter von Sensorpunkt 2
-        y2 (int) : Y-Parameter von Sensorpunkt 2
-        Anschluss1x (int) : X-Parameter von Anschluss 1
-        Anschluss1y (int) : Y-Parameter von Anschluss 1
-        Anschluss2x (int) : X-Parameter von Anschluss 2
-        Anschluss2y (int) : Y-Parameter von Anschluss 2
-
-    Returns:
-    """
-    #Sensor an sich
-    y1dxf = (yC - y1) / scaley
-    y2dxf = (yC - y2) / scaley
-    x1dxf = (x1 - x) / scalex
-    x2dxf = (x2 - x) / scalex
-
-    msp.add_line((x1dxf, y1dxf), (x2dxf, y2dxf), dxfattribs={'layer': 'Sensor', "color": 1})
-
-    #AnschlussStelle 1
-    y1dxf = (yC - y1) / scaley
-    y2dxf = (yC - Anschluss1y) / scaley
-    x1dxf = (x1 - x) / scalex
-    x2dxf = (Anschluss1x - x) / scalex
-
-    msp.add_line((x1dxf, y1dxf), (x2dxf, y2dxf), dxfattribs={'layer': 'Sensor', "color": 1})
-
-    #AnschlussStelle 2
-    y1dxf = (yC - Anschluss2y) / scaley
-    y2dxf = (yC - y2) / scaley
-    x1dxf = (Anschluss2x - x) / scalex
-    x2dxf = (x2 - x) / scalex
-
-    msp.add_line((x1dxf, y1dxf), (x2dxf, y2dxf), dxfattribs={'layer': 'Sensor', "color": 1})
-
-
 class SensorenAuswählen:
     """
     Definiert das Fenster zur Auswahl der Sensoren.
     """
-    def __init__(self, master, MaxAnzahl :int):
+    def __init__(self, master, MaxAnzahl :int, image : np.ndarray):
         """
         GUI Aufbau des Sensorfensters.
         
         Args:
             master : Tkinter Master
             MaxAnzahl (int) : Maximale Anzahl an möglichen Sensoren
+            image (np.ndarray) : Bild mit den Werten in BGR, ohne Sensoren
 
         Returns:
         """
@@ -261,10 +234,15 @@ class SensorenAuswählen:
         self.master = master
         self.master.title('Sensoren')
 
+        # Die Sensoren werden einzeln in das Bild gezeichnet. Für jeden Sensor wird der überdeckte Bildausschnitt
+        # vorher gesichert, damit er beim Entfernen ohne Neuzeichnen wiederhergestellt werden kann
+        self.bild = image.copy()
+        self.ebenen = []
+        while len(self.ebenen) < Anzahl:
+            self.SensorZeichnen(len(self.ebenen) + 1)
+
         # Load and display the image
-        image_path = path + '/Sensor1.png'
-        self.image = Image.open(image_path)
-        self.image_tk = ImageTk.PhotoImage(self.image)
+        self.image_tk = ImageTk.PhotoImage(Image.fromarray(self.bild[:, :, ::-1]))
         self.image_label = Label(self.master, image=self.image_tk)
         self.image_label.pack()
 
@@ -282,24 +260,68 @@ class SensorenAuswählen:
         self.sensor_label.grid(row= 1, column=0, sticky=tk.W+tk.E)
         self.remove_button = Button(self.btn_frame, text='-', command= self.handle_remove_button)
         self.remove_button.grid(row= 2, column=0, sticky=tk.W+tk.E)
+        # Reihenfolge, in der die Sensoren hinzugefügt und exportiert werden
+        self.reihenfolge = ttk.Combobox(self.btn_frame, values=list(Reihenfolgen), state='readonly')
+        self.reihenfolge.set(Reihenfolge)
+        self.reihenfolge.bind('<<ComboboxSelected>>', self.ReihenfolgeAendern)
+        self.reihenfolge.grid(row= 3, column=0, sticky=tk.W+tk.E)
 
         # Buttons for editing and exporting
         self.edit_button = Button(self.btn_frame, text='Edit', command=self.Edit)
         self.edit_button.grid(row= 0, column=1, sticky=tk.W+tk.E)
         self.export_button = Button(self.btn_frame, text='Export', command=self.Export)
         self.export_button.grid(row= 1, column=1, sticky=tk.W+tk.E)
+        # Fortschritt des Exports, wird erst beim Export angezeigt
+        self.export_progress = ttk.Progressbar(self.btn_frame, mode='determinate', maximum=1.0)
+        self.export_label = Label(self.btn_frame, text='')
 
-        self.AnleitungSensoren = Label(self.btn_frame, text='Anleitung zur Auswahl der Sensoren: \n \n Zugspannungen dargestellt in Orange.             Druckspannungen dargestellt in Lila. \n Die geplanten Sensoren sind in Schwarz dargestellt. \n Sollten die Spannungen oder das Modell nicht korrekt dargestellt sein, überprüfen Sie bitte die Daten und laden Sie diese erneut ein. \n \n Über die „+“ und „-“ Schaltflächen können Sensoren hinzugefügt oder entfernt werden. \n \n Mit Klick auf „Export“ werden die dargestellten Sensoren als .dxf exportiert und in NanoCAD geöffnet. \n \n Um die Modellkontur zur bearbeiten oder gesonderte Sensoren hinzuzufügen öffnen Sie bitte den Bearbeitungsmodus mit Klick auf „Edit“',
+        self.AnleitungSensoren = Label(self.btn_frame, text='Anleitung zur Auswahl der Sensoren: \n \n Zugspannungen dargestellt in Orange.             Druckspannungen dargestellt in Lila. \n Die geplanten Sensoren sind in Schwarz dargestellt. \n Sollten die Spannungen oder das Modell nicht korrekt dargestellt sein, überprüfen Sie bitte die Daten und laden Sie diese erneut ein. \n \n Über die „+“ und „-“ Schaltflächen können Sensoren hinzugefügt oder entfernt werden. Die Auswahlliste darunter legt die Reihenfolge fest: nach der über die Sensorlänge integrierten, der maximalen oder der mittleren Spannung entlang des Sensors oder nach der Länge. \n \n Mit Klick auf „Export“ werden die dargestellten Sensoren als .dxf exportiert und in NanoCAD geöffnet. \n \n Um die Modellkontur zur bearbeiten oder gesonderte Sensoren hinzuzufügen öffnen Sie bitte den Bearbeitungsmodus mit Klick auf „Edit“',
                            wraplength=1000, justify= tk.LEFT)
         self.AnleitungSensoren.grid(row= 0, column=2, rowspan=3, sticky=tk.W+tk.E)
         #self.text1.insert(END, 'Lorem ipsum dolor sit amet, consetetur sadipscing elitr, sed diam nonumy eirmod tempor invidunt ut labore et dolore magna aliquyam erat, sed diam voluptua. At vero eos et accusam et justo duo dolores et ea rebum. Stet clita kasd gubergren, no sea takimata sanctus est Lorem ipsum dolor sit amet. Lorem ipsum dolor sit amet, consetetur sadipscing elitr, sed diam nonumy eirmod tempor invidunt ut labore et dolore magna aliquyam erat, sed diam voluptua. At vero eos et accusam et justo duo dolores et ea rebum. Stet clita kasd gubergren, no sea takimata sanctus est Lorem ipsum dolor sit amet.')
 
         self.master.protocol("WM_DELETE_WINDOW", self.close_window)
 
+    @IM.Messen
+    def SensorZeichnen(self, AnzahlN : int):
+        """
+        Zeichnet den Sensor an Position -AnzahlN ins Bild und sichert vorher den überdeckten Bildausschnitt.
+
+        Args:
+            AnzahlN (int) : Nummer des Sensors in der gewählten Reihenfolge, beginnend beim wichtigsten
+
+        Returns:
+        """
+        sensor = Sensoren[[-AnzahlN]]
+        punkte = sensor['punkte'][0]
+        hoehe, breite = self.bild.shape[:2]
+        # Linienbreite 2 ragt um einen Pixel über die Punkte hinaus
+        x0, x1 = max(punkte[:, 0].min() - 2, 0), min(punkte[:, 0].max() + 3, breite)
+        y0, y1 = max(punkte[:, 1].min() - 2, 0), min(punkte[:, 1].max() + 3, hoehe)
+
+        self.ebenen.append((y0, y1, x0, x1, self.bild[y0:y1, x0:x1].copy()))
+        M9.SensorenMalen(self.bild, sensor)
+
+    def SensorEntfernen(self):
+        """
+        Entfernt den zuletzt gezeichneten Sensor durch Wiederherstellen des gesicherten Bildausschnitts.
+        """
+        y0, y1, x0, x1, ausschnitt = self.ebenen.pop()
+        self.bild[y0:y1, x0:x1] = ausschnitt
+
+    @IM.Messen
+    def BildAktualisieren(self):
+        """
+        Zeigt das aktuelle Bild im Fenster an.
+        """
+        self.image_tk = ImageTk.PhotoImage(Image.fromarray(self.bild[:, :, ::-1]))
+        self.image_label.configure(image=self.image_tk)
+
+    @IM.Messen
     def handle_add_button(self, MaxAnzahl : int):
         """
         Funktion des Buttons zum hinzufügen eines Sensors.
-        Aufrufen der Funktion, die den Sensor ins Bild zeichnet. Aktualisierung des Bildes.
+        Zeichnen des nächsten Sensors ins Bild. Aktualisierung des Bildes.
         
         Args:
             MaxAnzahl (int) : Maximale Anzahl an möglichen Sensoren
@@ -307,46 +329,44 @@ class SensorenAuswählen:
         Returns:
         """
         global Anzahl
-        Anzahl += 1
-        if Anzahl > MaxAnzahl:
-            Anzahl -= 1
+        if Anzahl >= MaxAnzahl:
             print('Maximale Sensoranzahl=', MaxAnzahl)
+            return
 
-        image = cv2.imread(path +'/Werte.png')
-        AnzahlN = 1
-        while AnzahlN <= Anzahl:
-            image = M9.SensorMalen(image, Sensoren[-AnzahlN, 2], Sensoren[-AnzahlN, 3], Sensoren[-AnzahlN, 4], Sensoren[-AnzahlN, 5], Sensoren[-AnzahlN, 6], \
-                            Sensoren[-AnzahlN, 7], Sensoren[-AnzahlN, 8], Sensoren[-AnzahlN, 9])
-            AnzahlN += 1
-
-        cv2.imwrite(path + '/crop_img.png', image)
-        self.image = Image.open(path + '/crop_img.png')
-        self.image_tk = ImageTk.PhotoImage(self.image)
-        self.image_label.configure(image=self.image_tk)
+        Anzahl += 1
+        self.SensorZeichnen(Anzahl)
+        self.BildAktualisieren()
 
+    @IM.Messen
     def handle_remove_button(self):
         """
         Funktion des Buttons zum entfernen eines Sensors.
-        Aufrufen der Funktion, die den Sensor ins Bild zeichnet. Aktualisierung des Bildes.
+        Wiederherstellen des Bildes ohne den zuletzt hinzugefügten Sensor. Aktualisierung des Bildes.
         """
         global Anzahl
-        Anzahl -= 1
-        if Anzahl < 1:
-            Anzahl += 1
+        if Anzahl <= 1:
             print('Nicht weniger als 1 Sensor einbauen!')
+            return
 
-        image = cv2.imread(path + '/Werte.png')
-        AnzahlN = 1
-        while AnzahlN <= Anzahl:
-            image = M9.SensorMalen(image, Sensoren[-AnzahlN, 2], Sensoren[-AnzahlN, 3], Sensoren[-AnzahlN, 4], Sensoren[-AnzahlN, 5], Sensoren[-AnzahlN, 6], \
-                            Sensoren[-AnzahlN, 7], Sensoren[-AnzahlN, 8], Sensoren[-AnzahlN, 9])
-            AnzahlN += 1
+        Anzahl -= 1
+        self.SensorEntfernen()
+        self.BildAktualisieren()
 
+    @IM.Messen
+    def ReihenfolgeAendern(self, event=None):
+        """
+        Sortiert die Sensoren nach der gewählten Reihenfolge und zeichnet die ersten Anzahl Sensoren neu.
+        """
+        global Reihenfolge
+        global Sensoren
+        Reihenfolge = self.reihenfolge.get()
+        Sensoren = SensorenSortieren(Sensoren)
 
-        cv2.imwrite(path + '/crop_img.png', image)
-        self.image = Image.open(path + '/crop_img.png')
-        self.image_tk = ImageTk.PhotoImage(self.image)
-        self.image_label.configure(image=self.image_tk)
+        while self.ebenen:
+            self.SensorEntfernen()
+        while len(self.ebenen) < Anzahl:
+            self.SensorZeichnen(len(self.ebenen) + 1)
+        self.BildAktualisieren()
 
     def Edit(self):
         """
@@ -358,59 +378,67 @@ class SensorenAuswählen:
         PaintModellGUI(paintGui)
 
 
+    @IM.Messen
     def Export(self):
         """
         Funktion des Buttons zur exportierung der Sensoren.
         Erstellen mehrerer Schichten (Modellschicht, Modellschicht mit Faser, Sensorschicht)
-        Speichern als DXF-File. Öffnen dieses DXF-Files in NanoCAD
+        Speichern als DXF-File im Hintergrund, das Fenster bleibt währenddessen bedienbar.
         """
         global Sensoren
 
-        NewNamedxf = nameContourdxf[:-11] + '_Sensors.dxf'
-
-        doc = ezdxf.new('R2010')
-        Contourdxf = ezdxf.readfile(nameContourdxf)
-        Splinesdxf = ezdxf.readfile(nameSplinesdxf)
-
-        # Create Start and finish Layer
-        for entity in Contourdxf.modelspace():
-            entity_copy = entity.copy()
-            entity_copy.dxf.layer = 'OnlyContour'
-            entity_copy.dxf.color = 7
-            doc.modelspace().add_entity(entity_copy)
-
-        # Contour + Fiber
-        for entity in Splinesdxf.modelspace():
-            entity_copy = entity.copy()
-            entity_copy.dxf.layer = 'ContourAndFiber'
-            entity_copy.dxf.color = 3
-            doc.modelspace().add_entity(entity_copy)       
-        for entity in Contourdxf.modelspace():
-            entity_copy = entity.copy()
-            entity_copy.dxf.layer = 'ContourAndFiber'
-            entity_copy.dxf.color = 7
-            doc.modelspace().add_entity(entity_copy)
-
-        #Sensor Schicht
-        for entity in Contourdxf.modelspace():
-            entity_copy = entity.copy()
-            entity_copy.dxf.layer = 'Sensor'
-            entity_copy.dxf.color = 7
-            doc.modelspace().add_entity(entity_copy)
-        AnzahlN = 1
-        while AnzahlN <= Anzahl:
-            SensorMalenDXF(doc.modelspace(), Sensoren[-AnzahlN,2], Sensoren[-AnzahlN,3], Sensoren[-AnzahlN,4], Sensoren[-AnzahlN,5], Sensoren[-AnzahlN,6], \
-                            Sensoren[-AnzahlN,7], Sensoren[-AnzahlN,8], Sensoren[-AnzahlN,9])
-            AnzahlN += 1
-
-        doc.saveas(NewNamedxf)
-
-        time.sleep(2)
+        self.export_button.configure(state=tk.DISABLED)
+        self.export_progress['value'] = 0
+        self.export_progress.grid(row= 2, column=1, sticky=tk.W+tk.E)
+        self.export_label.grid(row= 3, column=1, sticky=tk.W+tk.E)
+
+        # Tkinter darf nur aus dem Hauptthread verwendet werden. Der Exportthread meldet den Fortschritt über die
+        # Queue, das Fenster fragt diese und den Abschluss regelmäßig ab
+        self.export_meldungen = queue.Queue()
+        self.export_future = DXFExport.ExportImHintergrund(nameContourdxf, nameSplinesdxf, Sensoren, Anzahl, (x, yC, scalex, scaley),
+                                                           fortschritt=lambda anteil, text: self.export_meldungen.put((anteil, text)))
+        self.master.after(50, self.ExportPruefen)
+
+    def ExportPruefen(self):
+        """
+        Aktualisiert die Fortschrittsanzeige und ruft nach Abschluss des Exports ExportFertig auf.
+        """
+        while not self.export_meldungen.empty():
+            anteil, text = self.export_meldungen.get()
+            self.export_progress['value'] = anteil
+            self.export_label.configure(text=text)
+
+        if not self.export_future.done():
+            self.master.after(50, self.ExportPruefen)
+            return
+
+        self.ExportFertig(self.export_future)
+
+    @IM.Messen
+    def ExportFertig(self, future):
+        """
+        Abschluss des Exports. Die geprüfte DXF-Datei wird in NanoCAD geöffnet.
+        Bei einem Fehler bleibt das Fenster offen und der Export kann wiederholt werden.
+
+        Args:
+            future (concurrent.futures.Future) : Abgeschlossener Export
+
+        Returns:
+        """
+        try:
+            NewNamedxf = future.result()
+        except Exception as e:
+            print('Export fehlgeschlagen:', e)
+            self.export_label.configure(text='Export fehlgeschlagen: {}'.format(e))
+            self.export_button.configure(state=tk.NORMAL)
+            return
+
         self.master.withdraw()
         print('Erfolg')
 
         # Erstelle eine neue Instanz von NanoCAD
         try: 
+            import win32com.client
             nano_app = win32com.client.Dispatch("nanocad.application")
         except:
             print('NanoCAD not found.')
@@ -444,8 +472,9 @@ class PaintModellGUI():
         """
         self.master = master
 
-        self.image = Image.open(path + '/Modell.png')
-        self.img = ImageTk.PhotoImage(file=path + '/Modell.png')
+        self.verlauf = VerlaufLaden('Modell.png')
+        self.image = self.verlauf.image
+        self.img = ImageTk.PhotoImage(self.image)
         self.img_clear = Image.open(path + '/Modell_unedited.png')
 
         self.master.title('Edit Modell')
@@ -457,12 +486,16 @@ class PaintModellGUI():
         WIDTH, HEIGHT = self.image.size
         self.cnv = Canvas(self.master, width=WIDTH, height=HEIGHT, bg='white')
         self.cnv.pack()
+        self.cnv.bind('<ButtonPress-1>', self.strich_anfang)
         self.cnv.bind('<B1-Motion>', self.paint)
+        self.cnv.bind('<ButtonRelease-1>', self.strich_ende)
+        self.master.bind('<Control-z>', lambda event: self.undo())
+        self.master.bind('<Control-y>', lambda event: self.redo())
 
 
         self.cnv.create_image(0,0, anchor=tk.NW, image = self.img)
 
-        self.draw = ImageDraw.Draw(self.image)
+        self.pinsel = BA.Pinsel(self.verlauf)
 
         self.btn_frame = Frame(self.master)
         self.btn_frame.pack(fill=tk.X)
@@ -489,10 +522,17 @@ class PaintModellGUI():
         self.color_btn = Button(self.btn_frame, text='Change Color', command=self.change_color)
         self.color_btn.grid(row= 2, column=0, sticky=tk.W+tk.E)
 
-        self.AnleitungEditModell = Label(self.btn_frame, text='Anleitung zur Bearbeitung des Modells: \n \n Über „B+“ und „B-“ kann die Pinselstärke verändert werden. \n Mit Klick auf „Change Color“ kann die Farbe des Pinsels angepasst werden. \n „Clear“ setzt das Bild auf Ursprungszustand zurück. \n Klick auf „Spannungen“ bringt Sie zum Bearbeitungsmodus für die Spannungen \n Über „Save“ werden die Änderungen gespeichert und Sie gelangen zurück zur Auswahl der Sensoren \n \n Zur Bearbeitung des Modells bitte die Farbe Grau RGB (160, 160, 160) oder Weiß RGB (255, 255, 255) über „Change Color“ auswählen. \n Mit der Farbe Rot RGB (255, 0, 0) können Bereiche markiert werden, an denen keine Sensoranschlussstelle gesetzt werden soll. \n \n Tipp: Der Bearbeitungsmodus für das Modell ist optimal um kleine Lücken im Modell zu schließen.',
+        self.undo_btn = Button(self.btn_frame, text='Undo', command=self.undo)
+        self.undo_btn.grid(row= 3, column=0, sticky=tk.W+tk.E)
+
+        self.redo_btn = Button(self.btn_frame, text='Redo', command=self.redo)
+        self.redo_btn.grid(row= 3, column=1, sticky=tk.W+tk.E)
+
+        self.AnleitungEditModell = Label(self.btn_frame, text='Anleitung zur Bearbeitung des Modells: \n \n Über „B+“ und „B-“ kann die Pinselstärke verändert werden. \n Mit Klick auf „Change Color“ kann die Farbe des Pinsels angepasst werden. \n „Clear“ setzt das Bild auf Ursprungszustand zurück. \n „Undo“ (Strg+Z) und „Redo“ (Strg+Y) machen die letzten Striche rückgängig bzw. stellen sie wieder her. \n Die vorgeschlagenen Sensoren werden nach jedem Strich in Schwarz aktualisiert. \n Klick auf „Spannungen“ bringt Sie zum Bearbeitungsmodus für die Spannungen \n Über „Save“ werden die Änderungen gespeichert und Sie gelangen zurück zur Auswahl der Sensoren \n \n Zur Bearbeitung des Modells bitte die Farbe Grau RGB (160, 160, 160) oder Weiß RGB (255, 255, 255) über „Change Color“ auswählen. \n Mit der Farbe Rot RGB (255, 0, 0) können Bereiche markiert werden, an denen keine Sensoranschlussstelle gesetzt werden soll. \n \n Tipp: Der Bearbeitungsmodus für das Modell ist optimal um kleine Lücken im Modell zu schließen.',
                            wraplength=1000, justify= tk.LEFT)
-        self.AnleitungEditModell.grid(row= 0, column=2, rowspan=3, sticky=tk.W+tk.E)
+        self.AnleitungEditModell.grid(row= 0, column=2, rowspan=4, sticky=tk.W+tk.E)
 
+        self.vorschlaege_zeigen()
         self.master.protocol('WM_DELETE_WINDOW', self.on_closing)
 
     def spannungen(self):
@@ -500,38 +540,117 @@ class PaintModellGUI():
         Funktion des Buttons zum wechseln des Bearbeitungsmodus zum bearbeiten der Spannungen.
         Aufrufen des Paint-Clones zur Bearbeitung der Spannungen.
         """
-        self.image.save(path + '/Modell.png')
+        self.verlauf.speichern(path + '/Modell.png')
         testmaster = Toplevel(self.master)
         self.master.withdraw()
         PaintWerteGUI(testmaster)
 
+    def strich_anfang(self, event):
+        """
+        Funktion beim Drücken der Maus: Beginn eines Strichs. Der Strich wird auf der Zeichenfläche als ein Linienzug dargestellt.
+
+        Args:
+            event : Mausposition im Bild
+
+        Returns:
+        """
+        # Die Pinselbreite entspricht der bisherigen Darstellung, Rechteck mit Rand der Breite brush_width
+        self.pinsel.ansetzen(event.x, event.y, self.brush_width + 2, self.current_color)
+        self.linienpunkte = [event.x, event.y, event.x, event.y]
+        self.linie = self.cnv.create_line(*self.linienpunkte, fill=self.current_color, width=self.brush_width + 2,
+                                          capstyle=tk.PROJECTING, joinstyle=tk.MITER, tags='strich')
+
+    @IM.Messen
     def paint(self, event):
         """
-        Funktion zum malen bei Mausklick
+        Funktion zum malen bei Mausklick. Verlängert den Linienzug des Strichs bis zur Mausposition.
 
         Args:
             event : Mausposition im Bild
 
         Returns:
         """
-        x1, y1 = (event.x - 1), (event.y - 1)
-        x2, y2 = (event.x + 1), (event.y + 1)
-        self.cnv.create_rectangle(x1, y1, x2, y2, outline=self.current_color, fill= self.current_color, width=self.brush_width)
-        self.draw.rectangle([x1, y1, x2 + self.brush_width, y2 + self.brush_width], outline=self.current_color, fill= self.current_color, width=self.brush_width)
+        if self.pinsel.ziehen(event.x, event.y):
+            # Der Abschnitt ist im Bild, ein neuer Linienzug beginnt am letzten Punkt
+            self.linienpunkte = self.linienpunkte[-2:]
+            self.linie = self.cnv.create_line(*self.linienpunkte, event.x, event.y, fill=self.current_color, width=self.brush_width + 2,
+                                              capstyle=tk.PROJECTING, joinstyle=tk.MITER, tags='strich')
+        self.linienpunkte += [event.x, event.y]
+        self.cnv.coords(self.linie, *self.linienpunkte)
+
+    def strich_ende(self, event):
+        """
+        Funktion beim Loslassen der Maus: Der Strich wird ins Bild übertragen und als ein Schritt im Verlauf abgelegt.
+
+        Args:
+            event : Mausposition im Bild
+
+        Returns:
+        """
+        self.anzeigen(self.pinsel.absetzen())
+
+    @IM.Messen
+    def anzeigen(self, bereiche : list):
+        """
+        Ersetzt die Striche auf der Zeichenfläche durch das aktuelle Bild und aktualisiert danach die Sensorvorschläge.
+
+        Args:
+            bereiche (list) : Geänderte Bereiche (x0, y0, x1, y1) aus dem Verlauf, bei None bleibt die Anzeige unverändert
+
+        Returns:
+        """
+        if bereiche is None:
+            return
+        self.cnv.delete('strich')
+        self.img.paste(self.image)
+        # Erst nach dem Neuzeichnen, damit das Bild ohne Verzögerung erscheint
+        self.master.after_idle(lambda: self.erkennen(bereiche))
+
+    @IM.Messen
+    def erkennen(self, bereiche : list):
+        """
+        Übergibt die geänderten Bereiche an die Erkennung, die nur die betroffenen Spannungskonturen neu auswertet.
+
+        Args:
+            bereiche (list) : Geänderte Bereiche (x0, y0, x1, y1)
+
+        Returns:
+        """
+        ausschnitte = [np.asarray(self.image.crop(bereich).convert('RGB'))[:, :, ::-1] for bereich in bereiche]
+        Erkennung.aktualisieren(bereiche, ModellAusschnitte=ausschnitte)
+        self.vorschlaege_zeigen()
+
+    def vorschlaege_zeigen(self):
+        """
+        Zeichnet die aktuellen Sensorvorschläge auf die Zeichenfläche. Sie sind nicht Teil des Bildes.
+        """
+        self.cnv.delete('vorschlag')
+        for punkte in Erkennung.sensoren()['punkte']:
+            self.cnv.create_line(*punkte.ravel().tolist(), fill='black', width=2, tags='vorschlag')
+
+    def undo(self):
+        """
+        Funktion des 'Undo'-Button: Letzten Strich rückgängig machen.
+        """
+        self.anzeigen(self.verlauf.rueckgaengig())
+
+    def redo(self):
+        """
+        Funktion des 'Redo'-Button: Zuletzt rückgängig gemachten Strich wiederherstellen.
+        """
+        self.anzeigen(self.verlauf.wiederholen())
 
     def clear(self):
         """
-        Funktion des 'Clear'-Button: Zurücksetzen des Bildes auf Ausgangszustand.
+        Funktion des 'Clear'-Button: Zurücksetzen des Bildes auf Ausgangszustand. Kann rückgängig gemacht werden.
         """
-        self.cnv.delete('all')
-        self.draw.rectangle([0,0,10000,10000], fill='white')
-        self.cnv.create_image(0,0, anchor=tk.NW, image=self.img_clear)
+        self.anzeigen(self.verlauf.zuruecksetzen(self.img_clear))
         
     def save(self):
         """
         Funktion des 'Save'-Button: Speichern des Modellbildes.
         """
-        self.image.save(path + '/Modell.png')
+        self.verlauf.speichern(path + '/Modell.png')
         self.on_closing()
 
     def brush_plus(self):
@@ -554,25 +673,28 @@ class PaintModellGUI():
         """
         _, self.current_color = colorchooser.askcolor(title = 'Choose A Color')
 
+    @IM.Messen
     def on_closing(self):
         """
         Funktion zum schließen des Fensters. Speichern des aktuellen Standes und öffnen des Auswahlmodus für die Sensoren.
         """
         self.master.withdraw()
-        image = cv2.imread(path +'/Werte.png')
+        # Die Sensoren entstehen aus den bearbeiteten Bildern, daher auch ohne 'Save' beide Bilder speichern, damit
+        # Modell.png und Werte.png zum Export passen
+        for name, verlauf in Verlaeufe.items():
+            verlauf.speichern(path + '/' + name)
+        # Die Erkennung ist bereits auf dem Stand der Bearbeitung, die Bilder müssen nicht erneut gelesen werden
+        image = Erkennung.kontext.image.copy()
         global Sensoren
-        Sensoren = M9.SensorErkennung(path, scalex, scaley)
+        Sensoren = SensorenSortieren(Erkennung.sensoren())
         print(Sensoren)
                 
+        global Anzahl
         Anzahl = 1
         MaxAnzahl = len(Sensoren)
 
-        image = M9.SensorMalen(image, Sensoren[-Anzahl,2], Sensoren[-Anzahl,3], Sensoren[-Anzahl,4], Sensoren[-Anzahl,5], Sensoren[-Anzahl,6], \
-                                Sensoren[-Anzahl,7], Sensoren[-Anzahl,8], Sensoren[-Anzahl,9])
-        
-        cv2.imwrite(path + '/Sensor1.png', image)
         testmaster = Toplevel(self.master)
-        SensorenAuswählen(testmaster, MaxAnzahl)
+        SensorenAuswählen(testmaster, MaxAnzahl, image)
 
 
 class PaintWerteGUI():
@@ -590,8 +712,9 @@ class PaintWerteGUI():
         Returns:
         """
         self.master = master
-        self.image = Image.open(path + '/Werte.png')
-        self.img = ImageTk.PhotoImage(file=path + '/Werte.png')
+        self.verlauf = VerlaufLaden('Werte.png')
+        self.image = self.verlauf.image
+        self.img = ImageTk.PhotoImage(self.image)
         self.img_clear = Image.open(path + '/Werte_unedited.png')
 
         self.master.title('Edit Spannungen')
@@ -602,11 +725,15 @@ class PaintWerteGUI():
         WIDTH, HEIGHT = self.image.size
         self.cnv = Canvas(self.master, width=WIDTH, height=HEIGHT, bg='white')
         self.cnv.pack()
+        self.cnv.bind('<ButtonPress-1>', self.strich_anfang)
         self.cnv.bind('<B1-Motion>', self.paint)
+        self.cnv.bind('<ButtonRelease-1>', self.strich_ende)
+        self.master.bind('<Control-z>', lambda event: self.undo())
+        self.master.bind('<Control-y>', lambda event: self.redo())
 
         self.cnv.create_image(0,0, anchor=tk.NW, image = self.img)
 
-        self.draw = ImageDraw.Draw(self.image)
+        self.pinsel = BA.Pinsel(self.verlauf)
 
         self.btn_frame = Frame(self.master)
         self.btn_frame.pack(fill=tk.X)
@@ -633,10 +760,17 @@ class PaintWerteGUI():
         self.color_btn = Button(self.btn_frame, text='Change Color', command=self.change_color)
         self.color_btn.grid(row= 2, column=0, sticky=tk.W+tk.E)
 
-        self.AnleitungEditWerte = Label(self.btn_frame, text='Anleitung zur Bearbeitung der Spannungen: \n \n Über „B+“ und „B-“ kann die Pinselstärke verändert werden. \n Mit Klick auf „Change Color“ kann die Farbe des Pinsels angepasst werden. \n „Clear“ setzt das Bild auf Ursprungszustand zurück. \n Klick auf „Modell“ bringt Sie zum Bearbeitungsmodus für das Modell \n Über „Save“ werden die Änderungen gespeichert und Sie gelangen zurück zur Auswahl der Sensoren \n \n Zur Bearbeitung der Zugspannungen bitte die Farbe Orange RGB (255, 165, 0), für die Druckspannungen Lila RGB (160, 32, 240) über „Change Color“ auswählen. \n Zum Entfernen von Spannungen bitte die Modellfarbe Grau RGB (160, 160, 160) auswählen \n \n Zum Hinzufügen von Sensoren ein Bereich mit entweder Orange oder Lila markieren. \n \n Achtung: Das Modell kann die im Bearbeitungsmodus Modell getätigten Änderungen noch nicht anzeigen. Diese Änderungen müssen nicht noch einmal getätigt werden.',
+        self.undo_btn = Button(self.btn_frame, text='Undo', command=self.undo)
+        self.undo_btn.grid(row= 3, column=0, sticky=tk.W+tk.E)
+
+        self.redo_btn = Button(self.btn_frame, text='Redo', command=self.redo)
+        self.redo_btn.grid(row= 3, column=1, sticky=tk.W+tk.E)
+
+        self.AnleitungEditWerte = Label(self.btn_frame, text='Anleitung zur Bearbeitung der Spannungen: \n \n Über „B+“ und „B-“ kann die Pinselstärke verändert werden. \n Mit Klick auf „Change Color“ kann die Farbe des Pinsels angepasst werden. \n „Clear“ setzt das Bild auf Ursprungszustand zurück. \n „Undo“ (Strg+Z) und „Redo“ (Strg+Y) machen die letzten Striche rückgängig bzw. stellen sie wieder her. \n Die vorgeschlagenen Sensoren werden nach jedem Strich in Schwarz aktualisiert. \n Klick auf „Modell“ bringt Sie zum Bearbeitungsmodus für das Modell \n Über „Save“ werden die Änderungen gespeichert und Sie gelangen zurück zur Auswahl der Sensoren \n \n Zur Bearbeitung der Zugspannungen bitte die Farbe Orange RGB (255, 165, 0), für die Druckspannungen Lila RGB (160, 32, 240) über „Change Color“ auswählen. \n Zum Entfernen von Spannungen bitte die Modellfarbe Grau RGB (160, 160, 160) auswählen \n \n Zum Hinzufügen von Sensoren ein Bereich mit entweder Orange oder Lila markieren. \n \n Achtung: Das Modell kann die im Bearbeitungsmodus Modell getätigten Änderungen noch nicht anzeigen. Diese Änderungen müssen nicht noch einmal getätigt werden.',
                            wraplength=1000, justify= tk.LEFT)
-        self.AnleitungEditWerte.grid(row= 0, column=2, rowspan=3, sticky=tk.W+tk.E)
+        self.AnleitungEditWerte.grid(row= 0, column=2, rowspan=4, sticky=tk.W+tk.E)
 
+        self.vorschlaege_zeigen()
         self.master.protocol('WM_DELETE_WINDOW', self.on_closing)
 
     def modell(self):
@@ -644,38 +778,117 @@ class PaintWerteGUI():
         Funktion des Buttons zum wechseln des Bearbeitungsmodus zum bearbeiten des Modells.
         Aufrufen des Paint-Clones zur Bearbeitung der Modellgeometrie.
         """
-        self.image.save(path + '/Werte.png')
+        self.verlauf.speichern(path + '/Werte.png')
         testmaster = Toplevel(self.master)
         self.master.withdraw()
-        PaintWerteGUI(testmaster)
+        PaintModellGUI(testmaster)
+
+    def strich_anfang(self, event):
+        """
+        Funktion beim Drücken der Maus: Beginn eines Strichs. Der Strich wird auf der Zeichenfläche als ein Linienzug dargestellt.
+
+        Args:
+            event : Mausposition im Bild
 
+        Returns:
+        """
+        # Die Pinselbreite entspricht der bisherigen Darstellung, Rechteck mit Rand der Breite brush_width
+        self.pinsel.ansetzen(event.x, event.y, self.brush_width + 2, self.current_color)
+        self.linienpunkte = [event.x, event.y, event.x, event.y]
+        self.linie = self.cnv.create_line(*self.linienpunkte, fill=self.current_color, width=self.brush_width + 2,
+                                          capstyle=tk.PROJECTING, joinstyle=tk.MITER, tags='strich')
+
+    @IM.Messen
     def paint(self, event):
         """
-        Funktion zum malen bei Mausklick
+        Funktion zum malen bei Mausklick. Verlängert den Linienzug des Strichs bis zur Mausposition.
 
         Args:
             event : Mausposition im Bild
 
         Returns:
         """
-        x1, y1 = (event.x - 1), (event.y - 1)
-        x2, y2 = (event.x + 1), (event.y + 1)
-        self.cnv.create_rectangle(x1, y1, x2, y2, outline=self.current_color, fill= self.current_color, width=self.brush_width)
-        self.draw.rectangle([x1, y1, x2 + self.brush_width, y2 + self.brush_width], outline=self.current_color, fill= self.current_color, width=self.brush_width)
+        if self.pinsel.ziehen(event.x, event.y):
+            # Der Abschnitt ist im Bild, ein neuer Linienzug beginnt am letzten Punkt
+            self.linienpunkte = self.linienpunkte[-2:]
+            self.linie = self.cnv.create_line(*self.linienpunkte, event.x, event.y, fill=self.current_color, width=self.brush_width + 2,
+                                              capstyle=tk.PROJECTING, joinstyle=tk.MITER, tags='strich')
+        self.linienpunkte += [event.x, event.y]
+        self.cnv.coords(self.linie, *self.linienpunkte)
+
+    def strich_ende(self, event):
+        """
+        Funktion beim Loslassen der Maus: Der Strich wird ins Bild übertragen und als ein Schritt im Verlauf abgelegt.
+
+        Args:
+            event : Mausposition im Bild
+
+        Returns:
+        """
+        self.anzeigen(self.pinsel.absetzen())
+
+    @IM.Messen
+    def anzeigen(self, bereiche : list):
+        """
+        Ersetzt die Striche auf der Zeichenfläche durch das aktuelle Bild und aktualisiert danach die Sensorvorschläge.
+
+        Args:
+            bereiche (list) : Geänderte Bereiche (x0, y0, x1, y1) aus dem Verlauf, bei None bleibt die Anzeige unverändert
+
+        Returns:
+        """
+        if bereiche is None:
+            return
+        self.cnv.delete('strich')
+        self.img.paste(self.image)
+        # Erst nach dem Neuzeichnen, damit das Bild ohne Verzögerung erscheint
+        self.master.after_idle(lambda: self.erkennen(bereiche))
+
+    @IM.Messen
+    def erkennen(self, bereiche : list):
+        """
+        Übergibt die geänderten Bereiche an die Erkennung, die nur die betroffenen Spannungskonturen neu auswertet.
+
+        Args:
+            bereiche (list) : Geänderte Bereiche (x0, y0, x1, y1)
+
+        Returns:
+        """
+        ausschnitte = [np.asarray(self.image.crop(bereich).convert('RGB'))[:, :, ::-1] for bereich in bereiche]
+        Erkennung.aktualisieren(bereiche, WerteAusschnitte=ausschnitte)
+        self.vorschlaege_zeigen()
+
+    def vorschlaege_zeigen(self):
+        """
+        Zeichnet die aktuellen Sensorvorschläge auf die Zeichenfläche. Sie sind nicht Teil des Bildes.
+        """
+        self.cnv.delete('vorschlag')
+        for punkte in Erkennung.sensoren()['punkte']:
+            self.cnv.create_line(*punkte.ravel().tolist(), fill='black', width=2, tags='vorschlag')
+
+    def undo(self):
+        """
+        Funktion des 'Undo'-Button: Letzten Strich rückgängig machen.
+        """
+        self.anzeigen(self.verlauf.rueckgaengig())
+
+    def redo(self):
+        """
+        Funktion des 'Redo'-Button: Zuletzt rückgängig gemachten Strich wiederherstellen.
+        """
+        self.anzeigen(self.verlauf.wiederholen())
 
     def clear(self):
         """
-        Funktion des 'Clear'-Button: Zurücksetzen des Bildes auf Ausgangszustand.
+        Funktion des 'Clear'-Button: Zurücksetzen des Bildes auf Ausgangszustand. Kann rückgängig gemacht werden.
         """
-        self.cnv.delete('all')
-        self.draw.rectangle([0,0,10000,10000], fill='white')
-        self.cnv.create_image(0,0, anchor=tk.NW, image=self.img_clear)
+        self.anzeigen(self.verlauf.zuruecksetzen(self.img_clear))
         
     def save(self): 
         """
         Funktion des 'Save'-Button: Speichern des Modellbildes.
         """
-        self.image.save(path + '/Werte.png')
+        self.verlauf.speichern(path + '/Werte.png')
         self.on_closing()
 
     def brush_plus(self):
@@ -698,25 +911,28 @@ class PaintWerteGUI():
         """
         _, self.current_color = colorchooser.askcolor(title = 'Choose A Color')
 
+    @IM.Messen
     def on_closing(self):
         """
         Funktion zum schließen des Fensters. Speichern des aktuellen Standes und öffnen des Auswahlmodus für die Sensoren.
         """
         self.master.withdraw()
-        image = cv2.imread(path +'/Werte.png')
+        # Die Sensoren entstehen aus den bearbeiteten Bildern, daher auch ohne 'Save' beide Bilder speichern, damit
+        # Modell.png und Werte.png zum Export passen
+        for name, verlauf in Verlaeufe.items():
+            verlauf.speichern(path + '/' + name)
+        # Die Erkennung ist bereits auf dem Stand der Bearbeitung, die Bilder müssen nicht erneut gelesen werden
+        image = Erkennung.kontext.image.copy()
         global Sensoren
-        Sensoren = M9.SensorErkennung(path, scalex, scaley)
+        Sensoren = SensorenSortieren(Erkennung.sensoren())
         print(Sensoren)
                 
+        global Anzahl
         Anzahl = 1
         MaxAnzahl = len(Sensoren)
 
-        image = M9.SensorMalen(image, Sensoren[-Anzahl,2], Sensoren[-Anzahl,3], Sensoren[-Anzahl,4], Sensoren[-Anzahl,5], Sensoren[-Anzahl,6], \
-                                Sensoren[-Anzahl,7], Sensoren[-Anzahl,8], Sensoren[-Anzahl,9])
-        
-        cv2.imwrite(path + '/Sensor1.png', image)
         testmaster = Toplevel(self.master)
-        SensorenAuswählen(testmaster, MaxAnzahl)
+        SensorenAuswählen(testmaster, MaxAnzahl, image)
 
 
 if __name__ == '__main__':